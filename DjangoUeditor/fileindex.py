@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+# 上传文件索引，供图片管理、文件管理（listimage、listfile）分页使用
+import bisect
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.utils.encoding import force_bytes
+
+from . import settings as USettings
+
+MANIFEST_VERSION = 2
+# 旧版本保存在被索引目录下的清单，会随MEDIA_ROOT一起公开，读取新清单时删除
+LEGACY_MANIFEST = os.path.join(".ueditor_index", "manifest.json")
+# 日志超过这么多条时把整个索引重新写成快照，并清空日志
+LOG_MAX_ENTRIES = 1000
+
+
+def index_dir():
+    """
+    清单保存的目录。清单包含上传目录下的所有文件名，不能放在公开访问的MEDIA_ROOT下，
+    默认使用系统临时目录，可以用fileIndexDir指定
+    """
+    return (USettings.UEditorSettings.get("fileIndexDir") or
+            os.path.join(tempfile.gettempdir(), "ueditor_index"))
+
+
+class FileIndex(object):
+    """
+    某个目录下所有文件的索引。
+    每个子目录记录自身的 mtime、直接包含的文件（文件名 -> mtime）和子目录名；
+    重新扫描时只对每个目录做一次 stat，mtime 没变的目录直接沿用索引，
+    只有发生变化的目录才会 listdir。
+    索引保存为快照文件加一个追加写入的日志：上传的文件和目录 mtime 的变化只在日志末尾
+    追加一行，扫描发现文件增删、或日志过长时才重写快照，进程重启后不必全盘扫描。
+    """
+
+    def __init__(self, root_path):
+        self.root = root_path
+        name = hashlib.md5(force_bytes(root_path)).hexdigest()
+        self.manifest_path = os.path.join(index_dir(), name + ".json")
+        self.log_path = os.path.join(index_dir(), name + ".log")
+        self.dirs = {}
+        self.version = 0
+        self.last_scan = 0
+        self.log_entries = 0
+        self._sorted = {}
+        self._lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        """读取快照并重放日志，文件不存在或格式不对时从空索引开始"""
+        try:
+            os.remove(os.path.join(self.root, LEGACY_MANIFEST))
+            os.rmdir(os.path.dirname(os.path.join(self.root, LEGACY_MANIFEST)))
+        except OSError:
+            pass
+        try:
+            with open(self.manifest_path) as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION and data.get("root") == self.root:
+                self.dirs = data["dirs"]
+        except (IOError, OSError, ValueError, KeyError):
+            self.dirs = {}
+        try:
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 其他进程写了一半的行
+                        continue
+                    self._apply(record)
+                    self.log_entries += 1
+        except (IOError, OSError):
+            pass
+
+    def save(self):
+        """
+        把整个索引写成快照，先写临时文件再改名，避免其他进程读到写了一半的清单；
+        然后清空日志。改名与清空之间其他进程追加的记录会丢失，下次扫描时补上
+        """
+        tmp_path = "%s.%s.tmp" % (self.manifest_path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(tmp_path)):
+                os.makedirs(os.path.dirname(tmp_path))
+            with open(tmp_path, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "root": self.root,
+                           "dirs": self.dirs}, f)
+            if os.name == "nt" and os.path.exists(self.manifest_path):
+                os.remove(self.manifest_path)
+            os.rename(tmp_path, self.manifest_path)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self.log_entries = 0
+        except (IOError, OSError):
+            pass
+
+    def _log(self, record):
+        """在日志末尾追加一条记录，日志过长时改写快照"""
+        if self.log_entries >= LOG_MAX_ENTRIES:
+            self.save()
+            return
+        try:
+            if not os.path.isdir(os.path.dirname(self.log_path)):
+                os.makedirs(os.path.dirname(self.log_path))
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            self.log_entries += 1
+        except (IOError, OSError):
+            pass
+
+    def _apply(self, record):
+        """重放一条日志：{"dir", "mtime"} 为目录的 mtime，带 "name" 的为目录下新保存的文件"""
+        rel_dir = record["dir"]
+        if "name" in record:
+            self._ensure_dir(rel_dir)["files"][record["name"]] = record["mtime"]
+        elif rel_dir in self.dirs:
+            self.dirs[rel_dir]["mtime"] = record["mtime"]
+
+    def _ensure_dir(self, rel_dir):
+        entry = self.dirs.get(rel_dir)
+        if entry is None:
+            # 新建的目录：mtime 记为 0，下次扫描时会重新列出；同时挂到父目录下
+            entry = self.dirs[rel_dir] = {"mtime": 0, "files": {}, "subdirs": []}
+            if rel_dir:
+                parent, name = os.path.split(rel_dir)
+                subdirs = self._ensure_dir(parent)["subdirs"]
+                if name not in subdirs:
+                    subdirs.append(name)
+        return entry
+
+    def _scan_dir(self, rel, seen):
+        """
+        扫描一个目录及其子目录，返回 (文件或子目录是否有增删, 目录 mtime 有变化的目录)。
+        目录 mtime 变了但内容与索引一致时（例如刚由 add_file 加入的文件），不算增删
+        """
+        full = os.path.join(self.root, rel) if rel else self.root
+        try:
+            mtime = os.stat(full).st_mtime
+        except OSError:
+            return False, []
+        seen.add(rel)
+        entry = self.dirs.get(rel)
+        changed, touched = False, []
+        if entry is None or entry["mtime"] != mtime:
+            files, subdirs = {}, []
+            old_files = entry["files"] if entry else {}
+            for name in os.listdir(full):
+                if name.startswith("."):
+                    continue
+                path = os.path.join(full, name)
+                if os.path.isdir(path):
+                    subdirs.append(name)
+                elif name in old_files:
+                    files[name] = old_files[name]
+                else:
+                    try:
+                        files[name] = os.path.getmtime(path)
+                    except OSError:
+                        pass
+            if (entry is None or files != entry["files"] or
+                    set(subdirs) != set(entry["subdirs"])):
+                self.dirs[rel] = entry = {"mtime": mtime, "files": files, "subdirs": subdirs}
+                changed = True
+            else:
+                entry["mtime"] = mtime
+                touched.append(rel)
+        for name in entry["subdirs"]:
+            sub = "/".join((rel, name)) if rel else name
+            sub_changed, sub_touched = self._scan_dir(sub, seen)
+            changed = changed or sub_changed
+            touched.extend(sub_touched)
+        return changed, touched
+
+    def rescan(self, force=False):
+        """按目录 mtime 增量扫描，距上次扫描不足 fileIndexRescanInterval 秒时跳过"""
+        interval = USettings.UEditorSettings.get("fileIndexRescanInterval", 30)
+        with self._lock:
+            now = time.time()
+            if not force and now - self.last_scan < interval:
+                return
+            self.last_scan = now
+            if not os.path.isdir(self.root):
+                return
+            seen = set()
+            changed, touched = self._scan_dir("", seen)
+            for rel in list(self.dirs):
+                if rel not in seen:
+                    del self.dirs[rel]
+                    changed = True
+            if changed:
+                # 有文件增删（其他进程或直接写入磁盘的），排序结果作废，重写快照
+                self.version += 1
+                self.save()
+            else:
+                for rel in touched:
+                    self._log({"dir": rel, "mtime": self.dirs[rel]["mtime"]})
+
+    def add_file(self, path):
+        """
+        上传或抓取文件保存后调用，立即加入索引，不必等下一次扫描。
+        文件按修改时间插入到已排好序的列表中，不会让下一次列表请求重新排序
+        """
+        rel = os.path.relpath(path, self.root).replace("\\", "/")
+        rel_dir, name = os.path.split(rel)
+        if rel.startswith("../") or name.startswith("."):
+            return
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+        with self._lock:
+            # 不更新目录的 mtime，同目录下其他进程写入的文件在下次扫描时补上
+            files = self._ensure_dir(rel_dir)["files"]
+            old_mtime = files.get(name)
+            files[name] = mtime
+            self._log({"dir": rel_dir, "name": name, "mtime": mtime})
+            for allow_types, (version, items, keys) in self._sorted.items():
+                if len(allow_types) != 0 and os.path.splitext(name)[1] not in allow_types:
+                    continue
+                if old_mtime is not None:
+                    # 覆盖已有的文件：先按原来的 mtime 找到并移除旧的一项
+                    i = bisect.bisect_left(keys, -old_mtime)
+                    while i < len(keys) and keys[i] == -old_mtime:
+                        if items[i][0] == rel:
+                            del items[i], keys[i]
+                            break
+                        i += 1
+                i = bisect.bisect_left(keys, -mtime)
+                items.insert(i, (rel, mtime))
+                keys.insert(i, -mtime)
+
+    def _sorted_files(self, allow_types):
+        """
+        按修改时间从新到旧排列的 [(相对路径, mtime)]，调用方需持有 self._lock。
+        排序结果按 (索引版本, 允许的扩展名) 缓存，add_file 直接插入到缓存的列表中，
+        只有扫描发现文件增删时才重新排序。
+        """
+        key = tuple(allow_types)
+        cached = self._sorted.get(key)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        files = []
+        for rel_dir, entry in self.dirs.items():
+            for name, mtime in entry["files"].items():
+                if len(allow_types) == 0 or os.path.splitext(name)[1] in allow_types:
+                    files.append(("/".join((rel_dir, name)) if rel_dir else name, mtime))
+        files.sort(key=lambda item: item[1], reverse=True)
+        # keys 为取负的 mtime，升序排列，供 bisect 查找插入位置
+        self._sorted[key] = (self.version, files, [-mtime for _, mtime in files])
+        return files
+
+    def list_files(self, allow_types):
+        """返回 [(相对路径, mtime)]，按修改时间从新到旧排列，是缓存列表的副本"""
+        self.rescan()
+        with self._lock:
+            return list(self._sorted_files(allow_types))
+
+    def list_page(self, allow_types, start, size):
+        """
+        返回 (从 start 开始的 size 项, 总数)。缓存的列表会被 add_file 并发修改，
+        在锁内切片，只复制当前页
+        """
+        self.rescan()
+        with self._lock:
+            files = self._sorted_files(allow_types)
+            return files[start:start + size], len(files)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root_path):
+    """每个目录一个索引，进程内共享"""
+    root_path = os.path.normpath(root_path)
+    with _indexes_lock:
+        index = _indexes.get(root_path)
+        if index is None:
+            index = _indexes[root_path] = FileIndex(root_path)
+        return index
+
+
+def notify_saved(path):
+    """文件保存后通知所有包含该文件的索引"""
+    path = os.path.normpath(path)
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        if path.startswith(index.root + os.sep):
+            index.add_file(path)
@@ -13,7 +13,26 @@ UEditorSettings = {
     "toolbars": TOOLBARS_SETTINGS["normal"],
     "autoFloatEnabled": False,
     # 默认保存上传文件的命名方式
-    "defaultPathFormat": "%(basename)s_%(datetime)s_%(rnd)s.%(extname)s"
+    "defaultPathFormat": "%(basename)s_%(datetime)s_%(rnd)s.%(extname)s",
+    # 图片管理、文件管理使用的文件索引，两次增量扫描目录之间的最短间隔（秒）
+    "fileIndexRescanInterval": 30,
+    # 文件索引的清单保存目录，清单列出了所有上传的文件，不能放在公开访问的MEDIA_ROOT下；
+    # 为空时使用系统临时目录下的ueditor_index
+    "fileIndexDir": "",
+    # 远程抓图：同时下载的最大数量、每个地址的超时时间（秒，包括连接和下载），
+    # 是否对内容相同的图片只保存一份
+    "catcherMaxWorkers": 8,
+    "catcherTimeout": 15,
+    "catcherDedup": False,
+    # 上传图片的缩小版本（需要安装Pillow）：版本名 -> 长边的最大像素，设为空字典则不生成；
+    # thumbnailRecompressSize不为0时，大于这么多字节的PNG/JPEG按原尺寸重新压缩，
+    # 变小时另存为compressed版本，原图不变；默认为0，不重新压缩
+    "thumbnailSizes": {"small": 200, "large": 1600},
+    "thumbnailRecompressSize": 0,
+    "thumbnailQuality": 85,
+    "thumbnailMaxWorkers": 2,
+    # 后端配置（action=config）允许浏览器缓存的秒数，过期后用ETag验证
+    "configMaxAge": 300
 }
 # 请参阅php文件夹里面的config.json进行配置
 UEditorUploadSettings = {
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# 按内容寻址的上传文件存储
+import errno
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    按文件内容的sha256保存上传文件，相同的内容只在磁盘上保存一份。
+    文件保存为 <prefix>/<摘要前两位>/<摘要><扩展名>，保存时传入的文件名只用来取扩展名。
+    在 UEDITOR_SETTINGS["upload"]["upload_storage"] 中配置为
+    "DjangoUeditor.storage.ContentAddressedStorage" 即可启用。
+    """
+
+    def __init__(self, location=None, base_url=None, prefix="ueditor_cas", **kwargs):
+        super(ContentAddressedStorage, self).__init__(location, base_url, **kwargs)
+        self.prefix = prefix
+
+    def digest_name(self, digest, ext):
+        return "/".join((self.prefix, digest[:2], digest + ext.lower()))
+
+    def get_available_name(self, name, max_length=None):
+        # 最终的文件名由内容决定，同名即同内容，不需要另取文件名
+        return name
+
+    def _makedirs(self, directory):
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _save(self, name, content):
+        if hasattr(content, "temporary_file_path"):
+            return self._save_temporary(name, content.temporary_file_path())
+        # 边计算摘要边写入临时文件，文件只读一遍；临时文件以“.”开头，不会出现在文件列表中
+        tmp_dir = self.path(self.prefix)
+        self._makedirs(tmp_dir)
+        fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".part", dir=tmp_dir)
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    if not isinstance(chunk, bytes):
+                        chunk = chunk.encode("utf-8")
+                    digest.update(chunk)
+                    f.write(chunk)
+            name = self.digest_name(digest.hexdigest(), os.path.splitext(name)[1])
+            self._place(tmp_path, name)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return name
+
+    def _save_temporary(self, name, tmp_path):
+        """
+        TemporaryFileUploadHandler已经把大文件写在磁盘上：只读一遍计算摘要，
+        再像save_upload_file一样移动过去，不再复制一份。内容已存在时不移动，
+        临时文件在请求结束时由Django删除
+        """
+        digest = hashlib.sha256()
+        with open(tmp_path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+        name = self.digest_name(digest.hexdigest(), os.path.splitext(name)[1])
+        self._place(tmp_path, name)
+        return name
+
+    def _place(self, tmp_path, name):
+        """把临时文件移动到name，已有同样内容的文件时什么也不做"""
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return
+        self._makedirs(os.path.dirname(full_path))
+        try:
+            file_move_safe(tmp_path, full_path)
+        except (IOError, OSError):
+            # 同样的内容同时被另一个请求保存了
+            if not os.path.exists(full_path):
+                raise
+            return
+        os.chmod(full_path, self.file_permissions_mode or 0o644)
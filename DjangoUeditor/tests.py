@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from unittest import skipIf
+
+from django.test import SimpleTestCase, mock, override_settings
+from django.utils.six.moves import BaseHTTPServer, socketserver
+
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.signals import setting_changed
+
+from . import fileindex
+from . import thumbnails
+from . import widgets
+from . import settings as USettings
+from .storage import ContentAddressedStorage
+from .commands import UEditorEventHandler
+from .views import fetch_remote_file
+
+
+class SlowHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """本地的远程图片服务器：/slow 每隔0.05秒只发送1个字节，/fast 一次发完"""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", "100000")
+        self.end_headers()
+        try:
+            if self.path == "/slow":
+                for _ in range(100000):
+                    self.wfile.write(b"x")
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            else:
+                self.wfile.write(b"x" * 100000)
+        except (IOError, OSError):
+            # 客户端超时后断开连接
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class FileIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.addCleanup(shutil.rmtree, self.index_dir)
+        patcher = mock.patch.dict(USettings.UEditorSettings, {
+            "fileIndexDir": self.index_dir, "fileIndexRescanInterval": 0})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, rel, mtime):
+        path = os.path.join(self.root, rel)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(rel)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_add_file_keeps_sorted_list(self):
+        self.write("a.png", 100)
+        self.write("b.txt", 300)
+        index = fileindex.FileIndex(self.root)
+        self.assertEqual(index.list_files([".png"]), [("a.png", 100)])
+        self.assertEqual(index.list_files([]), [("b.txt", 300), ("a.png", 100)])
+        version = index.version
+
+        index.add_file(self.write("2017/c.png", 200))
+        index.add_file(self.write("a.png", 400))
+        # 上传的文件直接插入已排好序的列表，扫描时目录内容与索引一致，不会重新排序
+        with mock.patch.object(fileindex.FileIndex, "_scan_dir",
+                               wraps=index._scan_dir) as scan:
+            files = index.list_files([".png"])
+        self.assertTrue(scan.called)
+        self.assertEqual(index.version, version)
+        self.assertEqual(files, [("a.png", 400), ("2017/c.png", 200)])
+        self.assertEqual(index.list_files([]),
+                         [("a.png", 400), ("b.txt", 300), ("2017/c.png", 200)])
+
+    def test_list_page(self):
+        for i in range(5):
+            self.write("%s.png" % i, 100 + i)
+        index = fileindex.FileIndex(self.root)
+        self.assertEqual(index.list_page([".png"], 1, 2), ([("3.png", 103), ("2.png", 102)], 5))
+        # 返回的是副本，之后加入的文件不会改动调用方手里的列表
+        files = index.list_files([".png"])
+        index.add_file(self.write("5.png", 105))
+        self.assertEqual(len(files), 5)
+        self.assertEqual(index.list_page([".png"], 0, 1), ([("5.png", 105)], 6))
+
+    def test_manifest_outside_root_and_log(self):
+        self.write("a.png", 100)
+        os.makedirs(os.path.join(self.root, ".ueditor_index"))
+        self.write(".ueditor_index/manifest.json", 100)
+        index = fileindex.FileIndex(self.root)
+        index.rescan(force=True)
+        self.assertTrue(index.manifest_path.startswith(self.index_dir))
+        # 旧版本保存在被索引目录下的清单被删除
+        self.assertEqual(os.listdir(self.root), ["a.png"])
+
+        snapshot = os.path.getmtime(index.manifest_path)
+        index.add_file(self.write("b.png", 200))
+        # 上传只在日志末尾追加一行，不改写快照
+        self.assertEqual(os.path.getmtime(index.manifest_path), snapshot)
+        with open(index.log_path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        # 另一个进程从快照和日志恢复出完整的索引
+        self.assertEqual(fileindex.FileIndex(self.root).dirs, index.dirs)
+
+        with mock.patch.object(fileindex, "LOG_MAX_ENTRIES", 1):
+            index.add_file(self.write("c.png", 300))
+        self.assertFalse(os.path.exists(index.log_path))
+        self.assertEqual(fileindex.FileIndex(self.root).dirs, index.dirs)
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.storage = ContentAddressedStorage(location=self.root, base_url="/media/")
+
+    def temporary_upload(self, content):
+        upload = TemporaryUploadedFile("a.PNG", "image/png", len(content), None)
+        upload.write(content)
+        upload.flush()
+        self.addCleanup(upload.close)
+        return upload
+
+    def test_save(self):
+        name = self.storage.save("x/a.PNG", SimpleUploadedFile("a.PNG", b"png data"))
+        self.assertEqual(name, "ueditor_cas/%s/%s.png" % (
+            hashlib.sha256(b"png data").hexdigest()[:2], hashlib.sha256(b"png data").hexdigest()))
+        with open(self.storage.path(name), "rb") as f:
+            self.assertEqual(f.read(), b"png data")
+        # 只剩保存好的文件，没有留下临时文件
+        self.assertEqual(os.listdir(os.path.join(self.root, "ueditor_cas")), [name.split("/")[1]])
+
+    def test_temporary_file_is_moved(self):
+        upload = self.temporary_upload(b"large png")
+        tmp_path = upload.temporary_file_path()
+        name = self.storage.save("a.png", upload)
+        # 已经在磁盘上的临时文件直接移动过去，不再复制一份
+        self.assertFalse(os.path.exists(tmp_path))
+        with open(self.storage.path(name), "rb") as f:
+            self.assertEqual(f.read(), b"large png")
+        self.assertEqual(os.stat(self.storage.path(name)).st_mode & 0o777, 0o644)
+        # 相同的内容已经保存过时不移动，文件保持不变
+        upload = self.temporary_upload(b"large png")
+        self.assertEqual(self.storage.save("b.png", upload), name)
+        self.assertTrue(os.path.exists(upload.temporary_file_path()))
+
+
+class FetchRemoteFileTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = StandInServer(("127.0.0.1", 0), SlowHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_fetch(self):
+        filename = os.path.join(self.dir, "a.png")
+        state, size, digest = fetch_remote_file(self.url + "/fast", filename, 0, 5)
+        self.assertEqual((state, size), ("SUCCESS", 100000))
+        self.assertEqual(os.path.getsize(filename), 100000)
+        state, size, digest = fetch_remote_file(self.url + "/fast", filename, 1000, 5)
+        self.assertEqual(state, u"抓取图片大小超过限制。")
+
+    def test_slow_server_times_out(self):
+        # 服务器一直在发送数据，每次socket操作都不超时，整个下载仍然在截止时间附近中止
+        filename = os.path.join(self.dir, "b.png")
+        start = time.time()
+        state, size, digest = fetch_remote_file(self.url + "/slow", filename, 0, 0.5)
+        self.assertEqual(state, u"抓取图片超时。")
+        self.assertLess(time.time() - start, 1.5)
+        self.assertEqual(os.listdir(self.dir), [])
+
+
+class ThumbnailTests(SimpleTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL="/media/")
+        media.enable()
+        self.addCleanup(media.disable)
+        legacy = mock.patch.object(thumbnails, "_legacy_manifest", None)
+        legacy.start()
+        self.addCleanup(legacy.stop)
+
+    @mock.patch.object(thumbnails, "Image", object())
+    def test_one_manifest_per_image(self):
+        thumbnails.write_variants("uploads/a.png", {"small": ".thumbs/uploads/a_small.png"})
+        thumbnails.write_variants("uploads/b.png", {})
+        self.assertEqual(sorted(os.listdir(os.path.join(self.media_root, ".thumbs", "uploads"))),
+                         ["a.png.json", "b.png.json"])
+        self.assertEqual(thumbnails.variant_urls("uploads/a.png"),
+                         {"small": "/media/.thumbs/uploads/a_small.png"})
+        self.assertEqual(thumbnails.variant_urls("uploads/b.png"), {})
+        self.assertEqual(thumbnails.variant_urls("uploads/c.png"), {})
+
+    @mock.patch.object(thumbnails, "Image", object())
+    def test_legacy_manifest(self):
+        os.makedirs(os.path.join(self.media_root, ".thumbs"))
+        with open(os.path.join(self.media_root, ".thumbs", "manifest.json"), "w") as f:
+            json.dump({"old.png": {"small": ".thumbs/old_small.png"}}, f)
+        self.assertEqual(thumbnails.variant_urls("old.png"),
+                         {"small": "/media/.thumbs/old_small.png"})
+
+    @skipIf(thumbnails.Image is None, "Pillow is not installed")
+    def test_process(self):
+        from PIL import Image
+        path = os.path.join(self.media_root, "photo.png")
+        # 不压缩地保存一张渐变图片，文件很大
+        image = Image.new("RGB", (400, 300))
+        image.putdata([(x % 256, y % 256, 0) for y in range(300) for x in range(400)])
+        image.save(path, compress_level=0)
+        os.utime(path, (1000, 1000))
+        original_size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            original = f.read()
+        with mock.patch.dict(thumbnails.USettings.UEditorSettings, {
+                "thumbnailSizes": {"small": 100, "large": 1600},
+                "thumbnailRecompressSize": 1000}):
+            thumbnails.process(path)
+        # 原图不变，按原尺寸重新压缩的结果另存为一个版本
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), original)
+        self.assertEqual(os.path.getmtime(path), 1000)
+        self.assertEqual(thumbnails.read_variants("photo.png"), {
+            "compressed": ".thumbs/photo_compressed.png", "small": ".thumbs/photo_small.png"})
+        compressed = os.path.join(self.media_root, ".thumbs", "photo_compressed.png")
+        self.assertLess(os.path.getsize(compressed), original_size)
+        self.assertEqual(Image.open(compressed).size, (400, 300))
+        self.assertEqual(sorted(os.listdir(self.media_root)), [".thumbs", "photo.png"])
+
+    @skipIf(thumbnails.Image is None, "Pillow is not installed")
+    def test_recompress_off_by_default(self):
+        from PIL import Image
+        path = os.path.join(self.media_root, "photo.png")
+        Image.new("RGB", (400, 300)).save(path, compress_level=0)
+        thumbnails.process(path)
+        self.assertEqual(thumbnails.read_variants("photo.png"), {"small": ".thumbs/photo_small.png"})
+
+    @mock.patch.object(thumbnails, "enabled", lambda: True)
+    def test_submit_skips_processed_images(self):
+        path = os.path.join(self.media_root, "a.png")
+        with open(path, "wb") as f:
+            f.write(b"png")
+        os.utime(path, (1000, 1000))
+        with mock.patch.object(thumbnails, "get_pool") as pool:
+            thumbnails.submit(path)
+            self.assertEqual(pool.return_value.apply_async.call_count, 1)
+            # 相同内容再次上传到按内容寻址的存储时，文件没有被重写，不再重复处理
+            thumbnails.write_variants("a.png", {})
+            thumbnails.submit(path)
+            self.assertEqual(pool.return_value.apply_async.call_count, 1)
+            # 同名文件被新内容覆盖后重新处理
+            os.utime(path, None)
+            os.utime(thumbnails.manifest_path("a.png"), (1000, 1000))
+            thumbnails.submit(path)
+            self.assertEqual(pool.return_value.apply_async.call_count, 2)
+
+
+class FocusHandler(UEditorEventHandler):
+
+    def on_focus(self):
+        return "console.log('focus');"
+
+
+class WidgetRenderTests(SimpleTestCase):
+
+    def setUp(self):
+        widgets._render_cache.clear()
+        self.addCleanup(widgets._render_cache.clear)
+
+    def widget(self, **attrs):
+        params = {"width": 600, "height": 300, "toolbars": "mini", "imagePath": "images/"}
+        params.update(attrs)
+        return widgets.UEditorWidget(params)
+
+    def full_render(self, widget, name, value):
+        return widget.render_template(name, "id_%s" % name.replace("-", "_"), value)
+
+    def test_cache_hit_and_substitution(self):
+        widget = self.widget()
+        with mock.patch.object(widgets.UEditorWidget, "render_template",
+                               wraps=widget.render_template) as render_template:
+            first = widget.render("content", "<p>a</p>")
+            second = self.widget().render("form-0-content", "<p>b</p>")
+        # 同样的配置只渲染一次模板，之后只填入字段名、id和内容
+        self.assertEqual(render_template.call_count, 1)
+        self.assertEqual(first, self.full_render(widget, "content", "<p>a</p>"))
+        self.assertEqual(second, self.full_render(widget, "form-0-content", "<p>b</p>"))
+        self.assertIn('id="id_form_0_content" name="form-0-content"', second)
+        self.assertEqual(len(widgets._render_cache), 1)
+
+    def test_escaped_name_falls_back(self):
+        widget = self.widget()
+        html = widget.render('a"b', "")
+        self.assertEqual(html, self.full_render(widget, 'a"b', ""))
+        self.assertIn('name="a&quot;b"', html)
+        self.assertEqual(len(widgets._render_cache), 0)
+
+    def test_event_handler_not_cached(self):
+        widget = self.widget(event_handler=FocusHandler())
+        html = widget.render("content", "")
+        self.assertIn("console.log('focus');", html)
+        self.assertEqual(len(widgets._render_cache), 0)
+
+    def test_bounded(self):
+        with mock.patch.object(widgets, "RENDER_CACHE_SIZE", 2):
+            for height in (100, 200, 300):
+                self.widget(height=height).render("content", "")
+            # 最近使用过的配置保留，最久未用的被淘汰
+            self.widget(height=200).render("content", "")
+            self.widget(height=400).render("content", "")
+        self.assertEqual([json.loads(key[0])["initialFrameHeight"]
+                          for key in widgets._render_cache], [200, 400])
+
+    def test_cleared_on_setting_changed(self):
+        self.widget().render("content", "")
+        self.assertEqual(len(widgets._render_cache), 1)
+        setting_changed.send(sender=None, setting="STATIC_URL", value="/s/", enter=True)
+        self.assertEqual(len(widgets._render_cache), 0)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+# 上传图片的后台处理：生成缩小的版本，以及过大的PNG/JPEG图片按原尺寸重新压缩的版本
+# 需要安装Pillow，没有安装时不做任何处理
+# 原图从不修改：按内容寻址的存储以文件内容的摘要命名，改写原图会让文件名与内容不符，
+# 重新压缩的结果只作为一个版本（compressed）保存
+import json
+import logging
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+from . import settings as USettings
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# 各版本保存在MEDIA_ROOT下的隐藏目录中，不会出现在图片管理的文件列表里；
+# 每张原图一个清单文件（.thumbs/<原图路径>.json），记录它的各个版本，
+# 生成一张图片的版本只写它自己的清单，不必重写所有图片的清单
+THUMBS_DIR = ".thumbs"
+MANIFEST_SUFFIX = ".json"
+# 旧版本所有图片共用的清单，只读，用于查找之前生成的版本
+LEGACY_MANIFEST_NAME = "manifest.json"
+
+FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG"}
+# 按原尺寸重新压缩的版本名
+RECOMPRESSED = "compressed"
+
+
+def enabled():
+    return Image is not None and bool(USettings.UEditorSettings.get("thumbnailSizes"))
+
+
+def thumbs_root():
+    return os.path.join(USettings.gSettings.MEDIA_ROOT, THUMBS_DIR)
+
+
+def manifest_path(name):
+    return os.path.join(thumbs_root(), name + MANIFEST_SUFFIX)
+
+
+def read_variants(name):
+    """返回原图的 {版本名: 相对MEDIA_ROOT的路径}，还没有生成时返回None"""
+    try:
+        with open(manifest_path(name)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return legacy_manifest().get(name)
+
+
+def write_variants(name, variants):
+    """先写临时文件再改名，避免其他进程读到写了一半的清单"""
+    path = manifest_path(name)
+    if not os.path.isdir(os.path.dirname(path)):
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:
+            pass
+    tmp_path = "%s.%s.tmp" % (path, os.getpid())
+    with open(tmp_path, "w") as f:
+        json.dump(variants, f)
+    if os.name == "nt" and os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+
+_legacy_manifest = None
+_pool = None
+_lock = threading.Lock()
+
+
+def legacy_manifest():
+    global _legacy_manifest
+    with _lock:
+        if _legacy_manifest is None:
+            try:
+                with open(os.path.join(thumbs_root(), LEGACY_MANIFEST_NAME)) as f:
+                    _legacy_manifest = json.load(f)
+            except (IOError, OSError, ValueError):
+                _legacy_manifest = {}
+        return _legacy_manifest
+
+
+def get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPool(USettings.UEditorSettings.get("thumbnailMaxWorkers", 2))
+        return _pool
+
+
+def variant_name(name, variant):
+    base, ext = os.path.splitext(name)
+    return "/".join((THUMBS_DIR, "%s_%s%s" % (base, variant, ext.lower())))
+
+
+def save_image(image, path, image_format):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass
+    if image_format == "JPEG":
+        options = {}
+        if image.info.get("exif"):
+            # 保留EXIF（包括拍摄方向），否则重新编码的照片可能显示为横躺的
+            options["exif"] = image.info["exif"]
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(path, image_format, quality=USettings.UEditorSettings.get(
+            "thumbnailQuality", 85), optimize=True, progressive=True, **options)
+    else:
+        image.save(path, image_format, optimize=True)
+
+
+def save_variant(image, vname, image_format, limit):
+    """
+    把版本vname保存到MEDIA_ROOT下，返回文件大小；
+    不比limit字节小时删除，返回None，直接使用原图
+    """
+    vpath = os.path.join(USettings.gSettings.MEDIA_ROOT, vname)
+    save_image(image, vpath, image_format)
+    size = os.path.getsize(vpath)
+    if size >= limit:
+        os.remove(vpath)
+        return None
+    return size
+
+
+def process(path):
+    """
+    处理一张图片，在后台线程中执行，不修改原图。
+    thumbnailRecompressSize不为0且文件大于它时，按原尺寸重新压缩为compressed版本；
+    thumbnailSizes中每个版本的长边超过限制时缩小，版本不比原图小时不保存，直接使用原图。
+    """
+    media_root = USettings.gSettings.MEDIA_ROOT
+    name = os.path.relpath(path, media_root).replace("\\", "/")
+    image_format = FORMATS.get(os.path.splitext(name)[1].lower())
+    try:
+        original_size = os.path.getsize(path)
+        image = Image.open(path)
+        image.load()
+        variants = {}
+        recompress_size = USettings.UEditorSettings.get("thumbnailRecompressSize") or 0
+        if recompress_size and original_size > recompress_size:
+            vname = variant_name(name, RECOMPRESSED)
+            if save_variant(image, vname, image_format, original_size) is not None:
+                variants[RECOMPRESSED] = vname
+        for variant, max_edge in sorted(USettings.UEditorSettings.get("thumbnailSizes").items()):
+            if max(image.size) <= max_edge:
+                # 尺寸不超过限制的版本直接使用原图
+                continue
+            resized = image.copy()
+            resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            vname = variant_name(name, variant)
+            if save_variant(resized, vname, image_format, original_size) is not None:
+                variants[variant] = vname
+        write_variants(name, variants)
+    except Exception:
+        logger.exception("Failed to generate thumbnails for %s", path)
+
+
+def up_to_date(path):
+    """
+    图片的清单比图片本身新时，版本已经生成过，不必再处理。
+    按内容寻址的存储再次上传相同内容时不会重写已有的文件，这里直接跳过
+    """
+    name = os.path.relpath(path, USettings.gSettings.MEDIA_ROOT).replace("\\", "/")
+    try:
+        return os.path.getmtime(manifest_path(name)) >= os.path.getmtime(path)
+    except OSError:
+        return False
+
+
+def submit(path):
+    """图片保存后调用，交给后台线程池处理，不阻塞请求"""
+    if not enabled():
+        return
+    if os.path.splitext(path)[1].lower() not in FORMATS or up_to_date(path):
+        return
+    get_pool().apply_async(process, (path,))
+
+
+def variant_urls(name):
+    """返回图片各版本的URL，name为相对MEDIA_ROOT的路径；还没有生成时返回空字典"""
+    if Image is None:
+        return {}
+    variants = read_variants(name) or {}
+    media_url = USettings.gSettings.MEDIA_URL
+    return dict((variant, media_url + vname) for variant, vname in variants.items())
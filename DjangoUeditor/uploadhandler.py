@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# 上传处理器，以及涂鸦（base64编码的图片）的流式解码
+import base64
+import binascii
+import os
+import re
+import tempfile
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+
+from .utils import FileSize
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    接收上传数据时检查文件大小，超过max_size立即跳过该文件，不再写入内存或磁盘。
+    需要放在request.upload_handlers的最前面，后面的处理器收不到超出限制的数据。
+    被跳过的文件记录在exceeded中（表单字段名 -> 文件名），不会出现在request.FILES里。
+    """
+
+    def __init__(self, request=None, max_size=0):
+        super(MaxSizeUploadHandler, self).__init__(request)
+        self.max_size = max_size
+        self.exceeded = {}
+
+    def new_file(self, field_name, file_name, content_type, content_length,
+                 charset=None, content_type_extra=None):
+        super(MaxSizeUploadHandler, self).new_file(
+            field_name, file_name, content_type, content_length, charset,
+            content_type_extra)
+        if self.max_size and content_length and content_length > self.max_size:
+            self.skip()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.max_size and start + len(raw_data) > self.max_size:
+            self.skip()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def skip(self):
+        self.exceeded[self.field_name] = self.file_name
+        raise SkipFile()
+
+
+class Base64Decoder(object):
+    """
+    增量解码base64：每次传入一段，返回能解出的字节，不足4个字符的部分留到下一次。
+    max_size不为0时，解码后的总大小超过max_size抛出ValueError。
+    """
+
+    def __init__(self, max_size=0):
+        self.max_size = max_size
+        self.size = 0
+        self.pending = b""
+
+    def feed(self, data):
+        data = self.pending + b"".join(data.split())
+        cut = len(data) - len(data) % 4
+        self.pending = data[cut:]
+        try:
+            decoded = base64.b64decode(data[:cut])
+        except (ValueError, TypeError, binascii.Error):
+            raise ValueError(u"涂鸦数据不是有效的base64编码。")
+        self.size += len(decoded)
+        if self.max_size and self.size > self.max_size:
+            raise ValueError(u"上传文件大小不允许超过%s。" % FileSize(self.max_size).FriendValue)
+        return decoded
+
+    def close(self):
+        if self.pending:
+            raise ValueError(u"涂鸦数据不是有效的base64编码。")
+
+
+_PERCENT_RE = re.compile(br"%([0-9A-Fa-f]{2})")
+
+
+class UrlencodedValueDecoder(object):
+    """
+    增量解码URL编码的值，末尾不完整的%XX留到下一次。
+    “+”原样保留：这里只用来解码base64，base64中不会有空格，客户端未编码的“+”就是“+”。
+    """
+
+    def __init__(self):
+        self.pending = b""
+
+    def feed(self, data):
+        data = self.pending + data
+        i = data.find(b"%", max(len(data) - 2, 0))
+        if i != -1:
+            data, self.pending = data[:i], data[i:]
+        else:
+            self.pending = b""
+        return _PERCENT_RE.sub(lambda m: binascii.unhexlify(m.group(1)), data)
+
+
+def read_urlencoded_field(stream, field_name, chunk_size=65536):
+    """
+    从application/x-www-form-urlencoded格式的请求体中逐块读出字段field_name的值，
+    产生的是URL解码后的字节块；读完该字段即停止，不读取请求体的其余部分。
+    """
+    field_name = field_name.encode("utf-8")
+    key, in_value, found = b"", False, False
+    value_decoder = UrlencodedValueDecoder()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            if found:
+                yield value_decoder.feed(b"") + value_decoder.pending
+            return
+        while chunk:
+            if in_value:
+                end = chunk.find(b"&")
+                value, chunk = (chunk, b"") if end == -1 else (chunk[:end], chunk[end + 1:])
+                if found:
+                    data = value_decoder.feed(value)
+                    if end != -1:
+                        data += value_decoder.pending
+                    if data:
+                        yield data
+                    if end != -1:
+                        return
+                if end != -1:
+                    key, in_value = b"", False
+            else:
+                match = re.search(b"[=&]", chunk)
+                if match is None:
+                    key, chunk = key + chunk, b""
+                elif match.group() == b"&":
+                    key, chunk = b"", chunk[match.end():]
+                else:
+                    key += chunk[:match.start()]
+                    chunk = chunk[match.end():]
+                    in_value = True
+                    found = UrlencodedValueDecoder().feed(key.replace(b"+", b" ")) == field_name
+
+
+def decode_base64_to_file(chunks, filename, max_size=0):
+    """
+    把base64编码的字节块逐块解码写入filename，返回解码后的大小。
+    先写入同目录下的隐藏临时文件，成功后再改名；出错时抛出ValueError并删除临时文件。
+    """
+    decoder = Base64Decoder(max_size)
+    fd, tmp_filename = tempfile.mkstemp(
+        prefix=".", suffix=".part", dir=os.path.dirname(filename))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(decoder.feed(chunk))
+            decoder.close()
+        if decoder.size == 0:
+            raise ValueError(u"涂鸦数据为空。")
+        os.chmod(tmp_filename, 0o644)
+        os.rename(tmp_filename, filename)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+    return decoder.size
+
+
+class ScrawlUploadHandler(FileUploadHandler):
+    """
+    以multipart文件形式提交的涂鸦：边接收边解码base64，直接把图片写入临时文件，
+    request.FILES中得到的是解码后的图片。需要放在request.upload_handlers的最前面。
+    解码出错或超过max_size时跳过该文件，错误信息记录在error中。
+    """
+
+    def __init__(self, request=None, scrawl_field_name="upfile", max_size=0):
+        super(ScrawlUploadHandler, self).__init__(request)
+        self.scrawl_field_name = scrawl_field_name
+        self.max_size = max_size
+        self.decoder = None
+        self.error = None
+
+    def new_file(self, field_name, file_name, content_type, content_length,
+                 charset=None, content_type_extra=None):
+        super(ScrawlUploadHandler, self).new_file(
+            field_name, file_name, content_type, content_length, charset,
+            content_type_extra)
+        self.decoder = None
+        if field_name == self.scrawl_field_name:
+            self.decoder = Base64Decoder(self.max_size)
+            self.file = TemporaryUploadedFile(
+                "scrawl.png", "image/png", 0, None, content_type_extra)
+            raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.decoder is None:
+            return raw_data
+        try:
+            self.file.write(self.decoder.feed(raw_data))
+        except ValueError as E:
+            self.error = u"%s" % E
+            raise SkipFile()
+        return None
+
+    def file_complete(self, file_size):
+        if self.decoder is None:
+            return None
+        try:
+            self.decoder.close()
+        except ValueError as E:
+            # 仍然返回文件，否则后面的处理器会被调用；视图检查error后不会使用它
+            self.error = u"%s" % E
+        self.file.seek(0)
+        self.file.size = self.decoder.size
+        return self.file
@@ -1,13 +1,31 @@
 # -*- coding: utf-8 -*-
 from importlib import import_module
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
 from . import settings as USettings
+from . import fileindex
+from . import thumbnails
+from .uploadhandler import (
+    MaxSizeUploadHandler, ScrawlUploadHandler, decode_base64_to_file,
+    read_urlencoded_field)
+from .utils import FileSize
 import os
 import json
 from django.views.decorators.csrf import csrf_exempt
 import datetime
+import hashlib
+import itertools
 import random
+import socket
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from django.core.files.move import file_move_safe
+from django.core.files.storage import get_storage_class
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils import six
+from django.utils.http import parse_etags, quote_etag
 
 from django.utils.six.moves.urllib.request import urlopen
 from django.utils.six.moves.urllib.parse import urljoin
@@ -33,22 +51,67 @@ def get_path_format_vars():
 
 def save_upload_file(PostFile, FilePath):
     try:
-        f = open(FilePath, 'wb')
-        for chunk in PostFile.chunks():
-            f.write(chunk)
+        if hasattr(PostFile, "temporary_file_path"):
+            # 大文件已经由TemporaryFileUploadHandler保存在临时文件中，直接移动过去，不再复制一遍
+            file_move_safe(PostFile.temporary_file_path(), FilePath)
+            # 临时文件只有属主可读，改为与普通上传文件相同的权限
+            os.chmod(FilePath, USettings.gSettings.FILE_UPLOAD_PERMISSIONS or 0o644)
+        else:
+            with open(FilePath, 'wb') as f:
+                for chunk in PostFile.chunks():
+                    f.write(chunk)
     except Exception as E:
-        f.close()
-        return u"写入文件错误: {}".format(E.message)
-    f.close()
+        return u"写入文件错误: {}".format(E)
     return u"SUCCESS"
 
 
+_upload_storages = {}
+
+
+def get_upload_storage():
+    """upload_storage 配置为存储类的路径时，上传的文件通过该存储保存"""
+    storage_class = USettings.UEditorUploadSettings.get("upload_storage", None)
+    if not storage_class:
+        return None
+    if storage_class not in _upload_storages:
+        _upload_storages[storage_class] = get_storage_class(storage_class)()
+    return _upload_storages[storage_class]
+
+
+# 预先生成的后端配置JSON及其ETag，配置改变时清空
+_config_cache = {}
+
+
+@receiver(setting_changed)
+def _reset_config_cache(setting, **kwargs):
+    if setting == "UEDITOR_SETTINGS":
+        USettings.UpdateUserSettings()
+        _config_cache.clear()
+
+
+def get_config():
+    """返回(配置JSON, ETag)，只在第一次调用或配置改变后计算一次"""
+    if not _config_cache:
+        json_data = json.dumps(
+            USettings.UEditorUploadSettings,
+            ensure_ascii=False)
+        digest = hashlib.md5(json_data.encode("utf-8")).hexdigest()
+        _config_cache.update(json_data=json_data, digest=digest)
+    return _config_cache["json_data"], _config_cache["digest"]
+
+
 @csrf_exempt
 def get_ueditor_settings(request):
-    json_data = json.dumps(
-        USettings.UEditorUploadSettings,
-        ensure_ascii=False)
-    return HttpResponse(json_data, content_type="application/javascript")
+    json_data, digest = get_config()
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match and digest in parse_etags(if_none_match):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(json_data, content_type="application/javascript")
+    response["ETag"] = quote_etag(digest)
+    response["Cache-Control"] = "public, max-age=%d" % USettings.UEditorSettings.get(
+        "configMaxAge", 300)
+    return response
 
 
 @csrf_exempt
@@ -96,12 +159,13 @@ def list_files(request):
     list_size = long(request.GET.get("size", listSize[action]))
     list_start = long(request.GET.get("start", 0))
 
-    files = []
     root_path = os.path.join(
         USettings.gSettings.MEDIA_ROOT, listpath[action]).replace("\\", "/")
-    files = get_files(root_path, root_path, allowFiles[action])
+    # 从文件索引中取出已按修改时间排好序的当前页，只为当前页生成返回数据
+    files, total = fileindex.get_index(root_path).list_page(
+        allowFiles[action], list_start, list_size)
 
-    if (len(files) == 0):
+    if total == 0:
         return_info = {
             "state": u"未找到匹配文件！",
             "list": [],
@@ -111,36 +175,27 @@ def list_files(request):
     else:
         return_info = {
             "state": "SUCCESS",
-            "list": files[list_start:list_start + list_size],
+            "list": [list_item(root_path, rel_path, mtime)
+                     for rel_path, mtime in files],
             "start": list_start,
-            "total": len(files)
+            "total": total
         }
 
     return HttpResponse(json.dumps(return_info), content_type="application/javascript")
 
 
-def get_files(root_path, cur_path, allow_types=[]):
-    files = []
-    items = os.listdir(cur_path)
-    for item in items:
-        item_fullname = os.path.join(
-            root_path, cur_path, item).replace("\\", "/")
-        if os.path.isdir(item_fullname):
-            files.extend(get_files(root_path, item_fullname, allow_types))
-        else:
-            ext = os.path.splitext(item_fullname)[1]
-            is_allow_list = (len(allow_types) == 0) or (ext in allow_types)
-            if is_allow_list:
-                files.append({
-                    "url": urljoin(
-                        USettings.gSettings.MEDIA_URL,
-                        os.path.join(
-                            os.path.relpath(cur_path, root_path), item
-                            ).replace("\\", "/")),
-                    "mtime": os.path.getmtime(item_fullname)
-                })
-
-    return files
+def list_item(root_path, rel_path, mtime):
+    """文件列表中的一项，图片已生成缩小版本时同时返回各版本的URL"""
+    name = os.path.relpath(os.path.join(root_path, rel_path),
+                           USettings.gSettings.MEDIA_ROOT).replace("\\", "/")
+    item = {
+        "url": urljoin(USettings.gSettings.MEDIA_URL, name),
+        "mtime": mtime
+    }
+    variants = thumbnails.variant_urls(name)
+    if variants:
+        item["variants"] = variants
+    return item
 
 
 @csrf_exempt
@@ -160,13 +215,37 @@ def UploadFile(request):
     UploadFieldName = request.GET.get(
         upload_field_name[action], USettings.UEditorUploadSettings.get(action, "upfile"))
 
+    # 大小限制
+    upload_max_size = {
+        "uploadfile": "fileMaxSize",
+        "uploadimage": "imageMaxSize",
+        "uploadscrawl": "scrawlMaxSize",
+        "uploadvideo": "videoMaxSize"
+    }
+    max_size = long(request.GET.get(upload_max_size[
+                    action], USettings.UEditorUploadSettings.get(upload_max_size[action], 0)))
+    MF = FileSize(max_size)
+
     # 上传涂鸦，涂鸦是采用base64编码上传的，需要单独处理
     if action == "uploadscrawl":
         upload_file_name = "scrawl.png"
         upload_file_size = 0
     else:
+        # 在接收上传数据时就检查大小，超过限制的文件不会被完整接收后再拒绝
+        size_handler = MaxSizeUploadHandler(request, MF.size)
+        request.upload_handlers.insert(0, size_handler)
         # 取得上传的文件
         file = request.FILES.get(UploadFieldName, None)
+        if file is None and UploadFieldName in size_handler.exceeded:
+            upload_file_name = size_handler.exceeded[UploadFieldName]
+            return_info = {
+                'url': '',
+                'original': upload_file_name,
+                'type': os.path.splitext(upload_file_name)[1],
+                'state': u"上传文件大小不允许超过%s。" % MF.FriendValue,
+                'size': 0
+            }
+            return HttpResponse(json.dumps(return_info, ensure_ascii=False), content_type="application/javascript")
         if file is None:
             return HttpResponse(json.dumps(u"{'state:'ERROR'}"), content_type="application/javascript")
         upload_file_name = file.name
@@ -189,19 +268,8 @@ def UploadFile(request):
             state = u"服务器不允许上传%s类型的文件。" % upload_original_ext
 
     # 大小检验
-    upload_max_size = {
-        "uploadfile": "filwMaxSize",
-        "uploadimage": "imageMaxSize",
-        "uploadscrawl": "scrawlMaxSize",
-        "uploadvideo": "videoMaxSize"
-    }
-    max_size = long(request.GET.get(upload_max_size[
-                    action], USettings.UEditorUploadSettings.get(upload_max_size[action], 0)))
-    if max_size != 0:
-        from .utils import FileSize
-        MF = FileSize(max_size)
-        if upload_file_size > MF.size:
-            state = u"上传文件大小不允许超过%s。" % MF.FriendValue
+    if MF.size != 0 and upload_file_size > MF.size:
+        state = u"上传文件大小不允许超过%s。" % MF.FriendValue
 
     # 检测保存路径是否存在,如果不存在则需要创建
     upload_path_format = {
@@ -221,26 +289,46 @@ def UploadFile(request):
     OutputPathFormat, OutputPath, OutputFile = get_output_path(
         request, upload_path_format[action], path_format_var)
 
+    OutputUrl = urljoin(USettings.gSettings.MEDIA_URL, OutputPathFormat)
+    OutputFullPath = os.path.join(OutputPath, OutputFile)
     # 所有检测完成后写入文件
     if state == "SUCCESS":
         if action == "uploadscrawl":
             state = save_scrawl_file(
-                request, os.path.join(OutputPath, OutputFile))
+                request, os.path.join(OutputPath, OutputFile), MF.size)
+            if state == "SUCCESS":
+                upload_file_size = os.path.getsize(os.path.join(OutputPath, OutputFile))
         else:
             # 保存到文件中，如果保存错误，需要返回ERROR
             upload_module_name = USettings.UEditorUploadSettings.get(
                 "upload_module", None)
+            upload_storage = get_upload_storage()
             if upload_module_name:
                 mod = import_module(upload_module_name)
                 state = mod.upload(file, OutputPathFormat)
+            elif upload_storage is not None:
+                # 由存储决定最终的文件名，例如按内容寻址的存储返回内容摘要对应的文件名
+                try:
+                    name = upload_storage.save(OutputPathFormat, file)
+                    OutputUrl = upload_storage.url(name)
+                    OutputFullPath = upload_storage.path(name)
+                except NotImplementedError:
+                    OutputFullPath = None
+                except Exception as E:
+                    state = u"写入文件错误: %s" % E
             else:
                 state = save_upload_file(
                     file, os.path.join(OutputPath, OutputFile))
+        if state == "SUCCESS" and OutputFullPath:
+            fileindex.notify_saved(OutputFullPath)
+            if action in ("uploadimage", "uploadscrawl"):
+                # 已经生成过版本的图片（例如按内容寻址的存储中已有的相同内容）由submit跳过
+                thumbnails.submit(OutputFullPath)
 
     # 返回数据
     return_info = {
         # 保存后的文件名称
-        'url': urljoin(USettings.gSettings.MEDIA_URL, OutputPathFormat),
+        'url': OutputUrl,
         'original': upload_file_name,  # 原始文件名
         'type': upload_original_ext,
         'state': state,  # 上传状态，成功时返回SUCCESS,其他任何值将原样返回至图片上传框中
@@ -249,26 +337,102 @@ def UploadFile(request):
     return HttpResponse(json.dumps(return_info, ensure_ascii=False), content_type="application/javascript")
 
 
+# 远程抓图共用的线程池，限制同时进行的下载数
+_catcher_pool = None
+_catcher_pool_lock = threading.Lock()
+
+
+def get_catcher_pool():
+    global _catcher_pool
+    with _catcher_pool_lock:
+        if _catcher_pool is None:
+            _catcher_pool = ThreadPool(
+                USettings.UEditorSettings.get("catcherMaxWorkers", 8))
+        return _catcher_pool
+
+
+# 计算下载截止时间用的单调时钟，不受系统时间调整的影响（Python 2 没有，退回time.time）
+_monotonic = getattr(time, "monotonic", time.time)
+
+
+def fetch_remote_file(remote_url, filename, max_size, timeout):
+    """
+    下载一个远程文件，边读边写入磁盘，超过max_size或超时立即中止。
+    urlopen的timeout只限制每一次socket操作，服务器一点一点地发送数据时可以一直读下去；
+    这里在读取循环中按单调时钟检查截止时间，每次最多只接收一次（read1，Python 2 没有时
+    读取较小的块），服务器停止发送时由每次socket操作的timeout中止，
+    整个下载不会超过截止时间太多。
+    先写入同目录下的隐藏临时文件，成功后再改名，失败时删除。
+    返回(状态, 文件大小, 内容的sha256)
+    """
+    deadline = _monotonic() + timeout
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        remote_file = urlopen(remote_url, timeout=timeout)
+    except socket.timeout:
+        return u"抓取图片超时。", 0, None
+    except Exception as E:
+        return u"抓取图片错误：%s" % E, 0, None
+    if hasattr(remote_file, "read1"):
+        read, chunk_size = remote_file.read1, 65536
+    else:
+        read, chunk_size = remote_file.read, 8192
+    length = remote_file.info().get("Content-Length")
+    if max_size and length and length.isdigit() and long(length) > max_size:
+        remote_file.close()
+        return u"抓取图片大小超过限制。", 0, None
+    fd, tmp_filename = tempfile.mkstemp(
+        prefix=".", suffix=".part", dir=os.path.dirname(filename))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                if _monotonic() >= deadline:
+                    return u"抓取图片超时。", 0, None
+                chunk = read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size and size > max_size:
+                    return u"抓取图片大小超过限制。", 0, None
+                digest.update(chunk)
+                f.write(chunk)
+        # mkstemp 创建的文件只有属主可读，改为与普通上传文件相同的权限
+        os.chmod(tmp_filename, 0o644)
+        os.rename(tmp_filename, filename)
+    except socket.timeout:
+        return u"抓取图片超时。", 0, None
+    except Exception as E:
+        return u"抓取图片错误：%s" % E, 0, None
+    finally:
+        remote_file.close()
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+    return "SUCCESS", size, digest.hexdigest()
+
+
 @csrf_exempt
 def catcher_remote_image(request):
     """远程抓图，当catchRemoteImageEnable:true时，
         如果前端插入图片地址与当前web不在同一个域，则由本函数从远程下载图片到本地
+        多个地址在线程池中并发下载
     """
     if not request.method == "POST":
         return HttpResponse(json.dumps(u"{'state:'ERROR'}"), content_type="application/javascript")
 
-    state = "SUCCESS"
-
     allow_type = list(request.GET.get(
         "catcherAllowFiles", USettings.UEditorUploadSettings.get("catcherAllowFiles", "")))
     max_size = long(request.GET.get(
         "catcherMaxSize", USettings.UEditorUploadSettings.get("catcherMaxSize", 0)))
+    timeout = USettings.UEditorSettings.get("catcherTimeout", 15)
 
     remote_urls = request.POST.getlist("source[]", [])
     catcher_infos = []
-    path_format_var = get_path_format_vars()
+    jobs = []
 
     for remote_url in remote_urls:
+        # 每个地址重新取随机数，避免同名图片保存到同一个文件
+        path_format_var = get_path_format_vars()
         # 取得上传的文件的原始名称
         remote_file_name = os.path.basename(remote_url)
         remote_original_name, remote_original_ext = os.path.splitext(
@@ -284,29 +448,31 @@ def catcher_remote_image(request):
             o_path_format, o_path, o_file = get_output_path(
                 request, "catcherPathFormat", path_format_var)
             o_filename = os.path.join(o_path, o_file).replace("\\", "/")
-            # 读取远程图片文件
-            try:
-                remote_image = urlopen(remote_url)
-                # 将抓取到的文件写入文件
-                try:
-                    f = open(o_filename, 'wb')
-                    f.write(remote_image.read())
-                    f.close()
-                    state = "SUCCESS"
-                except Exception as E:
-                    state = u"写入抓取图片文件错误:%s" % E.message
-            except Exception as E:
-                state = u"抓取图片错误：%s" % E.message
-
+            jobs.append((remote_url, o_filename, max_size, timeout))
             catcher_infos.append({
-                "state": state,
                 "url": urljoin(USettings.gSettings.MEDIA_URL, o_path_format),
-                "size": os.path.getsize(o_filename),
                 "title": os.path.basename(o_file),
                 "original": remote_file_name,
                 "source": remote_url
             })
 
+    results = get_catcher_pool().map(lambda job: fetch_remote_file(*job), jobs)
+
+    # 内容相同的图片只保留一份，其余的指向第一份
+    dedup = USettings.UEditorSettings.get("catcherDedup", False)
+    saved = {}
+    for info, job, (state, size, digest) in zip(catcher_infos, jobs, results):
+        info.update({"state": state, "size": size})
+        if state != "SUCCESS":
+            continue
+        if dedup and digest in saved:
+            os.remove(job[1])
+            info["url"] = saved[digest]
+        else:
+            saved[digest] = info["url"]
+            fileindex.notify_saved(job[1])
+            thumbnails.submit(job[1])
+
     return_info = {
         "state": "SUCCESS" if len(catcher_infos) > 0 else "ERROR",
         "list": catcher_infos
@@ -333,16 +499,35 @@ def get_output_path(request, path_format, path_format_var):
 
 
 # 涂鸦功能上传处理
-@csrf_exempt
-def save_scrawl_file(request, filename):
-    import base64
+# 涂鸦以base64编码提交，边读取请求体边解码写入文件，不在内存中保存整个图片
+def save_scrawl_file(request, filename, max_size=0):
+    field_name = USettings.UEditorUploadSettings.get("scrawlFieldName", "upfile")
     try:
-        content = request.POST.get(
-            USettings.UEditorUploadSettings.get("scrawlFieldName", "upfile"))
-        f = open(filename, 'wb')
-        f.write(base64.decodestring(content))
-        f.close()
+        if request.META.get("CONTENT_TYPE", "").startswith("multipart/"):
+            handler = ScrawlUploadHandler(request, field_name, max_size)
+            request.upload_handlers.insert(0, handler)
+            scrawl = request.FILES.get(field_name)
+            if handler.error:
+                return handler.error
+            if scrawl is not None:
+                return save_upload_file(scrawl, filename)
+            chunks = None
+        else:
+            # 编辑器以application/x-www-form-urlencoded提交涂鸦，直接读取请求体
+            chunks = read_urlencoded_field(request, field_name)
+            first = next(chunks, None)
+            if first is not None:
+                chunks = itertools.chain([first], chunks)
+            else:
+                chunks = None
+        if chunks is None:
+            # 请求体已被读取（如已访问过request.POST），或以普通表单字段提交
+            content = request.POST.get(field_name, "").encode("ascii")
+            chunks = (content[i:i + 65536] for i in range(0, len(content), 65536))
+        decode_base64_to_file(chunks, filename, max_size)
         state = "SUCCESS"
+    except ValueError as E:
+        state = u"%s" % E
     except Exception as E:
-        state = "写入图片文件错误: {}".format(E.message)
+        state = u"写入图片文件错误: {}".format(E)
     return state
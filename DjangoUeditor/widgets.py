@@ -1,8 +1,16 @@
 # coding:utf-8
+import json
+import re
+import threading
+from collections import OrderedDict
 from django import forms
 from django.conf import settings
 from django.contrib.admin.widgets import AdminTextareaWidget
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.template.loader import render_to_string
+from django.utils.encoding import force_text
+from django.utils.html import escape
 from django.utils.safestring import mark_safe
 from django.utils.http import urlencode
 from . import settings as USettings
@@ -28,6 +36,24 @@ def calc_path(OutputPath, instance=None):
 
     return OutputPath
 
+# 渲染结果缓存：以编辑器配置和上传配置为键，值为按占位符切开的渲染结果，
+# 渲染时只需要把字段名、id和内容填回去；最多保存RENDER_CACHE_SIZE种配置，超过时淘汰最久未用的
+RENDER_CACHE_SIZE = 128
+_render_cache = OrderedDict()
+_render_cache_lock = threading.Lock()
+_SENTINELS = {
+    "__UEDITOR_NAME_SENTINEL__": "name",
+    "__UEDITOR_ID_SENTINEL__": "id",
+    "__UEDITOR_VALUE_SENTINEL__": "value",
+}
+_SENTINEL_RE = re.compile("(%s)" % "|".join(_SENTINELS))
+
+
+@receiver(setting_changed)
+def _clear_render_cache(**kwargs):
+    with _render_cache_lock:
+        _render_cache.clear()
+
 # width=600, height=300, toolbars="full", imagePath="", filePath="", upload_settings={},
     # settings={},command=None,event_handler=None
 
@@ -130,8 +156,44 @@ class UEditorWidget(forms.Textarea):
     def render(self, name, value, attrs=None):
         if value is None:
             value = ''
-        # 传入模板的参数
         editor_id = "id_%s" % name.replace("-", "_")
+        key = self.render_key()
+        # 字段名在模板中会被转义，含有需要转义的字符时不使用缓存
+        if key is None or escape(name) != name:
+            return self.render_template(name, editor_id, value)
+        with _render_cache_lock:
+            segments = _render_cache.pop(key, None)
+            if segments is not None:
+                _render_cache[key] = segments
+        if segments is None:
+            html = self.render_template(
+                "__UEDITOR_NAME_SENTINEL__", "__UEDITOR_ID_SENTINEL__",
+                "__UEDITOR_VALUE_SENTINEL__")
+            segments = [_SENTINELS.get(part, part) if i % 2 else part
+                        for i, part in enumerate(_SENTINEL_RE.split(html))]
+            with _render_cache_lock:
+                _render_cache[key] = segments
+                while len(_render_cache) > RENDER_CACHE_SIZE:
+                    _render_cache.popitem(last=False)
+        values = {"name": name, "id": editor_id, "value": force_text(value)}
+        return mark_safe("".join(
+            values[part] if i % 2 else part for i, part in enumerate(segments)))
+
+    def render_key(self):
+        """
+        渲染结果的缓存键，不能缓存时返回None：扩展命令和事件侦听是任意对象，
+        可能每个实例都不同，有它们时不缓存；编辑器配置不能转成JSON时也不缓存
+        """
+        if self.command is not None or self.event_handler is not None:
+            return None
+        try:
+            ueditor_settings = json.dumps(self.ueditor_settings, sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        return ueditor_settings, urlencode(sorted(self._upload_settings.items()))
+
+    def render_template(self, name, editor_id, value):
+        # 传入模板的参数
         uSettings = {
             "name": name,
             "id": editor_id,
@@ -73,6 +73,7 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
+    'home.auth.ApiAuthMiddleware', # 设备 API 的令牌/APIKEY 认证
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -91,6 +92,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # 连接池：请求结束时连接归还池中复用，不再每个请求重新打开连接；
+        # 同一进程的线程共享最多 MAX_SIZE 个连接，取不到连接时最多等待 TIMEOUT 秒。
+        'POOL': {
+            'MAX_SIZE': 10,
+            'TIMEOUT': 30,
+        },
+    }
+}
+
+
+# 缓存配置，默认使用进程内缓存。传感器最新数据与设备心跳在缓存中各占一项，
+# MAX_ENTRIES 应大于传感器与设备数量之和，否则它们会被提前淘汰（默认只有 300 项）。
+# 传感器最新数据写入数据库后才放进缓存，缓存只用于加快读取；
+# 多进程部署时建议配置为 memcached 等共享缓存，各进程才能看到彼此缓存的心跳和版本号。
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
 
@@ -124,3 +145,40 @@ STATICFILES_DIRS = (
 # 存放图片，视频，文件等资源的地方，位于该项目下的media文件。
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# 数据点批量写入接口的设置：每批 INSERT 的行数，以及单次请求允许的最大读数条数。
+SH_INGEST_BATCH_SIZE = 1000
+SH_INGEST_MAX_READINGS = 100000
+
+# 数据点压缩存储的时间窗口长度（秒），每个传感器每个窗口打包成一个数据块。
+SH_DATAPOINT_BLOCK_SECONDS = 3600
+
+# 数据点区间查询每页默认与最多返回的条数。
+SH_RANGE_LIMIT = 500
+SH_RANGE_MAX_LIMIT = 5000
+
+# 查询传感器历史数据时默认返回的最多点数，以及客户端可以指定的最大点数。
+SH_ROLLUP_POINTS = 1000
+SH_ROLLUP_MAX_POINTS = 10000
+
+# 设备 API 认证结果的进程内缓存：容量、有效令牌最长缓存时间、无效令牌缓存时间（秒）。
+# 令牌或 APIKEY 修改后靠 Django 缓存中的版本号通知各进程；不是共享缓存时，
+# 其他进程最多在 SH_AUTH_CACHE_TTL 秒后才会看到修改。
+SH_AUTH_CACHE_SIZE = 10000
+SH_AUTH_CACHE_TTL = 300
+SH_AUTH_NEGATIVE_TTL = 30
+
+# 导出数据点时每次从数据库读取的行数。
+SH_EXPORT_CHUNK_SIZE = 2000
+# 导出时是否用一条查询流式读取（iterator(chunk_size)），None 表示除 SQLite 外都流式读取。
+SH_EXPORT_STREAM = None
+
+# 传感器类型等小表的进程内缓存，对比共享缓存中版本号的最短间隔（秒）。
+# 版本号依赖共享缓存（上面的 CACHES）才能通知其他进程；默认的进程内缓存下，
+# 其他进程靠 SH_REGISTRY_MAX_AGE 到期后重新读取整表（秒）。
+SH_REGISTRY_CHECK_INTERVAL = 5
+SH_REGISTRY_MAX_AGE = 300
+
+# 设备心跳从缓存写回 tb_device 的间隔（秒），以及判断设备在线的时间窗口（秒）。
+SH_HEARTBEAT_FLUSH_INTERVAL = 30
+SH_HEARTBEAT_ONLINE_WINDOW = 90
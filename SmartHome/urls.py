@@ -41,14 +41,47 @@ urlpatterns = [
     # 定义获取设备信息的URL：http://127.0.0.1:8000/sh_device/<device_id>
     url(r'^sh_device/(?P<sh_id>[^/]+)/$',views.sh_device,name = 'sh_device'),
 
+    # 设备心跳接口（POST，需要认证）：http://127.0.0.1:8000/sh_device/<device_id>/heartbeat/
+    url(r'^sh_device/(?P<sh_id>[^/]+)/heartbeat/$',views.sh_device_heartbeat,name = 'sh_device_heartbeat'),
+
     # 定义获取传感器信息的接口：http://127.0.0.1:8000/sh_sensor/<device_id>
     url(r'^sh_sensor/(?P<sh_id>[^/]+)/$',views.sh_sensor,name = 'sh_sensor'),
 
+    # 传感器历史数据（按点数自动选择汇总粒度）：
+    # http://127.0.0.1:8000/sh_sensor/<sensor_id>/history/?start=<t1>&end=<t2>&points=1000
+    url(r'^sh_sensor/(?P<sh_id>[^/]+)/history/$',views.sh_sensor_history,name = 'sh_sensor_history'),
+
     # 定义获取传感器类型的接口：http://127.0.0.1:8000/sh_sensor_typer/<device_id>
     url(r'^sh_sensor_type/(?P<sh_id>[^/]+)/$',views.sh_sensor_type,name = 'sh_sensor_type'),
 
+    # 数据点批量写入接口（POST）：http://127.0.0.1:8000/sh_datapoint_list/ingest/
+    # 必须放在数据点详情接口之前，否则 ingest 会被当作 ID 匹配。
+    url(r'^sh_datapoint_list/ingest/$',views.sh_datapoint_ingest,name = 'sh_datapoint_ingest'),
+
+    # 数据点区间查询接口（GET，游标分页）：
+    # http://127.0.0.1:8000/sh_datapoint_list/range/?sh_sensor_id=<sensor_id>&start=<t1>&end=<t2>
+    url(r'^sh_datapoint_list/range/$',views.sh_datapoint_range,name = 'sh_datapoint_range'),
+
+    # 数据点导出接口（CSV/NDJSON，可选 gzip）：
+    # http://127.0.0.1:8000/sh_datapoint_list/export/?sh_sensor_id=<sensor_id>&format=csv&gzip=1
+    url(r'^sh_datapoint_list/export/$',views.sh_datapoint_export,name = 'sh_datapoint_export'),
+
     # 定义数据点的接口：http://127.0.0.1:8000/sh_datapoint_list/<sensor_id>
     url(r'^sh_datapoint_list/(?P<sh_id>[^/]+)/$',views.sh_datapoint_list,name = 'sh_datapoint_list'),
+
+    # 首页快照（需要认证）：用户的设备、传感器、类型和最新数据：http://127.0.0.1:8000/api/home/
+    url(r'^api/home/$',views.api_home,name = 'api_home'),
+
+    # 在线设备（需要认证）：最近 window 秒内有心跳的设备：http://127.0.0.1:8000/api/online/?window=90
+    url(r'^api/online/$',views.api_online_devices,name = 'api_online_devices'),
+
+    # JSON 接口，resource 为 sh_user、sh_device、sh_sensor、sh_sensor_type、sh_datapoint_list：
+    # 单个资源：http://127.0.0.1:8000/api/<resource>/<sh_id>/?fields=<字段1>,<字段2>
+    # 批量查询：http://127.0.0.1:8000/api/<resource>/?ids=1,2,3&fields=<字段1>,<字段2>
+    url(r'^api/(?P<resource>sh_user|sh_device|sh_sensor|sh_sensor_type|sh_datapoint_list)/$',
+        views.api_objects,name = 'api_objects'),
+    url(r'^api/(?P<resource>sh_user|sh_device|sh_sensor|sh_sensor_type|sh_datapoint_list)/(?P<sh_id>[^/]+)/$',
+        views.api_object,name = 'api_object'),
 ]
 
 # 添加文本框优化时添加的设置。
@@ -1,5 +1,6 @@
 #_*_ coding: utf-8 _*_
 from django.contrib import admin
+from django.core.paginator import KeysetPaginator
 from .models import *
 
 # Register your models heore.
@@ -12,13 +13,19 @@ class tb_userAdmin(admin.ModelAdmin):
 class tb_user_tokenAdmin(admin.ModelAdmin):
     list_display = ('sh_user_id','sh_token','sh_deadline')
 class tb_deviceAdmin(admin.ModelAdmin):
-    list_display = ('sh_id','sh_name','sh_tags','sh_locate','sh_about','sh_user_id','sh_create_time','sh_last_active','sh_status')
+    list_display = ('sh_id','sh_name','sh_tags','sh_locate','sh_about','sh_user_id','sh_create_time','sh_last_active','sh_last_heartbeat','sh_status')
 class tb_sensorAdmin(admin.ModelAdmin):
     list_display = ('sh_id','sh_name','sh_tags','sh_type','sh_about','sh_device_id','sh_last_update','sh_last_data','sh_status')
 class tb_sensor_typeAdmin(admin.ModelAdmin):
-    list_display = ('sh_id','sh_name','sh_description','sh_status')
+    list_display = ('sh_id','sh_name','sh_description','sh_status','sh_raw_retention','sh_rollup_retention')
 class tb_datapoint_listAdmin(admin.ModelAdmin):
     list_display = ('sh_id','sh_sensor_id','sh_timestamp','sh_value')
+    # 数据点表很大：翻页按主键定位（不用 OFFSET），总行数取数据库的估算值（不用 COUNT(*)）
+    paginator = KeysetPaginator
+class tb_datapoint_blockAdmin(admin.ModelAdmin):
+    list_display = ('sh_sensor_id','sh_start','sh_end','sh_count')
+class tb_datapoint_rollupAdmin(admin.ModelAdmin):
+    list_display = ('sh_sensor_id','sh_resolution','sh_bucket','sh_count','sh_min','sh_max','sh_last')
 
 admin.site.register(tb_user, tb_userAdmin)
 admin.site.register(tb_user_token, tb_user_tokenAdmin)
@@ -26,6 +33,8 @@ admin.site.register(tb_device, tb_deviceAdmin)
 admin.site.register(tb_sensor, tb_sensorAdmin)
 admin.site.register(tb_sensor_type, tb_sensor_typeAdmin)
 admin.site.register(tb_datapoint_list, tb_datapoint_listAdmin)
+admin.site.register(tb_datapoint_block, tb_datapoint_blockAdmin)
+admin.site.register(tb_datapoint_rollup, tb_datapoint_rollupAdmin)
 
 
 # 方法二：
@@ -36,4 +45,6 @@ admin.site.register(tb_device)
 admin.site.register(tb_sensor)
 admin.site.register(tb_sensor_type)
 admin.site.register(tb_datapoint_list)
+admin.site.register(tb_datapoint_block)
+admin.site.register(tb_datapoint_rollup)
 '''
@@ -0,0 +1,206 @@
+#_*_ coding:utf-8 _*_
+
+# JSON 接口的公共部分：JSON 响应、ETag 条件请求，以及各资源允许返回的字段。
+# 客户端通过 ?fields=a,b,c 只取需要的字段，查询时用 values() 只读取这些列。
+# 接口需要认证，每种资源只返回属于当前用户的行（用户本人、名下的设备、这些设备的
+# 传感器和数据点）；传感器类型是公共数据。
+
+from __future__ import unicode_literals
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+from .models import tb_user, tb_device, tb_sensor, tb_datapoint_list
+from .registry import sensor_types
+from . import heartbeat, latest
+
+# 一次批量查询最多允许的ID个数。
+MAX_IDS = 1000
+# 每条查询最多包含的ID个数，加上归属条件的参数也不超过 SQLite 单条语句 999 个参数的限制。
+FETCH_BATCH_SIZE = 500
+
+
+def owned_devices(user_id):
+    """用户名下设备的 sh_id，作为子查询使用。"""
+    return tb_device.objects.filter(sh_user_id=user_id).values('sh_id')
+
+
+def owned_sensors(user_id):
+    """用户名下设备的传感器的 sh_id，作为子查询使用。"""
+    return tb_sensor.objects.filter(sh_device_id__in=owned_devices(user_id)).values('sh_id')
+
+
+def owns_sensor(user_id, sensor_id):
+    """传感器是否属于用户名下的设备。"""
+    return tb_sensor.objects.filter(
+        sh_id=sensor_id, sh_device_id__in=owned_devices(user_id)).exists()
+
+
+class Resource(object):
+    """
+    一种可以通过 JSON 接口查询的资源：对应的模型，允许返回的字段，
+    以及 owner(user_id)，返回只保留该用户可见的行的 Q 对象。
+    """
+
+    def __init__(self, model, fields, owner):
+        self.model = model
+        self.fields = fields
+        self.owner = owner
+
+    def parse_fields(self, value):
+        """解析 ?fields= 参数，返回字段列表；包含不允许的字段时抛出 ValueError。"""
+        if not value:
+            return list(self.fields)
+        fields = [f.strip() for f in value.split(',') if f.strip()]
+        unknown = [f for f in fields if f not in self.fields]
+        if unknown:
+            raise ValueError('不支持的字段：%s' % ','.join(unknown))
+        # sh_id 总是返回，客户端靠它对应结果
+        if 'sh_id' not in fields:
+            fields.insert(0, 'sh_id')
+        return fields
+
+    def fetch(self, fields, ids, user_id):
+        """
+        按 sh_id 批量查询用户可见的行，只读取需要的列，返回 {sh_id: dict}。
+        每 FETCH_BATCH_SIZE 个ID一条查询。
+        """
+        queryset = self.model.objects.filter(self.owner(user_id))
+        ids = sorted(set(ids))
+        result = {}
+        for i in range(0, len(ids), FETCH_BATCH_SIZE):
+            for row in queryset.filter(sh_id__in=ids[i:i + FETCH_BATCH_SIZE]).values(*fields):
+                result[row['sh_id']] = row
+        return self.postprocess(result, fields)
+
+    def postprocess(self, rows, fields):
+        return rows
+
+
+class SensorResource(Resource):
+    """传感器的最新数据以缓存为准。"""
+
+    def postprocess(self, rows, fields):
+        if 'sh_last_data' not in fields and 'sh_last_update' not in fields:
+            return rows
+        for sensor_id, (timestamp, value) in latest.get_many(list(rows)).items():
+            row = rows[sensor_id]
+            if 'sh_last_data' in row:
+                row['sh_last_data'] = '%s' % value
+            if 'sh_last_update' in row:
+                row['sh_last_update'] = latest.to_date(timestamp)
+        return rows
+
+
+class DeviceResource(Resource):
+    """设备的最后心跳以缓存为准。"""
+
+    def postprocess(self, rows, fields):
+        if 'sh_last_heartbeat' in fields:
+            for device_id, timestamp in heartbeat.get_many(list(rows)).items():
+                rows[device_id]['sh_last_heartbeat'] = timestamp
+        return rows
+
+
+class RegistryResource(Resource):
+    """数据来自进程内缓存的小表（registry），不查询数据库，所有用户都可见。"""
+
+    def __init__(self, registry, fields):
+        super(RegistryResource, self).__init__(registry.model, fields, None)
+        self.registry = registry
+
+    def fetch(self, fields, ids, user_id):
+        return dict((sh_id, dict((f, row[f]) for f in fields))
+                    for sh_id, row in self.registry.get_many(ids).items())
+
+
+# 用户的密码、令牌和 APIKEY 不通过接口返回。
+RESOURCES = {
+    'sh_user': Resource(tb_user, (
+        'sh_id', 'sh_username', 'sh_email', 'sh_regtime', 'sh_status', 'sh_about'),
+        lambda user_id: Q(sh_id=user_id)),
+    'sh_device': DeviceResource(tb_device, (
+        'sh_id', 'sh_name', 'sh_tags', 'sh_locate', 'sh_user_id', 'sh_create_time',
+        'sh_last_active', 'sh_last_heartbeat', 'sh_status', 'sh_about'),
+        lambda user_id: Q(sh_user_id=user_id)),
+    'sh_sensor': SensorResource(tb_sensor, (
+        'sh_id', 'sh_name', 'sh_tags', 'sh_type', 'sh_device_id', 'sh_last_update',
+        'sh_last_data', 'sh_status', 'sh_about'),
+        lambda user_id: Q(sh_device_id__in=owned_devices(user_id))),
+    'sh_sensor_type': RegistryResource(sensor_types, (
+        'sh_id', 'sh_name', 'sh_description', 'sh_status', 'sh_raw_retention',
+        'sh_rollup_retention')),
+    # 按 sh_id 只能查到原始数据点；已打包进数据块的数据点没有 sh_id，
+    # 请使用区间查询或导出接口按（传感器，时间）读取。
+    'sh_datapoint_list': Resource(tb_datapoint_list, (
+        'sh_id', 'sh_sensor_id', 'sh_timestamp', 'sh_value'),
+        lambda user_id: Q(sh_sensor_id__in=owned_sensors(user_id))),
+}
+
+
+# 首页快照中各层返回的字段。
+SNAPSHOT_USER_FIELDS = ('sh_id', 'sh_username', 'sh_email', 'sh_status')
+SNAPSHOT_DEVICE_FIELDS = ('sh_id', 'sh_name', 'sh_tags', 'sh_locate',
+                          'sh_last_active', 'sh_status')
+SNAPSHOT_SENSOR_FIELDS = ('sh_id', 'sh_name', 'sh_tags', 'sh_type', 'sh_device_id',
+                          'sh_last_update', 'sh_last_data', 'sh_status')
+SNAPSHOT_TYPE_FIELDS = ('sh_id', 'sh_name', 'sh_description')
+
+
+def home_snapshot(user_id):
+    """
+    返回用户 → 设备 → 传感器 → 传感器类型 → 最新数据的完整树，用户不存在时返回 None。
+    表之间只用整数ID关联，不能用 select_related，这里每层一次批量查询，
+    无论有多少设备和传感器，都只有 3 条 SQL 加一次缓存读取，传感器类型来自进程内缓存。
+    """
+    user = tb_user.objects.filter(sh_id=user_id).values(*SNAPSHOT_USER_FIELDS).first()
+    if user is None:
+        return None
+    devices = list(tb_device.objects.filter(sh_user_id=user_id)
+                   .order_by('sh_id').values(*SNAPSHOT_DEVICE_FIELDS))
+    # 设备很多时ID列表会超过 SQLite 单条语句 999 个参数的限制，用子查询
+    sensors = list(tb_sensor.objects.filter(sh_device_id__in=owned_devices(user_id))
+                   .order_by('sh_id').values(*SNAPSHOT_SENSOR_FIELDS)) if devices else []
+    types = dict((sh_id, dict((f, t[f]) for f in SNAPSHOT_TYPE_FIELDS)) for sh_id, t in
+                 sensor_types.get_many(set(s['sh_type'] for s in sensors)).items())
+    cached = latest.get_many([s['sh_id'] for s in sensors])
+
+    by_device = {}
+    for sensor in sensors:
+        sensor['type'] = types.get(sensor['sh_type'])
+        if sensor['sh_id'] in cached:
+            timestamp, value = cached[sensor['sh_id']]
+            sensor['sh_last_data'] = '%s' % value
+            sensor['sh_last_update'] = latest.to_date(timestamp)
+        by_device.setdefault(sensor.pop('sh_device_id'), []).append(sensor)
+    for device in devices:
+        device['sensors'] = by_device.get(device['sh_id'], [])
+    user['devices'] = devices
+    return user
+
+
+def json_response(data, status=200):
+    """返回 JSON 格式的响应。"""
+    return HttpResponse(json.dumps(data, ensure_ascii=False, cls=DjangoJSONEncoder),
+                        status=status, content_type='application/json')
+
+
+def conditional_json_response(request, data):
+    """
+    返回带 ETag 的 JSON 响应；客户端的 If-None-Match 与 ETag 相同时返回 304，
+    不再传输响应体。
+    """
+    response = json_response(data)
+    digest = hashlib.md5(response.content).hexdigest()
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        if '*' in etags or digest in etags:
+            response = HttpResponseNotModified()
+    response['ETag'] = quote_etag(digest)
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return response
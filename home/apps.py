@@ -0,0 +1,11 @@
+#_*_ coding:utf-8 _*_
+
+from django.apps import AppConfig
+
+
+class HomeConfig(AppConfig):
+    name = 'home'
+
+    def ready(self):
+        # 导入以注册缓存失效的信号处理函数，保证在任何进程中修改数据都会通知其他进程
+        from . import auth, registry  # noqa
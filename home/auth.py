@@ -0,0 +1,175 @@
+#_*_ coding:utf-8 _*_
+
+# 设备 API 的令牌认证。
+# 请求可以携带 “Authorization: Bearer <令牌>”（tb_user_token.sh_token），
+# 或者 “U-ApiKey: <APIKEY>”（tb_user.sh_apikey）。
+# 查询结果（包括查不到的结果）缓存在进程内的 LRU 中：有效令牌最多缓存到 sh_deadline，
+# 无效令牌缓存较短的时间，这样大部分请求的认证不需要访问数据库。
+# 缓存的每个结果都带着查询时的版本号，版本号保存在 Django 缓存中。令牌或用户被修改、
+# 删除时（包括改掉旧值的情况）增加版本号，之前缓存的结果全部作废；Django 缓存是
+# memcached 等共享缓存时，其他进程也随之失效。QuerySet.update() 不发送信号，
+# 批量修改令牌或 APIKEY 之后需要调用 invalidate()。
+
+from __future__ import unicode_literals
+from collections import OrderedDict
+from functools import wraps
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from .models import tb_user, tb_user_token
+
+# LRU 容量、有效结果最长缓存时间、无效结果缓存时间（秒）。
+CACHE_SIZE = getattr(settings, 'SH_AUTH_CACHE_SIZE', 10000)
+POSITIVE_TTL = getattr(settings, 'SH_AUTH_CACHE_TTL', 300)
+NEGATIVE_TTL = getattr(settings, 'SH_AUTH_NEGATIVE_TTL', 30)
+# 认证结果版本号的缓存键。
+VERSION_KEY = 'sh_auth:version'
+
+
+class LRUCache(object):
+    """带过期时间的 LRU 缓存，线程安全。"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            value, expires = item
+            if expires <= time.time():
+                return default
+            # 重新插入到末尾，表示最近使用过
+            self._data[key] = item
+            return value
+
+    def set(self, key, value, expires):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_cache = LRUCache(CACHE_SIZE)
+_MISSING = object()
+
+
+def _lookup_token(token, now):
+    row = tb_user_token.objects.filter(
+        sh_token=token, sh_deadline__gt=now).order_by('-sh_deadline').values_list(
+        'sh_user_id', 'sh_deadline').first()
+    if row is None:
+        return None, now + NEGATIVE_TTL
+    user_id, deadline = row
+    return user_id, min(deadline, now + POSITIVE_TTL)
+
+
+def _lookup_apikey(apikey, now):
+    user_id = tb_user.objects.filter(sh_apikey=apikey, sh_status=True).values_list(
+        'sh_id', flat=True).first()
+    if user_id is None:
+        return None, now + NEGATIVE_TTL
+    return user_id, now + POSITIVE_TTL
+
+
+def _version():
+    """返回认证结果当前的版本号。"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # 版本号丢失（缓存被清空或淘汰）时从当前时间重新开始，不会与之前用过的版本号相同
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def authenticate(token=None, apikey=None):
+    """返回令牌或 APIKEY 对应的用户ID，认证失败返回 None。"""
+    if token:
+        key, lookup, credential = 'token:' + token, _lookup_token, token
+    elif apikey:
+        key, lookup, credential = 'apikey:' + apikey, _lookup_apikey, apikey
+    else:
+        return None
+    version = _version()
+    # 缓存中的 None 表示“查不到”，与“没有缓存”（_MISSING）区分开
+    item = _cache.get(key, _MISSING)
+    if item is not _MISSING and item[1] == version:
+        return item[0]
+    now = int(time.time())
+    user_id, expires = lookup(credential, now)
+    _cache.set(key, (user_id, version), expires)
+    return user_id
+
+
+def invalidate():
+    """令牌或 APIKEY 被修改、删除后调用，作废所有进程中缓存的认证结果。"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        _version()
+    _cache.clear()
+
+
+@receiver([post_save, post_delete], sender=tb_user_token)
+@receiver([post_save, post_delete], sender=tb_user)
+def _invalidate(sender, **kwargs):
+    invalidate()
+
+
+def get_credentials(request):
+    """从请求头中取出 (令牌, APIKEY)。"""
+    token = None
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if authorization[:7].lower() == 'bearer ':
+        token = authorization[7:].strip() or None
+    apikey = request.META.get('HTTP_U_APIKEY', '').strip() or None
+    return token, apikey
+
+
+class ApiAuthMiddleware(object):
+    """
+    为每个请求设置 request.sh_user_id：认证通过时为用户ID，否则为 None。
+    本中间件不拒绝请求，需要认证的视图使用 api_auth_required 装饰器。
+    """
+
+    def process_request(self, request):
+        token, apikey = get_credentials(request)
+        request.sh_user_id = authenticate(token=token, apikey=apikey)
+
+
+def api_auth_required(view):
+    """要求请求通过令牌或 APIKEY 认证，否则返回 401。"""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not hasattr(request, 'sh_user_id'):
+            # 未启用 ApiAuthMiddleware 时在这里认证
+            token, apikey = get_credentials(request)
+            request.sh_user_id = authenticate(token=token, apikey=apikey)
+        if request.sh_user_id is None:
+            response = HttpResponse(
+                json.dumps({'state': u'认证失败，请提供有效的令牌或 APIKEY。'},
+                           ensure_ascii=False),
+                status=401, content_type='application/json')
+            response['WWW-Authenticate'] = 'Bearer'
+            return response
+        return view(request, *args, **kwargs)
+    return wrapped
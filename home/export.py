@@ -0,0 +1,93 @@
+#_*_ coding:utf-8 _*_
+
+# 数据点导出（CSV / NDJSON，可选 gzip 压缩）。
+# 边读边写，内存占用与导出的总行数无关。读取方式有两种：
+#   流式：一条查询，iterator(chunk_size) 每次从游标取 chunk_size 行
+#         （PostgreSQL 上为服务器端游标），往返次数为 总行数 / chunk_size；
+#   分块：按时间戳分块，每块一条走 (sh_sensor_id, sh_timestamp) 索引的短查询。
+# 已打包进数据块的数据点与原始数据合并后按时间顺序导出，见 timeseries.iter_points。
+# 流式读取期间查询一直打开，SQLite（非 WAL 模式）会一直持有读锁，
+# 阻塞其他连接提交写入（例如 ingest），所以 SQLite 上默认分块读取。
+
+from __future__ import unicode_literals
+import json
+import zlib
+
+from django.conf import settings
+from django.db import connection
+
+from . import timeseries
+
+# 每次从数据库读取的行数。
+CHUNK_SIZE = getattr(settings, 'SH_EXPORT_CHUNK_SIZE', 2000)
+# 是否流式读取，None 表示除 SQLite 外都流式读取。
+STREAM = getattr(settings, 'SH_EXPORT_STREAM', None)
+
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+COLUMNS = ('sh_id', 'sh_sensor_id', 'sh_timestamp', 'sh_value')
+
+
+def iter_rows(sensor_id, start=None, end=None, chunk_size=CHUNK_SIZE, stream=False):
+    """
+    按时间顺序产生 (sh_id, sh_sensor_id, sh_timestamp, sh_value)，包括已打包进数据块的
+    数据点（sh_id 为 None）。stream 为 True 时原始数据用一条查询流式读取。
+    """
+    for timestamp, value, sh_id in timeseries.iter_points(
+            sensor_id, start, end, chunk_size, stream):
+        yield sh_id, sensor_id, timestamp, value
+
+
+def use_stream():
+    if STREAM is not None:
+        return STREAM
+    return connection.vendor != 'sqlite'
+
+
+def _format_value(value):
+    return '' if value is None else repr(value)
+
+
+def iter_csv(rows):
+    yield ','.join(COLUMNS) + '\n'
+    for sh_id, sensor_id, timestamp, value in rows:
+        yield '%s,%d,%d,%s\n' % ('' if sh_id is None else sh_id, sensor_id, timestamp,
+                                  _format_value(value))
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(COLUMNS, row))) + '\n'
+
+
+def iter_gzip(chunks):
+    """把文本块流式压缩为 gzip 格式的 bytes 块。"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _buffered(lines, size=65536):
+    """把逐行的文本合并成较大的 bytes 块，减少写出的次数。"""
+    buf, length = [], 0
+    for line in lines:
+        line = line.encode('utf-8')
+        buf.append(line)
+        length += len(line)
+        if length >= size:
+            yield b''.join(buf)
+            buf, length = [], 0
+    if buf:
+        yield b''.join(buf)
+
+
+def export(sensor_id, start=None, end=None, format='csv', compress=False,
+           chunk_size=CHUNK_SIZE):
+    """返回导出内容的 bytes 块迭代器。"""
+    rows = iter_rows(sensor_id, start, end, chunk_size, use_stream())
+    lines = iter_csv(rows) if format == 'csv' else iter_ndjson(rows)
+    chunks = _buffered(lines)
+    return iter_gzip(chunks) if compress else chunks
@@ -0,0 +1,173 @@
+#_*_ coding:utf-8 _*_
+
+# 设备心跳。
+# 设备定期调用心跳接口，心跳时间（精确到小数秒的时间戳）只写入 Django 缓存，
+# 进程内记录收到心跳的设备，按 SH_HEARTBEAT_FLUSH_INTERVAL 定期用一条
+# UPDATE ... CASE 批量写回 tb_device.sh_last_heartbeat，同时更新 sh_last_active（日期）。
+# 写回只修改这两列，不会像 Model.save() 那样重写 sh_about 等所有列。
+# 在线设备按带索引的 sh_last_heartbeat 做范围查询，不扫描整个 tb_device。
+
+from __future__ import unicode_literals
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, DateField, F, FloatField, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import six
+
+from .auth import LRUCache, POSITIVE_TTL
+from .latest import to_date
+from .models import tb_device
+
+# 写回间隔（秒）。
+FLUSH_INTERVAL = getattr(settings, 'SH_HEARTBEAT_FLUSH_INTERVAL', 30)
+# 最近多少秒内有心跳的设备算作在线，应大于心跳间隔与写回间隔之和。
+ONLINE_WINDOW = getattr(settings, 'SH_HEARTBEAT_ONLINE_WINDOW', 90)
+# 每条 UPDATE 最多包含的设备数，实际批大小还受数据库参数上限的限制，见 _write。
+BATCH_SIZE = 200
+# 缓存键前缀与过期时间（None 表示不过期）。
+KEY_PREFIX = 'sh_heartbeat:'
+CACHE_TIMEOUT = None
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_dirty = {}
+_last_flush = [time.time()]
+# 设备ID -> 所属用户ID，认证后判断设备归属时不必每次心跳都查询数据库
+_owners = LRUCache(getattr(settings, 'SH_AUTH_CACHE_SIZE', 10000))
+
+
+def _key(device_id):
+    return '%s%s' % (KEY_PREFIX, device_id)
+
+
+def owner(device_id):
+    """返回设备所属的用户ID，设备不存在时返回 None。"""
+    user_id = _owners.get(device_id)
+    if user_id is None:
+        user_id = tb_device.objects.filter(sh_id=device_id).values_list(
+            'sh_user_id', flat=True).first()
+        if user_id is not None:
+            _owners.set(device_id, user_id, time.time() + POSITIVE_TTL)
+    return user_id
+
+
+@receiver([post_save, post_delete], sender=tb_device)
+def _forget_owner(sender, instance, **kwargs):
+    _owners.delete(instance.sh_id)
+
+
+def record(device_id, timestamp=None):
+    """记录一次心跳，返回心跳时间戳。到了写回间隔时顺便写回数据库。"""
+    timestamp = time.time() if timestamp is None else timestamp
+    cache.set(_key(device_id), timestamp, CACHE_TIMEOUT)
+    with _lock:
+        if timestamp > _dirty.get(device_id, 0):
+            _dirty[device_id] = timestamp
+        due = time.time() - _last_flush[0] >= FLUSH_INTERVAL
+    if due:
+        try:
+            flush()
+        except Exception:
+            # 心跳已经写入缓存，写回失败不影响本次请求，留待下次写回
+            logger.exception('写回设备心跳失败')
+    return timestamp
+
+
+def get(device_id):
+    """返回设备最近一次心跳的时间戳，缓存中没有时读数据库，从未收到心跳时返回 None。"""
+    timestamp = cache.get(_key(device_id))
+    if timestamp is None:
+        timestamp = tb_device.objects.filter(sh_id=device_id).values_list(
+            'sh_last_heartbeat', flat=True).first()
+    return timestamp
+
+
+def get_many(device_ids):
+    """返回 {设备ID: 心跳时间戳}，只包含缓存中有心跳的设备。"""
+    cached = cache.get_many([_key(device_id) for device_id in device_ids])
+    return dict((device_id, cached[_key(device_id)]) for device_id in device_ids
+                if _key(device_id) in cached)
+
+
+def _write(items):
+    """
+    把 {设备ID: 时间戳} 写回 tb_device，每批设备一条 UPDATE。
+    只在新时间戳更晚时更新，多个进程先后写回时不会用旧的心跳覆盖新的。
+    """
+    items = sorted(six.iteritems(items))
+    # 每个设备占用 7 个 SQL 参数：IN 中的设备ID，以及两个 CASE 中各自的
+    # 设备ID、比较用的时间戳和写入的值；批大小不能超过数据库单条语句的参数上限
+    # （SQLite 为 999 个，即每条 UPDATE 最多 142 个设备）
+    opts = tb_device._meta
+    batch_fields = [opts.get_field('sh_id')] + [
+        opts.get_field(name) for name in ('sh_id', 'sh_last_heartbeat', 'sh_last_heartbeat',
+                                          'sh_id', 'sh_last_heartbeat', 'sh_last_active')]
+    batch_size = max(min(BATCH_SIZE, connection.ops.bulk_batch_size(batch_fields, items)), 1)
+    with transaction.atomic():
+        for i in range(0, len(items), batch_size):
+            batch = items[i:i + batch_size]
+            newer = [(device_id, timestamp, Q(sh_id=device_id) & (
+                Q(sh_last_heartbeat__lt=timestamp) | Q(sh_last_heartbeat__isnull=True)))
+                for device_id, timestamp in batch]
+            tb_device.objects.filter(sh_id__in=[device_id for device_id, _ in batch]).update(
+                sh_last_heartbeat=Case(
+                    *[When(condition, then=Value(timestamp))
+                      for device_id, timestamp, condition in newer],
+                    default=F('sh_last_heartbeat'), output_field=FloatField()),
+                sh_last_active=Case(
+                    *[When(condition, then=Value(to_date(timestamp)))
+                      for device_id, timestamp, condition in newer],
+                    default=F('sh_last_active'), output_field=DateField()))
+
+
+def flush():
+    """写回本进程积累的心跳，返回写回的设备个数。"""
+    with _lock:
+        items = dict(_dirty)
+        _dirty.clear()
+        _last_flush[0] = time.time()
+    if not items:
+        return 0
+    try:
+        _write(items)
+    except Exception:
+        # 写回失败时放回去，下次再试；期间收到的更新的心跳优先
+        with _lock:
+            for device_id, timestamp in six.iteritems(items):
+                if timestamp > _dirty.get(device_id, 0):
+                    _dirty[device_id] = timestamp
+        raise
+    return len(items)
+
+
+def flush_all(batch_size=500):
+    """把缓存中所有设备的心跳写回 tb_device（跨进程），返回写回的设备个数。"""
+    flush()
+    written = 0
+    device_ids = list(tb_device.objects.values_list('sh_id', flat=True))
+    for i in range(0, len(device_ids), batch_size):
+        keys = [_key(device_id) for device_id in device_ids[i:i + batch_size]]
+        cached = cache.get_many(keys)
+        items = dict((int(key[len(KEY_PREFIX):]), timestamp)
+                     for key, timestamp in six.iteritems(cached))
+        if items:
+            _write(items)
+            written += len(items)
+    return written
+
+
+def online_devices(window=None, now=None):
+    """
+    返回最近 window 秒内有心跳的设备的 QuerySet，走 sh_last_heartbeat 的索引。
+    数据库中的心跳最多落后写回间隔，window 默认为 SH_HEARTBEAT_ONLINE_WINDOW。
+    """
+    window = ONLINE_WINDOW if window is None else window
+    now = time.time() if now is None else now
+    return tb_device.objects.filter(sh_last_heartbeat__gte=now - window)
@@ -0,0 +1,287 @@
+#_*_ coding:utf-8 _*_
+
+# 数据点批量写入（ingest）模块。
+# 网关一次请求提交成千上万条读数，这里负责解析请求体（JSON Lines 或紧凑的二进制帧），
+# 校验每一条读数，然后在同一个事务里用 bulk_create 分批写入 tb_datapoint_list，
+# 避免“一条读数一个 HTTP 请求加一条 INSERT”。
+# 网关常常重发整批读数，(传感器ID, 时间戳) 相同的读数只写入一次：每批一条查询找出
+# 已经写入过的读数，其余的用 bulk_create(ignore_conflicts=True) 写入，
+# 重复提交同一批数据是幂等的，也不会让汇总表重复计数。
+# 查询之后被并发请求抢先写入的读数由唯一约束跳过；数据库用 RETURNING 告知实际写入了
+# 哪些行，只有这些读数计入汇总表和最新数据，见 _insert。
+
+from __future__ import unicode_literals
+import json
+import math
+import struct
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Max
+from django.utils import six
+
+from .models import tb_datapoint_list, tb_device, tb_sensor, tb_sequence
+from . import latest, rollup
+
+# 每批 INSERT 的行数，以及单个请求允许提交的最大读数条数，可在 settings.py 中覆盖。
+BATCH_SIZE = getattr(settings, 'SH_INGEST_BATCH_SIZE', 1000)
+MAX_READINGS = getattr(settings, 'SH_INGEST_MAX_READINGS', 100000)
+# 响应中最多返回的错误明细条数，避免坏数据把响应撑大。
+MAX_ERRORS = 20
+# 按传感器ID查询时每次的ID个数，不超过 SQLite 单条语句 999 个参数的限制。
+SENSOR_BATCH_SIZE = 500
+# 数据点 sh_id 在 tb_sequence 中的计数器名称。
+SEQUENCE = 'tb_datapoint_list.sh_id'
+# 不支持 RETURNING 的数据库上，写入时遇到并发写入的同一读数的重试次数。
+INSERT_RETRIES = 3
+
+# 二进制帧：由若干条定长记录首尾相接组成，每条记录为小端序的
+#   int32 传感器ID + int64 时间戳 + float64 数据值，共 20 字节。
+FRAME_RECORD = struct.Struct('<iqd')
+
+# 这些 Content-Type 按二进制帧解析，其余一律按 JSON Lines（每行一个 JSON 对象）解析。
+BINARY_TYPES = ('application/octet-stream', 'application/x-sh-frame')
+
+
+class IngestError(ValueError):
+    """单条读数不合法时抛出，由调用方计入 rejected。"""
+    pass
+
+
+def _to_int(value, name):
+    if isinstance(value, bool):
+        raise IngestError('%s 必须是整数' % name)
+    if isinstance(value, six.integer_types):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, six.string_types):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise IngestError('%s 必须是整数' % name)
+
+
+def _to_float(value, name):
+    if not isinstance(value, bool) and isinstance(
+            value, six.integer_types + (float,) + six.string_types):
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+        else:
+            if not (math.isnan(value) or math.isinf(value)):
+                return value
+    raise IngestError('%s 必须是有限的数值' % name)
+
+
+def clean_reading(item):
+    """校验一条读数（dict），返回 (sh_id, sh_sensor_id, sh_timestamp, sh_value)。"""
+    if not isinstance(item, dict):
+        raise IngestError('每一行必须是一个 JSON 对象')
+    for name in ('sh_sensor_id', 'sh_timestamp', 'sh_value'):
+        if item.get(name) is None:
+            raise IngestError('缺少字段 %s' % name)
+    sh_id = item.get('sh_id')
+    if sh_id is not None:
+        sh_id = _to_int(sh_id, 'sh_id')
+    return (sh_id,
+            _to_int(item['sh_sensor_id'], 'sh_sensor_id'),
+            _to_int(item['sh_timestamp'], 'sh_timestamp'),
+            _to_float(item['sh_value'], 'sh_value'))
+
+
+def parse_json_lines(body):
+    """解析 JSON Lines 请求体，逐行产生 (行号, 读数或 IngestError)。"""
+    if isinstance(body, six.binary_type):
+        body = body.decode('utf-8', 'replace')
+    for lineno, line in enumerate(body.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield lineno, clean_reading(json.loads(line))
+        except ValueError as e:
+            # json 解析失败（ValueError）与 IngestError 都算作该行被拒绝
+            yield lineno, e if isinstance(e, IngestError) else IngestError('JSON 格式错误')
+
+
+def parse_frame(body):
+    """解析二进制帧，逐条产生 (记录序号, 读数或 IngestError)。"""
+    size = FRAME_RECORD.size
+    count, tail = divmod(len(body), size)
+    for index in range(count):
+        sensor_id, timestamp, value = FRAME_RECORD.unpack_from(body, index * size)
+        if math.isnan(value) or math.isinf(value):
+            yield index + 1, IngestError('sh_value 必须是有限的数值')
+        else:
+            yield index + 1, (None, sensor_id, timestamp, value)
+    if tail:
+        yield count + 1, IngestError('二进制帧长度不是 %d 字节的整数倍' % size)
+
+
+def parse_body(content_type, body):
+    """根据 Content-Type 选择解析器，默认按 JSON Lines 处理。"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in BINARY_TYPES:
+        return parse_frame(body)
+    return parse_json_lines(body)
+
+
+def allocate_ids(count, at_least=0):
+    """
+    为数据点预留 count 个连续的 sh_id，返回第一个（count 为 0 时返回 None）；at_least 为本批读数自带的最大 sh_id，
+    计数器会先跳过它，之后分配的号码不会与之重复。必须在事务中调用。
+    先 UPDATE 计数器行再读取：UPDATE 持有该行（SQLite 上为整个数据库）的写锁直到
+    事务结束，并发的请求只能依次预留，不会像 Max('sh_id') + 1 那样分配出重复的号码。
+    """
+    counter = tb_sequence.objects.filter(sh_name=SEQUENCE)
+    if at_least:
+        counter.filter(sh_value__lt=at_least).update(sh_value=at_least)
+    if not count:
+        return None
+    if not counter.update(sh_value=F('sh_value') + count):
+        # 计数器行不存在（例如被误删），按当前最大 sh_id 重新创建
+        start = max(tb_datapoint_list.objects.aggregate(
+            m=Max('sh_id'))['m'] or 0, at_least)
+        try:
+            with transaction.atomic():
+                tb_sequence.objects.create(sh_name=SEQUENCE, sh_value=start + count)
+        except IntegrityError:
+            # 并发的请求刚刚创建了计数器行
+            counter.update(sh_value=F('sh_value') + count)
+    return counter.values_list('sh_value', flat=True).get() - count + 1
+
+
+def _known_sensors(sensor_ids, user_id=None):
+    """
+    返回 sensor_ids 中已登记的传感器ID，分批查询。
+    指定 user_id 时只返回该用户名下设备的传感器（设备归属用子查询判断）。
+    """
+    sensors = tb_sensor.objects.all()
+    if user_id is not None:
+        sensors = sensors.filter(sh_device_id__in=tb_device.objects.filter(
+            sh_user_id=user_id).values('sh_id'))
+    sensor_ids = sorted(sensor_ids)
+    known = set()
+    for i in range(0, len(sensor_ids), SENSOR_BATCH_SIZE):
+        known.update(sensors.filter(
+            sh_id__in=sensor_ids[i:i + SENSOR_BATCH_SIZE]).values_list('sh_id', flat=True))
+    return known
+
+
+def _existing(batch):
+    """
+    返回一批读数中已经写入过的 {(传感器ID, 时间戳)}。
+    一条查询，走 (sh_sensor_id, sh_timestamp) 唯一索引；IN 条件的组合可能多于
+    这批读数，调用方按集合成员判断即可。
+    """
+    return set(tb_datapoint_list.objects.filter(
+        sh_sensor_id__in=set(r[1] for r in batch),
+        sh_timestamp__in=set(r[2] for r in batch)).values_list(
+        'sh_sensor_id', 'sh_timestamp'))
+
+
+def _insert(objs, batch_size):
+    """
+    写入一批数据点，返回实际写入的数据点。
+    数据库能返回写入的行时（PostgreSQL、SQLite 3.35+），用 ignore_conflicts 跳过
+    并发请求已经写入的同一读数，只有实际写入的数据点会设置主键；
+    其他数据库在保存点中直接写入，违反唯一约束时回滚到保存点，重新排除已有的读数再写入。
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        tb_datapoint_list.objects.bulk_create(
+            objs, batch_size=batch_size, ignore_conflicts=True)
+        return [o for o in objs if o.pk is not None]
+    for attempt in range(INSERT_RETRIES):
+        try:
+            with transaction.atomic():
+                tb_datapoint_list.objects.bulk_create(objs, batch_size=batch_size)
+            return objs
+        except IntegrityError:
+            if attempt == INSERT_RETRIES - 1:
+                raise
+            existing = _existing([(o.sh_id, o.sh_sensor_id, o.sh_timestamp, o.sh_value)
+                                  for o in objs])
+            objs = [o for o in objs if (o.sh_sensor_id, o.sh_timestamp) not in existing]
+            if not objs:
+                return objs
+
+
+def ingest(readings, user_id=None):
+    """
+    批量写入读数。readings 为 parse_body 产生的 (序号, 读数或 IngestError) 序列，
+    指定 user_id 时只接受该用户名下设备的传感器的读数。
+    返回 {'accepted': n, 'duplicates': d, 'rejected': m, 'errors': [...]}，
+    duplicates 为已经写入过（或在本次请求中重复）而被忽略的读数条数。
+    """
+    rows, errors = [], []
+    rejected = 0
+    for position, reading in readings:
+        if len(rows) >= MAX_READINGS:
+            reading = IngestError('单次请求最多提交 %d 条读数' % MAX_READINGS)
+        if isinstance(reading, IngestError):
+            rejected += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append({'line': position, 'error': six.text_type(reading)})
+            continue
+        rows.append((position, reading))
+
+    # 只接受已登记（且属于当前用户）的传感器，每 SENSOR_BATCH_SIZE 个传感器一次查询
+    known = _known_sensors(set(reading[1] for _, reading in rows), user_id)
+
+    duplicates = 0
+    pending, seen = [], set()
+    for position, (sh_id, sensor_id, timestamp, value) in rows:
+        if sensor_id not in known:
+            rejected += 1
+            if len(errors) < MAX_ERRORS:
+                # 不属于当前用户的传感器与不存在的传感器同样处理，不透露是否存在
+                errors.append({'line': position,
+                               'error': '传感器 %s 不存在' % sensor_id})
+            continue
+        # 同一请求内重复的读数只保留第一条
+        if (sensor_id, timestamp) in seen:
+            duplicates += 1
+            continue
+        seen.add((sensor_id, timestamp))
+        pending.append((sh_id, sensor_id, timestamp, value))
+
+    # 批大小不能超过数据库单条语句的参数上限（如 SQLite 的 999 个变量）
+    fields = [f for f in tb_datapoint_list._meta.concrete_fields
+              if not f.primary_key]
+    batch_size = max(min(BATCH_SIZE,
+                         connection.ops.bulk_batch_size(fields, pending)), 1)
+    objs = []
+    with transaction.atomic():
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            existing = _existing(batch)
+            readings = [r for r in batch if (r[1], r[2]) not in existing]
+            duplicates += len(batch) - len(readings)
+            if not readings:
+                continue
+            # 未指定数据点ID的读数从计数器中分配连续的ID
+            given = [r[0] for r in readings if r[0] is not None]
+            next_id = allocate_ids(len(readings) - len(given), max(given) if given else 0)
+            new = []
+            for sh_id, sensor_id, timestamp, value in readings:
+                if sh_id is None:
+                    sh_id = next_id
+                    next_id += 1
+                new.append(tb_datapoint_list(
+                    sh_id=sh_id, sh_sensor_id=sensor_id,
+                    sh_timestamp=timestamp, sh_value=value))
+            # 查询之后其他请求并发写入的同一读数不会写入，也算作重复
+            inserted = _insert(new, batch_size)
+            duplicates += len(new) - len(inserted)
+            objs.extend(inserted)
+        # 同一事务内增量更新汇总表和传感器的最新数据，只计入新写入的读数
+        rollup.update((o.sh_sensor_id, o.sh_timestamp, o.sh_value) for o in objs)
+        changed = latest.record((o.sh_sensor_id, o.sh_timestamp, o.sh_value) for o in objs)
+    # 事务提交后再更新最新数据的缓存
+    latest.remember(changed)
+
+    return {'accepted': len(objs), 'duplicates': duplicates,
+            'rejected': rejected, 'errors': errors}
@@ -0,0 +1,120 @@
+#_*_ coding:utf-8 _*_
+
+# 传感器的最新数据。
+# 不再逐条读数 UPDATE tb_sensor：ingest 把一次请求中每个传感器时间戳最新的读数合并后，
+# 在写入数据点的同一个事务中用 bulk_update 批量写回 tb_sensor.sh_last_data / sh_last_update，
+# 事务提交后再写入 Django 缓存（django.core.cache）。
+# 数据库中的值总是最新的，缓存只用于加快读取：缓存被淘汰，或者多进程部署时各进程的
+# 进程内缓存互不可见，都只会让读取回退到数据库，不会丢失最新数据。
+# 是否“更新”以数据库中的 sh_last_timestamp 为准，而不是缓存：UPDATE 的 CASE 里逐行
+# 带上条件，补传的旧读数即使缓存里没有（被淘汰、进程重启），也不会覆盖更新的数据。
+
+from __future__ import unicode_literals
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import six, timezone
+
+from .models import tb_sensor
+
+# 写回时每次查询的传感器个数，不超过 SQLite 单条语句 999 个参数的限制。
+WRITE_BATCH_SIZE = 500
+# 缓存键前缀与过期时间（None 表示不过期）。
+KEY_PREFIX = 'sh_latest:'
+CACHE_TIMEOUT = None
+
+
+def _key(sensor_id):
+    return '%s%s' % (KEY_PREFIX, sensor_id)
+
+
+def record(readings):
+    """
+    记录一批读数 [(传感器ID, 时间戳, 数据值), ...]，每个传感器只保留时间戳最新的一条，
+    写回 tb_sensor 并返回实际写回的 {传感器ID: (时间戳, 数据值)}。应在写入数据点的事务中调用，
+    事务提交后再用 remember() 把返回值写入缓存。
+    """
+    latest = {}
+    for sensor_id, timestamp, value in readings:
+        current = latest.get(sensor_id)
+        if current is None or timestamp >= current[0]:
+            latest[sensor_id] = (timestamp, value)
+    if not latest:
+        return {}
+    return _write(latest)
+
+
+def remember(items):
+    """把 record() 写回的 {传感器ID: (时间戳, 数据值)} 写入缓存。"""
+    cache.set_many(dict((_key(sensor_id), item) for sensor_id, item in six.iteritems(items)),
+                   CACHE_TIMEOUT)
+
+
+def get(sensor_id):
+    """返回传感器的最新数据 (时间戳, 数据值)，缓存中没有时返回 None（以数据库为准）。"""
+    return cache.get(_key(sensor_id))
+
+
+def get_many(sensor_ids):
+    """返回 {传感器ID: (时间戳, 数据值)}，缓存中没有的传感器不出现在结果里。"""
+    cached = cache.get_many([_key(sensor_id) for sensor_id in sensor_ids])
+    return dict((sensor_id, cached[_key(sensor_id)]) for sensor_id in sensor_ids
+                if _key(sensor_id) in cached)
+
+
+def to_date(timestamp):
+    """把时间戳转换为 sh_last_update 使用的日期。"""
+    if settings.USE_TZ:
+        return datetime.datetime.fromtimestamp(
+            timestamp, timezone.get_current_timezone()).date()
+    return datetime.date.fromtimestamp(timestamp)
+
+
+def _newer(timestamp):
+    """
+    tb_sensor 中已有的最新数据不比 timestamp 新的条件。
+    sh_last_timestamp 为空（还没有写回过读数，sh_last_update 只是建档日期）时总是写入。
+    """
+    return Q(sh_last_timestamp__isnull=True) | Q(sh_last_timestamp__lte=timestamp)
+
+
+def _guarded(name, condition, value):
+    """满足 condition 时把列 name 更新为 value，否则保留原值。"""
+    field = tb_sensor._meta.get_field(name)
+    return Case(When(condition, then=Value(value, output_field=field)),
+                default=F(name), output_field=field)
+
+
+def _write(items):
+    """
+    把 {传感器ID: (时间戳, 数据值)} 写回 tb_sensor，返回实际写回的部分。
+    每 WRITE_BATCH_SIZE 个传感器一次查询取出主键和已有的时间戳，跳过已有更新数据的传感器；
+    再用 bulk_update 批量写入，每个 CASE 分支仍带上 _newer 条件，
+    与并发写入的更新读数竞争时由数据库保证不会倒退。
+    """
+    sensor_ids = sorted(items)
+    written = {}
+    with transaction.atomic():
+        for i in range(0, len(sensor_ids), WRITE_BATCH_SIZE):
+            rows = tb_sensor.objects.filter(
+                sh_id__in=sensor_ids[i:i + WRITE_BATCH_SIZE]).values_list(
+                'pk', 'sh_id', 'sh_last_timestamp')
+            objs = []
+            for pk, sensor_id, last_timestamp in rows:
+                timestamp, value = items[sensor_id]
+                if last_timestamp is not None and last_timestamp > timestamp:
+                    continue
+                newer = _newer(timestamp)
+                objs.append(tb_sensor(
+                    pk=pk,
+                    sh_last_data=_guarded('sh_last_data', newer, '%s' % value),
+                    sh_last_update=_guarded('sh_last_update', newer, to_date(timestamp)),
+                    sh_last_timestamp=_guarded('sh_last_timestamp', newer, timestamp)))
+                written[sensor_id] = items[sensor_id]
+            # 条件引用了被更新的列：SQL 中各列的新值都按更新前的行计算
+            tb_sensor.objects.bulk_update(
+                objs, ['sh_last_data', 'sh_last_update', 'sh_last_timestamp'])
+    return written
@@ -0,0 +1,30 @@
+#_*_ coding:utf-8 _*_
+
+# 根据已有的数据点重新计算汇总表（tb_datapoint_rollup）。
+# 用法：python manage.py backfill_rollups [--sensor 1 --sensor 2] [--start t1] [--end t2]
+
+from __future__ import unicode_literals
+import time
+
+from django.core.management.base import BaseCommand
+
+from home import rollup
+
+
+class Command(BaseCommand):
+    help = "根据原始数据点和压缩数据块回填 1 分钟、1 小时、1 天三种粒度的汇总数据。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor', type=int, action='append', dest='sensors',
+            help='只回填指定的传感器，可重复使用，默认全部。')
+        parser.add_argument('--start', type=int, default=None,
+            help='回填起始时间戳（对齐到整天）。')
+        parser.add_argument('--end', type=int, default=None,
+            help='回填结束时间戳（不含）。')
+
+    def handle(self, **options):
+        began = time.time()
+        written = rollup.backfill(sensor_ids=options['sensors'],
+                                  start=options['start'], end=options['end'])
+        self.stdout.write("已写入 %d 条汇总数据，用时 %.1f 秒。" % (
+            written, time.time() - began))
@@ -0,0 +1,34 @@
+#_*_ coding:utf-8 _*_
+
+# 把旧的原始数据点打包进压缩数据块（tb_datapoint_block）。
+# 用法：python manage.py compact_datapoints --days 7 [--sensor 1 --sensor 2] [--delete]
+
+from __future__ import unicode_literals
+import time
+
+from django.core.management.base import BaseCommand
+
+from home import timeseries
+
+
+class Command(BaseCommand):
+    help = "把早于指定时间的原始数据点按传感器和时间窗口打包为压缩数据块。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+            help='打包多少天以前的数据，默认 7 天。')
+        parser.add_argument('--before', type=int, default=None,
+            help='打包早于该时间戳的数据，指定后忽略 --days。')
+        parser.add_argument('--sensor', type=int, action='append', dest='sensors',
+            help='只打包指定的传感器，可重复使用。')
+        parser.add_argument('--delete', action='store_true', default=False,
+            help='打包后删除原始数据点。删除后区间查询、导出和历史数据接口仍能从数据块'
+                 '读到这些数据点，但它们不再有 sh_id，不能再按 sh_id 查询。')
+
+    def handle(self, **options):
+        before = options['before']
+        if before is None:
+            before = int(time.time()) - options['days'] * 86400
+        windows = timeseries.compact(before, sensor_ids=options['sensors'],
+                                     delete=options['delete'])
+        self.stdout.write("已打包 %d 个时间窗口。" % windows)
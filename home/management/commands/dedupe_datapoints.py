@@ -0,0 +1,53 @@
+#_*_ coding:utf-8 _*_
+
+# 检查并清理传感器ID和时间戳都相同的重复读数。
+# 用法：python manage.py dedupe_datapoints [--delete]
+# 迁移 0008 给 (sh_sensor_id, sh_timestamp) 加唯一约束，已有重复读数时迁移会中止，
+# 先用本命令清理再执行 migrate。不带 --delete 时只列出重复读数，不修改数据；
+# 带 --delete 时每组只保留主键最小的一条，并重新计算受影响传感器的汇总数据。
+# 删除不可恢复，执行前请备份数据库。
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min
+
+from home import rollup
+from home.models import tb_datapoint_list
+
+
+class Command(BaseCommand):
+    help = "列出（--delete 时删除）传感器ID和时间戳都相同的重复读数，每组保留主键最小的一条。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', default=False,
+            help='删除重复读数并重新计算受影响传感器的汇总数据，默认只列出。')
+
+    def handle(self, **options):
+        duplicates = (tb_datapoint_list.objects
+                      .values('sh_sensor_id', 'sh_timestamp')
+                      .annotate(n=Count('id'), keep=Min('id'))
+                      .filter(n__gt=1)
+                      .order_by('sh_sensor_id', 'sh_timestamp'))
+        sensor_ids, deleted = set(), 0
+        # 先取出所有重复的组，再逐组删除，不在同一张表的查询游标打开时删除
+        for row in list(duplicates):
+            sensor_ids.add(row['sh_sensor_id'])
+            if options['verbosity'] >= 2:
+                self.stdout.write("传感器 %s 时间戳 %s：%d 条" % (
+                    row['sh_sensor_id'], row['sh_timestamp'], row['n']))
+            if options['delete']:
+                tb_datapoint_list.objects.filter(
+                    sh_sensor_id=row['sh_sensor_id'], sh_timestamp=row['sh_timestamp'],
+                ).exclude(pk=row['keep']).delete()
+                deleted += row['n'] - 1
+        if not sensor_ids:
+            self.stdout.write("没有重复读数。")
+            return
+        if not options['delete']:
+            self.stdout.write("%d 个传感器有重复读数，确认后使用 --delete 清理。" % len(sensor_ids))
+            return
+        # 汇总数据是按删除前的读数计算的，重新计算这些传感器的汇总
+        written = rollup.backfill(sensor_ids=sensor_ids)
+        self.stdout.write("删除 %d 条重复读数，重新计算了 %d 个传感器的 %d 条汇总数据。" % (
+            deleted, len(sensor_ids), written))
@@ -0,0 +1,53 @@
+#_*_ coding:utf-8 _*_
+
+# 导出某个传感器的数据点到文件或标准输出。
+# 用法：python manage.py export_datapoints --sensor 1 [--start t1] [--end t2]
+#       [--format csv|ndjson] [--gzip] [--chunk-size n] [-o 文件名]
+
+from __future__ import unicode_literals
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home import export
+
+
+class Command(BaseCommand):
+    help = "以 CSV 或 NDJSON 格式流式导出传感器的数据点，可选 gzip 压缩。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor', type=int, required=True,
+            help='传感器ID。')
+        parser.add_argument('--start', type=int, default=None,
+            help='起始时间戳（含）。')
+        parser.add_argument('--end', type=int, default=None,
+            help='结束时间戳（不含）。')
+        parser.add_argument('--format', choices=export.FORMATS, default='csv',
+            help='导出格式，默认 csv。')
+        parser.add_argument('--gzip', action='store_true', default=False,
+            help='用 gzip 压缩输出。')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE,
+            help='每次从数据库读取的行数，默认 %d。' % export.CHUNK_SIZE)
+        parser.add_argument('-o', '--output', default=None,
+            help='输出文件，默认输出到标准输出。')
+
+    def handle(self, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size 必须是正整数。")
+        chunks = export.export(options['sensor'], options['start'], options['end'],
+                               options['format'], options['gzip'], options['chunk_size'])
+        if options['output']:
+            try:
+                out = open(options['output'], 'wb')
+            except IOError as e:
+                raise CommandError("无法写入 %s：%s" % (options['output'], e))
+        else:
+            out = getattr(sys.stdout, 'buffer', sys.stdout)
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
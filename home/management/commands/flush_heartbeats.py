@@ -0,0 +1,18 @@
+#_*_ coding:utf-8 _*_
+
+# 把缓存中设备的心跳写回 tb_device，可放在 crontab 中定期执行。
+# 用法：python manage.py flush_heartbeats
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+
+from home import heartbeat
+
+
+class Command(BaseCommand):
+    help = "把缓存中所有设备的心跳写回 tb_device.sh_last_heartbeat / sh_last_active。"
+
+    def handle(self, **options):
+        written = heartbeat.flush_all()
+        self.stdout.write("已写回 %d 个设备的心跳。" % written)
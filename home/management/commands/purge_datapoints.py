@@ -0,0 +1,45 @@
+#_*_ coding:utf-8 _*_
+
+# 按传感器类型的保留策略清理过期的数据点、压缩数据块和汇总数据。
+# 用法：python manage.py purge_datapoints [--batch-size 1000] [--sleep 0.05]
+# 每批删除单独提交，中断后重新执行即可继续。清理完成后更新 SQLite 的统计信息。
+
+from __future__ import unicode_literals
+import time
+
+from django.core.management.base import BaseCommand
+
+from home import retention
+
+
+class Command(BaseCommand):
+    help = "按 tb_sensor_type 中设置的保留天数分批删除过期数据，并报告删除速度。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, dest='batch_size',
+            help='每批删除的行数，默认 1000。')
+        parser.add_argument('--sleep', type=float, default=0,
+            help='每批之间停顿的秒数，给其他写入让出数据库锁。')
+
+    def handle(self, **options):
+        began = time.time()
+        totals = {}
+        for sensor_type, sensor_ids, raw_cutoff, rollup_cutoff in retention.plan():
+            self.stdout.write("传感器类型 %s：%d 个传感器，原始数据截止 %s，汇总数据截止 %s" % (
+                sensor_type['sh_name'], len(sensor_ids), raw_cutoff, rollup_cutoff))
+            for sensor_id in sensor_ids:
+                for table, queryset in retention.purge_querysets(
+                        sensor_id, raw_cutoff, rollup_cutoff):
+                    for deleted in retention.delete_in_batches(
+                            queryset, options['batch_size'], options['sleep']):
+                        totals[table] = totals.get(table, 0) + deleted
+                        if options['verbosity'] >= 2:
+                            self.stdout.write("  %s 传感器 %s：删除 %d 行" % (
+                                table, sensor_id, deleted))
+        elapsed = max(time.time() - began, 1e-6)
+        total = sum(totals.values())
+        retention.analyze()
+        for table in sorted(totals):
+            self.stdout.write("%s：删除 %d 行" % (table, totals[table]))
+        self.stdout.write("共删除 %d 行，用时 %.1f 秒，%.0f 行/秒。" % (
+            total, elapsed, total / elapsed))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import math
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+# 每次转换的数据点行数
+CHUNK_SIZE = 2000
+
+
+def parse_value(text):
+    # 旧数据是富文本，去掉 HTML 标签和空白后再解析成数值，解析不了的置为 NULL
+    text = strip_tags(text or '').replace('&nbsp;', ' ').strip()
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    if math.isnan(value) or math.isinf(value):
+        return None
+    return value
+
+
+def convert_values(apps, schema_editor):
+    tb_datapoint_list = apps.get_model('home', 'tb_datapoint_list')
+    manager = tb_datapoint_list.objects.using(schema_editor.connection.alias)
+    last_pk = 0
+    while True:
+        rows = list(manager.filter(pk__gt=last_pk).order_by('pk')
+                    .values_list('pk', 'sh_value')[:CHUNK_SIZE])
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        # 同一个数值的行合并成一条 UPDATE
+        by_value = defaultdict(list)
+        for pk, text in rows:
+            value = parse_value(text)
+            if value is not None:
+                by_value[value].append(pk)
+        for value, pks in by_value.items():
+            manager.filter(pk__in=pks).update(sh_value_num=value)
+
+
+def revert_values(apps, schema_editor):
+    tb_datapoint_list = apps.get_model('home', 'tb_datapoint_list')
+    manager = tb_datapoint_list.objects.using(schema_editor.connection.alias)
+    for value in (manager.exclude(sh_value_num=None)
+                  .values_list('sh_value_num', flat=True).distinct()):
+        manager.filter(sh_value_num=value).update(sh_value='%s' % value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tb_datapoint_list',
+            name='sh_value_num',
+            field=models.FloatField(null=True),
+        ),
+        migrations.RunPython(convert_values, revert_values),
+        migrations.RemoveField(
+            model_name='tb_datapoint_list',
+            name='sh_value',
+        ),
+        migrations.RenameField(
+            model_name='tb_datapoint_list',
+            old_name='sh_value_num',
+            new_name='sh_value',
+        ),
+        migrations.CreateModel(
+            name='tb_datapoint_block',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('sh_sensor_id', models.IntegerField()),
+                ('sh_start', models.IntegerField()),
+                ('sh_end', models.IntegerField()),
+                ('sh_count', models.IntegerField()),
+                ('sh_data', models.BinaryField()),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='tb_datapoint_block',
+            unique_together=set([('sh_sensor_id', 'sh_start')]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0002_datapoint_numeric_value'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='tb_datapoint_list',
+            index_together=set([('sh_sensor_id', 'sh_timestamp')]),
+        ),
+    ]
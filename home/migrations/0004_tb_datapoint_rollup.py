@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0003_datapoint_sensor_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='tb_datapoint_rollup',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('sh_sensor_id', models.IntegerField()),
+                ('sh_resolution', models.IntegerField()),
+                ('sh_bucket', models.IntegerField()),
+                ('sh_count', models.IntegerField()),
+                ('sh_min', models.FloatField()),
+                ('sh_max', models.FloatField()),
+                ('sh_sum', models.FloatField()),
+                ('sh_last', models.FloatField()),
+                ('sh_last_timestamp', models.IntegerField()),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='tb_datapoint_rollup',
+            unique_together=set([('sh_sensor_id', 'sh_resolution', 'sh_bucket')]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0004_tb_datapoint_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tb_sensor_type',
+            name='sh_raw_retention',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tb_sensor_type',
+            name='sh_rollup_retention',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0005_sensor_type_retention'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tb_user',
+            name='sh_apikey',
+            field=models.CharField(max_length=100, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='tb_user_token',
+            name='sh_token',
+            field=models.CharField(max_length=100, db_index=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0006_token_apikey_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tb_device',
+            name='sh_last_heartbeat',
+            field=models.FloatField(null=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def check_duplicate_readings(apps, schema_editor):
+    # 已有同一 (传感器, 时间戳) 的重复读数时无法加上唯一约束；迁移不删除数据，
+    # 需要先用 dedupe_datapoints 命令检查并清理重复读数、重新计算受影响的汇总数据
+    tb_datapoint_list = apps.get_model('home', 'tb_datapoint_list')
+    duplicates = (tb_datapoint_list.objects
+                  .values('sh_sensor_id', 'sh_timestamp')
+                  .annotate(n=models.Count('id'))
+                  .filter(n__gt=1))
+    count = duplicates.count()
+    if count:
+        raise RuntimeError(
+            '数据点表中有 %d 组传感器ID和时间戳都相同的重复读数，无法加上唯一约束。'
+            '请先运行 python manage.py dedupe_datapoints 查看重复读数，'
+            '确认后运行 python manage.py dedupe_datapoints --delete 清理，再重新执行 migrate。'
+            % count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0007_device_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_readings, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='tb_datapoint_list',
+            unique_together=set([('sh_sensor_id', 'sh_timestamp')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='tb_datapoint_list',
+            index_together=set([]),
+        ),
+    ]
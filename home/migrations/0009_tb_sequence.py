@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def create_datapoint_sequence(apps, schema_editor):
+    # 数据点的 sh_id 从当前最大值之后开始分配
+    tb_datapoint_list = apps.get_model('home', 'tb_datapoint_list')
+    tb_sequence = apps.get_model('home', 'tb_sequence')
+    current = tb_datapoint_list.objects.aggregate(m=models.Max('sh_id'))['m'] or 0
+    tb_sequence.objects.create(sh_name='tb_datapoint_list.sh_id', sh_value=current)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0008_datapoint_unique_reading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='tb_sequence',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('sh_name', models.CharField(max_length=50, unique=True)),
+                ('sh_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_datapoint_sequence, migrations.RunPython.noop),
+    ]
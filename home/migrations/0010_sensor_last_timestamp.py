@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0009_tb_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tb_sensor',
+            name='sh_last_timestamp',
+            field=models.IntegerField(null=True, blank=True, editable=False),
+        ),
+    ]
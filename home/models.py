@@ -21,7 +21,7 @@ class tb_user(models.Model):
     sh_token_exptime = models.DateField()               # 令牌失效时间
     sh_regtime = models.DateField()                     # 注册时间戳
     sh_status = models.BooleanField(default=False)      # 状态：激活与否
-    sh_apikey = models.CharField(max_length=100)        # APIKEY，用于授权API操作
+    sh_apikey = models.CharField(max_length=100, db_index=True)  # APIKEY，用于授权API操作
     sh_about = UEditorField('内容', height=300, width=1000,default=u'',
             blank=True, imagePath="uploads/images/",toolbars='besttome', 
             filePath='uploads/files/')                  # 用户信息的描述
@@ -40,7 +40,7 @@ class tb_user(models.Model):
 @python_2_unicode_compatible
 class tb_user_token(models.Model):
     sh_user_id = models.IntegerField(db_index=True) # 用户ID
-    sh_token = models.CharField(max_length=100)     # 用户令牌
+    sh_token = models.CharField(max_length=100, db_index=True)  # 用户令牌
     sh_deadline = models.IntegerField()             # 截止时间、失效时间
     def __str__(self):
         return self.sh_token
@@ -55,6 +55,7 @@ class tb_device(models.Model):
     sh_user_id = models.IntegerField()              # 用户ID
     sh_create_time = models.DateField()             # 创建时间
     sh_last_active = models.DateField()             # 最后活动时间
+    sh_last_heartbeat = models.FloatField(null=True, db_index=True)  # 最后心跳时间戳（秒，可含小数）
     sh_status = models.BooleanField(default=False)  # 状态
     sh_about = UEditorField('内容', height=300, width=1000,default=u'',
             blank=True,imagePath="uploads/images/",toolbars='besttome',
@@ -73,6 +74,7 @@ class tb_sensor(models.Model):
     sh_device_id = models.IntegerField()            # 设备ID
     sh_last_update = models.DateField()             # 更新时间
     sh_last_data = models.TextField()               # 最新数据
+    sh_last_timestamp = models.IntegerField(null=True, blank=True, editable=False)  # 最新数据的时间戳
     sh_status = models.BooleanField(default=False)  # 状态
     sh_about = UEditorField('内容', height=300, width=1000,default=u'',
             blank=True,imagePath="uploads/images/",toolbars='besttome',
@@ -88,18 +90,64 @@ class tb_sensor_type(models.Model):
     sh_name = models.CharField(max_length=50)       # 类型名称
     sh_description = models.TextField()             # 对该类型的描述
     sh_status = models.BooleanField(default=False)  # 状态
+    sh_raw_retention = models.IntegerField(default=0)       # 原始数据保留天数，0 为永久保留
+    sh_rollup_retention = models.IntegerField(default=0)    # 汇总数据保留天数，0 为永久保留
     def __str__(self):
         return self.sh_name
 
 # 数据点表（tb_datapoint_lite）用于保存传感器的数据，每一条记录都是某个传
-# 感器的某个时间点下的数据。
+# 感器的某个时间点下的数据。数据值使用数值列保存，不再是富文本。
 @python_2_unicode_compatible
 class tb_datapoint_list(models.Model):
     sh_id = models.IntegerField(db_index=True)      # 数据点ID
     sh_sensor_id = models.IntegerField()            # 传感器ID
     sh_timestamp = models.IntegerField()            # 时间戳
-    sh_value = UEditorField('内容', height=300, width=1000,default=u'',
-            blank=True,imagePath="uploads/images/",toolbars='besttome', 
-            filePath='uploads/files/')              # 数据值
+    sh_value = models.FloatField(null=True)         # 数据值
+    class Meta:
+        # 同一传感器同一时刻只有一条读数，重复提交的读数由 ingest 忽略；
+        # 唯一约束的索引同时服务于按传感器查询某段时间内数据的查询
+        unique_together = (('sh_sensor_id', 'sh_timestamp'),)
     def __str__(self):
-        return self.sh_value
+        return '%s' % self.sh_value
+
+# 数据块表（tb_datapoint_block）是数据点的压缩存储格式，每个传感器每个时间窗口
+# 一行，窗口内的数据点经过差分编码后存放在 sh_data 中，编码格式见 timeseries.py。
+@python_2_unicode_compatible
+class tb_datapoint_block(models.Model):
+    sh_sensor_id = models.IntegerField()            # 传感器ID
+    sh_start = models.IntegerField()                # 时间窗口起点
+    sh_end = models.IntegerField()                  # 窗口内最后一个数据点的时间戳
+    sh_count = models.IntegerField()                # 数据点个数
+    sh_data = models.BinaryField()                  # 编码后的数据点
+    class Meta:
+        unique_together = (('sh_sensor_id', 'sh_start'),)
+    def __str__(self):
+        return '%s@%s' % (self.sh_sensor_id, self.sh_start)
+
+# 数据汇总表（tb_datapoint_rollup）按 1 分钟、1 小时、1 天三种粒度保存每个传感器
+# 每个时间桶内数据的最小值、最大值、总和、条数和最后一个值，用于绘制长时间段的曲线，
+# 不必把每一条原始数据都传给客户端。平均值为 sh_sum / sh_count。
+@python_2_unicode_compatible
+class tb_datapoint_rollup(models.Model):
+    sh_sensor_id = models.IntegerField()            # 传感器ID
+    sh_resolution = models.IntegerField()           # 粒度（秒）：60、3600、86400
+    sh_bucket = models.IntegerField()               # 时间桶起点
+    sh_count = models.IntegerField()                # 数据点个数
+    sh_min = models.FloatField()                    # 最小值
+    sh_max = models.FloatField()                    # 最大值
+    sh_sum = models.FloatField()                    # 总和
+    sh_last = models.FloatField()                   # 最后一个值
+    sh_last_timestamp = models.IntegerField()       # 最后一个值的时间戳
+    class Meta:
+        unique_together = (('sh_sensor_id', 'sh_resolution', 'sh_bucket'),)
+    def __str__(self):
+        return '%s@%s/%s' % (self.sh_sensor_id, self.sh_bucket, self.sh_resolution)
+
+# 计数器表（tb_sequence）为没有自增主键的编号（如数据点的 sh_id）分配连续的号码，
+# 每种编号一行，sh_value 为已经分配出去的最大号码，见 ingest.allocate_ids。
+@python_2_unicode_compatible
+class tb_sequence(models.Model):
+    sh_name = models.CharField(max_length=50, unique=True)  # 编号名称
+    sh_value = models.BigIntegerField(default=0)            # 已分配的最大号码
+    def __str__(self):
+        return '%s=%s' % (self.sh_name, self.sh_value)
@@ -0,0 +1,100 @@
+#_*_ coding:utf-8 _*_
+
+# 很少修改的小表（如传感器类型）的进程内缓存。
+# 首次使用时整表读入内存，之后的查找不访问数据库。
+# 表中的行通过模型保存或删除时（post_save / post_delete），递增共享缓存中的版本号；
+# 各进程每隔 SH_REGISTRY_CHECK_INTERVAL 秒对比一次版本号，版本变化后重新读取整表。
+# 注意 QuerySet.update() 等批量操作不会发出信号，之后需要调用 invalidate()。
+# 版本号只有在 Django 缓存为 memcached 等共享缓存时才能通知到其他进程；
+# 因此无论版本号是否变化，整表最多缓存 SH_REGISTRY_MAX_AGE 秒就重新读取，
+# 使用进程内缓存时，其他进程最多在这段时间之后看到修改。
+
+from __future__ import unicode_literals
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from .models import tb_sensor_type
+
+# 对比共享缓存中版本号的最短间隔（秒）。
+CHECK_INTERVAL = getattr(settings, 'SH_REGISTRY_CHECK_INTERVAL', 5)
+# 整表在进程内最多缓存的时间（秒），到期后即使版本号没有变化也重新读取。
+MAX_AGE = getattr(settings, 'SH_REGISTRY_MAX_AGE', 300)
+
+
+def _new_version():
+    # 缓存中的版本号丢失后重新生成，用毫秒时间保证与之前的版本号不同
+    return int(time.time() * 1000)
+
+
+class Registry(object):
+    """一张小表的进程内缓存，以 sh_id 为键，每行是只包含 fields 的字典。"""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.version_key = 'sh_registry:%s' % model._meta.db_table
+        self._rows = None
+        self._loaded_version = None
+        self._expires = 0
+        self._next_check = 0
+        self._lock = threading.Lock()
+        post_save.connect(self._changed, sender=model, weak=False,
+                          dispatch_uid=self.version_key)
+        post_delete.connect(self._changed, sender=model, weak=False,
+                            dispatch_uid=self.version_key)
+
+    def _changed(self, sender, **kwargs):
+        self.invalidate()
+
+    def _version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, _new_version(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def rows(self):
+        """返回 {sh_id: 行}，内部使用，不要修改返回的字典。"""
+        now = time.time()
+        with self._lock:
+            if self._rows is not None and now < self._next_check:
+                return self._rows
+            version = self._version()
+            if self._rows is None or version != self._loaded_version or now >= self._expires:
+                self._rows = OrderedDict(
+                    (row['sh_id'], row)
+                    for row in self.model.objects.order_by('pk').values(*self.fields))
+                self._loaded_version = version
+                self._expires = now + MAX_AGE
+            self._next_check = now + CHECK_INTERVAL
+            return self._rows
+
+    def get(self, sh_id):
+        row = self.rows().get(sh_id)
+        return dict(row) if row is not None else None
+
+    def get_many(self, ids):
+        rows = self.rows()
+        return dict((sh_id, dict(rows[sh_id])) for sh_id in ids if sh_id in rows)
+
+    def all(self):
+        return [dict(row) for row in self.rows().values()]
+
+    def invalidate(self):
+        """使所有进程的缓存失效：递增共享缓存中的版本号，并清空本进程的缓存。"""
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, _new_version(), None)
+        with self._lock:
+            self._rows = None
+
+
+sensor_types = Registry(tb_sensor_type, (
+    'sh_id', 'sh_name', 'sh_description', 'sh_status', 'sh_raw_retention',
+    'sh_rollup_retention'))
@@ -0,0 +1,91 @@
+#_*_ coding:utf-8 _*_
+
+# 数据保留策略。
+# 每种传感器类型（tb_sensor_type）可以分别设置原始数据（含压缩数据块）和汇总数据
+# 的保留天数，过期数据由 manage.py purge_datapoints 分批删除。
+# 删除时只按主键取一小批再删除，不加载模型实例；
+# 每批单独提交，中途中断后重新执行即可从剩下的数据继续。
+# SQLite 不会自动收集统计信息，清理之后重新 ANALYZE，管理后台估算数据点表的行数依赖它。
+
+from __future__ import unicode_literals
+import time
+
+from django.db import connection, transaction
+
+from .models import tb_sensor, tb_datapoint_list, tb_datapoint_block, tb_datapoint_rollup
+from .registry import sensor_types
+from .rollup import RESOLUTIONS
+
+
+def plan(now=None):
+    """
+    返回需要清理的 [(传感器类型, [传感器ID], 原始数据截止时间戳, 汇总数据截止时间戳)]，
+    传感器类型为 registry 中的字典，截止时间戳为 None 表示该类数据永久保留。
+    """
+    now = int(now if now is not None else time.time())
+    result = []
+    for sensor_type in sensor_types.all():
+        if sensor_type['sh_raw_retention'] <= 0 and sensor_type['sh_rollup_retention'] <= 0:
+            continue
+        sensor_ids = list(tb_sensor.objects.filter(
+            sh_type=sensor_type['sh_id']).values_list('sh_id', flat=True))
+        if not sensor_ids:
+            continue
+        raw_cutoff = rollup_cutoff = None
+        if sensor_type['sh_raw_retention'] > 0:
+            raw_cutoff = now - sensor_type['sh_raw_retention'] * 86400
+        if sensor_type['sh_rollup_retention'] > 0:
+            rollup_cutoff = now - sensor_type['sh_rollup_retention'] * 86400
+        result.append((sensor_type, sensor_ids, raw_cutoff, rollup_cutoff))
+    return result
+
+
+def delete_in_batches(queryset, batch_size=1000, sleep=0):
+    """
+    分批删除 queryset 匹配的行，每批单独提交，逐批产生删除的行数。
+    sleep 为每批之间的停顿秒数，给其他写入让出数据库锁（SQLite 整库加锁）。
+    """
+    model = queryset.model
+    while True:
+        with transaction.atomic(using=queryset.db):
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return
+            # 用公开的 QuerySet.delete() 删除这批主键：数据点表没有外键指向，也没有
+            # 删除信号，Collector 判定可以快速删除，只执行一条 DELETE ... WHERE pk IN，
+            # 不加载模型实例；日后若加了信号或外键，它会自动改为逐个处理，不会漏掉级联。
+            model._base_manager.using(queryset.db).filter(pk__in=pks).delete()
+        yield len(pks)
+        if sleep:
+            time.sleep(sleep)
+
+
+def purge_querysets(sensor_id, raw_cutoff, rollup_cutoff):
+    """
+    返回一个传感器需要清理的 [(表名, queryset)]。
+    逐个传感器清理，每个查询都能走 (传感器ID, 时间) 开头的索引。
+    """
+    querysets = []
+    if raw_cutoff is not None:
+        querysets.append(('tb_datapoint_list', tb_datapoint_list.objects.filter(
+            sh_sensor_id=sensor_id, sh_timestamp__lt=raw_cutoff)))
+        querysets.append(('tb_datapoint_block', tb_datapoint_block.objects.filter(
+            sh_sensor_id=sensor_id, sh_end__lt=raw_cutoff)))
+    if rollup_cutoff is not None:
+        for resolution in RESOLUTIONS:
+            # 只删除整个时间桶都已过期的汇总数据
+            querysets.append(('tb_datapoint_rollup', tb_datapoint_rollup.objects.filter(
+                sh_sensor_id=sensor_id, sh_resolution=resolution,
+                sh_bucket__lte=rollup_cutoff - resolution)))
+    return querysets
+
+
+def analyze(models=(tb_datapoint_list, tb_datapoint_block, tb_datapoint_rollup)):
+    """更新 SQLite 的统计信息（sqlite_stat1），其他数据库自行维护统计信息。"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        # 每个索引只抽样约 1000 行，大表上也很快（SQLite 3.32 起支持）
+        cursor.execute('PRAGMA analysis_limit = 1000')
+        for model in models:
+            cursor.execute('ANALYZE %s' % connection.ops.quote_name(model._meta.db_table))
@@ -0,0 +1,219 @@
+#_*_ coding:utf-8 _*_
+
+# 数据汇总（rollup）模块。
+# 每写入一批数据点，就按 1 分钟、1 小时、1 天三种粒度增量更新 tb_datapoint_rollup；
+# 查询长时间段的历史数据时，按客户端要求的点数选用合适的粒度，直接返回汇总结果。
+
+from __future__ import unicode_literals
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max, Min
+
+from .models import tb_datapoint_list, tb_datapoint_block, tb_datapoint_rollup
+from . import timeseries
+
+# 汇总粒度（秒），从细到粗。
+RESOLUTIONS = (60, 3600, 86400)
+# 回填时每次从数据库读取多少秒的数据，必须是最粗粒度的整数倍。
+BACKFILL_CHUNK = 86400
+# 查询历史数据时默认返回的最多点数。
+DEFAULT_POINTS = getattr(settings, 'SH_ROLLUP_POINTS', 1000)
+# 单次查询允许的最多点数，原始数据路径最多读取这么多个数据点。
+MAX_POINTS = getattr(settings, 'SH_ROLLUP_MAX_POINTS', 10000)
+# 合并到已有时间桶时写回的列。
+MERGED_FIELDS = ('sh_count', 'sh_min', 'sh_max', 'sh_sum', 'sh_last', 'sh_last_timestamp')
+# 并发插入同一个新时间桶时的重试次数。
+INSERT_RETRIES = 3
+
+
+class Bucket(object):
+    """一个时间桶内的汇总值。"""
+
+    __slots__ = ('count', 'min', 'max', 'sum', 'last', 'last_timestamp')
+
+    def __init__(self, timestamp, value):
+        self.count = 1
+        self.min = self.max = self.sum = self.last = value
+        self.last_timestamp = timestamp
+
+    def add(self, timestamp, value):
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sum += value
+        if timestamp >= self.last_timestamp:
+            self.last, self.last_timestamp = value, timestamp
+
+    def merge_into(self, row):
+        """把本桶的汇总值合并到已有的 tb_datapoint_rollup 行上。"""
+        row.sh_count += self.count
+        row.sh_min = min(row.sh_min, self.min)
+        row.sh_max = max(row.sh_max, self.max)
+        row.sh_sum += self.sum
+        if self.last_timestamp >= row.sh_last_timestamp:
+            row.sh_last = self.last
+            row.sh_last_timestamp = self.last_timestamp
+
+    def to_row(self, sensor_id, resolution, bucket):
+        return tb_datapoint_rollup(
+            sh_sensor_id=sensor_id, sh_resolution=resolution, sh_bucket=bucket,
+            sh_count=self.count, sh_min=self.min, sh_max=self.max,
+            sh_sum=self.sum, sh_last=self.last,
+            sh_last_timestamp=self.last_timestamp)
+
+
+def aggregate(readings):
+    """把 [(传感器ID, 时间戳, 数据值), ...] 汇总为 {(传感器ID, 粒度, 桶起点): Bucket}。"""
+    buckets = {}
+    for sensor_id, timestamp, value in readings:
+        if value is None:
+            continue
+        for resolution in RESOLUTIONS:
+            key = (sensor_id, resolution, timestamp - timestamp % resolution)
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = Bucket(timestamp, value)
+            else:
+                bucket.add(timestamp, value)
+    return buckets
+
+
+def _bulk_create(rows):
+    if rows:
+        batch_size = connection.ops.bulk_batch_size(
+            [f for f in tb_datapoint_rollup._meta.concrete_fields
+             if not f.primary_key], rows)
+        tb_datapoint_rollup.objects.bulk_create(rows, batch_size=max(batch_size, 1))
+
+
+def _existing(resolution, keys):
+    """一种粒度一次查询（加行锁），取出 keys 涉及的已有时间桶，返回 {键: 行}。"""
+    rows = tb_datapoint_rollup.objects.select_for_update().filter(
+        sh_resolution=resolution,
+        sh_sensor_id__in=set(key[0] for key in keys),
+        sh_bucket__gte=min(key[2] for key in keys),
+        sh_bucket__lte=max(key[2] for key in keys))
+    return dict(((row.sh_sensor_id, resolution, row.sh_bucket), row) for row in rows)
+
+
+def _update_resolution(buckets, resolution, keys):
+    found = _existing(resolution, keys)
+    new_rows, changed = [], []
+    for key in keys:
+        row = found.get(key)
+        if row is None:
+            new_rows.append(buckets[key].to_row(*key))
+        else:
+            buckets[key].merge_into(row)
+            changed.append(row)
+    # 已有的时间桶用一条（分批的）UPDATE ... CASE 只写回汇总列
+    if changed:
+        tb_datapoint_rollup.objects.bulk_update(changed, MERGED_FIELDS)
+    _bulk_create(new_rows)
+
+
+def update(readings):
+    """
+    用新写入的数据点增量更新汇总表，应在写入数据点的同一个事务中调用。
+    readings 为 [(传感器ID, 时间戳, 数据值), ...]。
+    每种粒度一条 SELECT 取出已有的时间桶，一条 UPDATE 合并，一条 INSERT 写入新的时间桶。
+    """
+    buckets = aggregate(readings)
+    if not buckets:
+        return
+    with transaction.atomic():
+        for resolution in RESOLUTIONS:
+            keys = [key for key in buckets if key[1] == resolution]
+            for attempt in range(INSERT_RETRIES):
+                try:
+                    # 新的时间桶没有行可以锁，并发的请求可能同时插入同一个时间桶，
+                    # 违反唯一约束时回滚到保存点，重新读取（此时能读到对方的行）再合并
+                    with transaction.atomic():
+                        _update_resolution(buckets, resolution, keys)
+                    break
+                except IntegrityError:
+                    if attempt == INSERT_RETRIES - 1:
+                        raise
+
+
+def _sensor_span(sensor_id):
+    raw = tb_datapoint_list.objects.filter(sh_sensor_id=sensor_id).aggregate(
+        start=Min('sh_timestamp'), end=Max('sh_timestamp'))
+    block = tb_datapoint_block.objects.filter(sh_sensor_id=sensor_id).aggregate(
+        start=Min('sh_start'), end=Max('sh_end'))
+    starts = [t for t in (raw['start'], block['start']) if t is not None]
+    ends = [t for t in (raw['end'], block['end']) if t is not None]
+    if not starts:
+        return None, None
+    return min(starts), max(ends)
+
+
+def backfill(sensor_ids=None, start=None, end=None):
+    """
+    从原始数据点和压缩数据块重新计算汇总表，start、end 会对齐到整天。
+    返回写入的汇总行数。
+    """
+    if sensor_ids is None:
+        sensor_ids = set(tb_datapoint_list.objects.values_list(
+            'sh_sensor_id', flat=True).distinct())
+        sensor_ids.update(tb_datapoint_block.objects.values_list(
+            'sh_sensor_id', flat=True).distinct())
+    written = 0
+    for sensor_id in sorted(sensor_ids):
+        span_start, span_end = _sensor_span(sensor_id)
+        if span_start is None:
+            continue
+        if start is not None:
+            span_start = max(span_start, start)
+        if end is not None:
+            span_end = min(span_end, end - 1)
+        chunk = span_start - span_start % BACKFILL_CHUNK
+        while chunk <= span_end:
+            points = timeseries.read_points(sensor_id, chunk, chunk + BACKFILL_CHUNK)
+            buckets = aggregate((sensor_id, ts, value) for ts, value in points)
+            with transaction.atomic():
+                tb_datapoint_rollup.objects.filter(
+                    sh_sensor_id=sensor_id, sh_bucket__gte=chunk,
+                    sh_bucket__lt=chunk + BACKFILL_CHUNK).delete()
+                rows = [bucket.to_row(*key) for key, bucket in buckets.items()]
+                _bulk_create(rows)
+            written += len(rows)
+            chunk += BACKFILL_CHUNK
+    return written
+
+
+def choose_resolution(start, end, points):
+    """返回能在 points 个点以内覆盖 [start, end) 的最细粒度，都放不下时返回最粗粒度。"""
+    span = max(end - start, 1)
+    for resolution in RESOLUTIONS:
+        if (span + resolution - 1) // resolution <= points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def history(sensor_id, start, end, points=DEFAULT_POINTS):
+    """
+    返回传感器在 [start, end) 内的历史数据，点数不超过 points（最粗粒度除外）。
+    原始数据条数放得下时直接返回原始数据（resolution 为 0），否则返回汇总值。
+    points 超过 MAX_POINTS 时按 MAX_POINTS 处理。
+    """
+    points = min(points, MAX_POINTS)
+    # 最多读取 points + 1 个数据点（包括数据块中的），就能知道是否放得下，不必统计整个区间
+    raw = list(islice((p for p in timeseries.iter_points(
+        sensor_id, start, end, chunk_size=points + 1) if p[1] is not None), points + 1))
+    if len(raw) <= points:
+        return 0, [{'t': ts, 'min': value, 'max': value, 'avg': value,
+                    'count': 1, 'last': value}
+                   for ts, value, _ in raw]
+
+    resolution = choose_resolution(start, end, points)
+    rows = tb_datapoint_rollup.objects.filter(
+        sh_sensor_id=sensor_id, sh_resolution=resolution,
+        sh_bucket__gte=start - start % resolution, sh_bucket__lt=end,
+    ).order_by('sh_bucket').values_list(
+        'sh_bucket', 'sh_min', 'sh_max', 'sh_sum', 'sh_count', 'sh_last')
+    return resolution, [{'t': bucket, 'min': low, 'max': high,
+                         'avg': total / count, 'count': count, 'last': last}
+                        for bucket, low, high, total, count, last in rows]
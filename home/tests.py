@@ -1,3 +1,553 @@
-from django.test import TestCase
+#_*_ coding:utf-8 _*_
 
-# Create your tests here.
+from __future__ import unicode_literals
+import datetime
+import json
+import re
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase, mock
+from django.test.utils import CaptureQueriesContext
+from django.utils import six
+
+from .models import (tb_datapoint_block, tb_datapoint_list, tb_datapoint_rollup,
+                     tb_device, tb_sensor, tb_sensor_type, tb_sequence, tb_user,
+                     tb_user_token)
+from . import (auth, export, heartbeat, ingest, latest, registry, retention, rollup,
+               timeseries)
+
+
+def create_sensors(sensor_ids, device_id=1, sensor_type=1):
+    tb_sensor.objects.bulk_create([
+        tb_sensor(sh_id=sensor_id, sh_name='sensor %s' % sensor_id, sh_tags='',
+                  sh_type=sensor_type, sh_device_id=device_id,
+                  sh_last_update=datetime.date(2017, 1, 1), sh_last_data='')
+        for sensor_id in sensor_ids])
+
+
+def create_user(user_id, apikey):
+    return tb_user.objects.create(
+        sh_id=user_id, sh_username='user%s' % user_id, sh_password='', sh_email='',
+        sh_token='', sh_token_exptime=datetime.date(2017, 1, 1),
+        sh_regtime=datetime.date(2017, 1, 1), sh_status=True, sh_apikey=apikey)
+
+
+def create_device(device_id, user_id):
+    return tb_device.objects.create(
+        sh_id=device_id, sh_name='device %s' % device_id, sh_tags='', sh_locate='',
+        sh_user_id=user_id, sh_create_time=datetime.date(2017, 1, 1),
+        sh_last_active=datetime.date(2017, 1, 1))
+
+
+def json_lines(readings):
+    return '\n'.join(json.dumps(dict(zip(('sh_sensor_id', 'sh_timestamp', 'sh_value'), r)))
+                     for r in readings)
+
+
+class IngestTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_sensors([1, 2])
+
+    def ingest(self, readings):
+        return ingest.ingest(ingest.parse_body('application/x-ndjson', json_lines(readings)))
+
+    def test_json_lines(self):
+        result = self.ingest([(1, 100, 1.5), (2, 100, 2), (1, 160, 3)])
+        self.assertEqual(result, {'accepted': 3, 'duplicates': 0, 'rejected': 0, 'errors': []})
+        self.assertEqual(
+            sorted(tb_datapoint_list.objects.values_list('sh_sensor_id', 'sh_timestamp', 'sh_value')),
+            [(1, 100, 1.5), (1, 160, 3.0), (2, 100, 2.0)])
+
+    def test_binary_frame(self):
+        body = ingest.FRAME_RECORD.pack(1, 100, 1.5) + ingest.FRAME_RECORD.pack(2, 100, 2.5) + b'xx'
+        result = ingest.ingest(ingest.parse_body('application/octet-stream', body))
+        self.assertEqual(result['accepted'], 2)
+        self.assertEqual(result['rejected'], 1)
+        self.assertEqual(result['errors'][0]['line'], 3)
+
+    def test_invalid_and_unknown_sensor_rejected(self):
+        body = json_lines([(1, 100, 1), (3, 100, 1)]) + '\n{"sh_sensor_id": 1}\nnot json'
+        result = ingest.ingest(ingest.parse_body('', body))
+        self.assertEqual(result['accepted'], 1)
+        self.assertEqual(result['rejected'], 3)
+        self.assertEqual([e['line'] for e in result['errors']], [3, 4, 2])
+
+    def test_duplicates(self):
+        readings = [(1, 100, 1), (1, 160, 2), (2, 100, 3)]
+        self.ingest(readings)
+        # 重发整批读数，以及同一请求内的重复读数，都不会重复写入或重复汇总
+        result = self.ingest(readings + [(1, 220, 4), (1, 220, 5)])
+        self.assertEqual(result['accepted'], 1)
+        self.assertEqual(result['duplicates'], 4)
+        self.assertEqual(tb_datapoint_list.objects.count(), 4)
+        self.assertEqual(tb_datapoint_list.objects.get(sh_timestamp=220).sh_value, 4)
+        hour = tb_datapoint_rollup.objects.get(sh_sensor_id=1, sh_resolution=3600, sh_bucket=0)
+        self.assertEqual((hour.sh_count, hour.sh_sum, hour.sh_last), (3, 7, 4))
+
+    def test_concurrent_duplicates(self):
+        self.ingest([(1, 100, 1)])
+        # 查询已有读数之后，其他请求抢先写入了同一读数
+        for returning in (True, False):
+            with mock.patch.object(connection.features, 'can_return_ids_from_bulk_insert',
+                                   returning), \
+                    mock.patch.object(ingest, '_existing', side_effect=[set(), {(1, 100)}]):
+                result = self.ingest([(1, 100, 5), (2, 100, 2 if returning else 3)])
+            self.assertEqual((result['accepted'], result['duplicates']), (1, 1))
+            tb_datapoint_list.objects.filter(sh_sensor_id=2).delete()
+        # 被跳过的读数不计入汇总表和最新数据
+        hour = tb_datapoint_rollup.objects.get(sh_sensor_id=1, sh_resolution=3600, sh_bucket=0)
+        self.assertEqual((hour.sh_count, hour.sh_sum), (1, 1))
+        self.assertEqual(tb_sensor.objects.get(sh_id=1).sh_last_data, '1.0')
+        self.assertEqual(tb_datapoint_rollup.objects.get(
+            sh_sensor_id=2, sh_resolution=3600, sh_bucket=0).sh_count, 2)
+
+    def test_sh_id_allocation(self):
+        self.ingest([(1, 100, 1), (1, 160, 2)])
+        self.assertEqual(sorted(tb_datapoint_list.objects.values_list('sh_id', flat=True)), [1, 2])
+        # 读数自带的 sh_id 之后，计数器从更大的号码继续分配
+        ingest.ingest(ingest.parse_body('', json.dumps(
+            {'sh_id': 50, 'sh_sensor_id': 2, 'sh_timestamp': 100, 'sh_value': 1})))
+        self.ingest([(2, 160, 1)])
+        self.assertEqual(tb_datapoint_list.objects.get(sh_sensor_id=2, sh_timestamp=160).sh_id, 51)
+        # 计数器行丢失时按当前最大 sh_id 重新创建
+        tb_sequence.objects.all().delete()
+        self.ingest([(2, 220, 1)])
+        self.assertEqual(tb_datapoint_list.objects.get(sh_sensor_id=2, sh_timestamp=220).sh_id, 52)
+        self.assertEqual(tb_datapoint_list.objects.values('sh_id').distinct().count(), 5)
+
+    def test_more_sensors_than_sqlite_variables(self):
+        # 一批读数涉及的传感器超过 SQLite 单条语句 999 个参数的限制
+        sensor_ids = range(1000, 2200)
+        create_sensors(sensor_ids)
+        result = self.ingest([(sensor_id, 100, sensor_id) for sensor_id in sensor_ids])
+        self.assertEqual(result['accepted'], 1200)
+        result = self.ingest([(sensor_id, 100, sensor_id) for sensor_id in sensor_ids])
+        self.assertEqual(result['duplicates'], 1200)
+        self.assertEqual(tb_datapoint_list.objects.count(), 1200)
+
+
+class AuthTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        auth._cache.clear()
+        self.user = create_user(1, 'key-1')
+        self.token = tb_user_token.objects.create(sh_user_id=1, sh_token='token-1',
+                                                  sh_deadline=4000000000)
+
+    def test_changed_credentials_are_evicted(self):
+        self.assertEqual(auth.authenticate(token='token-1'), 1)
+        self.assertEqual(auth.authenticate(apikey='key-1'), 1)
+        # 改掉旧值后，旧的令牌和 APIKEY 立即失效
+        self.token.sh_token = 'token-2'
+        self.token.save()
+        self.user.sh_apikey = 'key-2'
+        self.user.save()
+        self.assertIsNone(auth.authenticate(token='token-1'))
+        self.assertIsNone(auth.authenticate(apikey='key-1'))
+        self.assertEqual(auth.authenticate(token='token-2'), 1)
+
+    def test_update_and_other_processes(self):
+        self.assertEqual(auth.authenticate(apikey='key-1'), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(auth.authenticate(apikey='key-1'), 1)
+        # update() 不发送信号，需要调用 invalidate()
+        tb_user.objects.filter(sh_id=1).update(sh_status=False)
+        auth.invalidate()
+        self.assertIsNone(auth.authenticate(apikey='key-1'))
+        # 其他进程增加了共享缓存中的版本号，本进程缓存的结果随之作废
+        tb_user.objects.filter(sh_id=1).update(sh_status=True)
+        cache.incr(auth.VERSION_KEY)
+        self.assertEqual(auth.authenticate(apikey='key-1'), 1)
+
+    def test_ingest_only_own_sensors(self):
+        create_user(2, 'key-2')
+        create_device(1, 1)
+        create_device(2, 2)
+        create_sensors([1, 2], device_id=1)
+        create_sensors([3], device_id=2)
+        response = self.client.post(
+            reverse('sh_datapoint_ingest'), json_lines([(1, 100, 1), (2, 100, 1), (3, 100, 1)]),
+            content_type='application/x-ndjson', HTTP_U_APIKEY='key-1')
+        result = json.loads(response.content.decode())
+        self.assertEqual((result['accepted'], result['rejected']), (2, 1))
+        self.assertEqual(result['errors'][0]['line'], 3)
+        self.assertFalse(tb_datapoint_list.objects.filter(sh_sensor_id=3).exists())
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_user(1, 'key-1')
+        create_user(2, 'key-2')
+        create_device(1, 1)
+        create_device(2, 2)
+        create_sensors(range(1, 1001), device_id=1)
+        create_sensors([2001], device_id=2)
+        ingest.ingest(ingest.parse_body('', json_lines([(1, 100, 1), (2001, 100, 2)])))
+
+    def get(self, name, kwargs=None, data=None, apikey='key-1'):
+        extra = {'HTTP_U_APIKEY': apikey} if apikey else {}
+        return self.client.get(reverse(name, kwargs=kwargs), data or {}, **extra)
+
+    def test_authentication_required(self):
+        for name, kwargs, data in [
+                ('api_object', {'resource': 'sh_sensor', 'sh_id': 1}, None),
+                ('api_objects', {'resource': 'sh_sensor'}, {'ids': '1'}),
+                ('sh_datapoint_range', None, {'sh_sensor_id': 1}),
+                ('sh_datapoint_export', None, {'sh_sensor_id': 1}),
+                ('sh_sensor_history', {'sh_id': 1}, {'start': 0, 'end': 200})]:
+            self.assertEqual(self.get(name, kwargs, data, apikey=None).status_code, 401)
+            self.assertEqual(self.get(name, kwargs, data).status_code, 200)
+
+    def test_history_points_limit(self):
+        response = self.get('sh_sensor_history', {'sh_id': 1},
+                            {'start': 0, 'end': 200, 'points': rollup.MAX_POINTS + 1})
+        self.assertEqual(response.status_code, 400)
+        response = self.get('sh_sensor_history', {'sh_id': 1},
+                            {'start': 0, 'end': 200, 'points': rollup.MAX_POINTS})
+        self.assertEqual(response.status_code, 200)
+
+    def test_scoped_to_caller(self):
+        self.assertEqual(self.get('api_object', {'resource': 'sh_user', 'sh_id': 2}).status_code, 404)
+        self.assertEqual(self.get('api_object', {'resource': 'sh_device', 'sh_id': 2}).status_code, 404)
+        self.assertEqual(self.get('api_object', {'resource': 'sh_sensor', 'sh_id': 2001}).status_code, 404)
+        data = json.loads(self.get('api_objects', {'resource': 'sh_datapoint_list'},
+                                   {'ids': '1,2'}).content.decode())
+        self.assertEqual(([row['sh_sensor_id'] for row in data['list']], data['missing']), ([1], [2]))
+        # 传感器类型是公共数据
+        self.assertEqual(self.get('api_objects', {'resource': 'sh_sensor_type'},
+                                  {'ids': '1'}).status_code, 200)
+        for name, kwargs, data in [
+                ('sh_datapoint_range', None, {'sh_sensor_id': 2001}),
+                ('sh_datapoint_export', None, {'sh_sensor_id': 2001}),
+                ('sh_sensor_history', {'sh_id': 2001}, {'start': 0, 'end': 200})]:
+            self.assertEqual(self.get(name, kwargs, data).status_code, 404)
+            self.assertEqual(self.get(name, kwargs, data, apikey='key-2').status_code, 200)
+
+    def test_more_ids_than_sqlite_variables(self):
+        ids = ','.join('%d' % i for i in range(1, 1001))
+        data = json.loads(self.get('api_objects', {'resource': 'sh_sensor'},
+                                   {'ids': ids, 'fields': 'sh_name'}).content.decode())
+        self.assertEqual((len(data['list']), data['missing']), (1000, []))
+
+    def test_home_snapshot_with_many_devices(self):
+        # 设备数超过 SQLite 单条语句 999 个参数的限制
+        tb_device.objects.bulk_create([
+            tb_device(sh_id=device_id, sh_name='', sh_tags='', sh_locate='', sh_user_id=1,
+                      sh_create_time=datetime.date(2017, 1, 1),
+                      sh_last_active=datetime.date(2017, 1, 1))
+            for device_id in range(3, 1203)])
+        create_sensors([3001], device_id=1202)
+        with CaptureQueriesContext(connection) as queries:
+            data = json.loads(self.get('api_home').content.decode())
+        # 传感器按设备的子查询过滤，不会把 1201 个设备ID作为参数传入
+        sensor_sql = [q['sql'] for q in queries.captured_queries if 'home_tb_sensor' in q['sql']
+                      and 'sh_about' not in q['sql']]
+        self.assertTrue(sensor_sql)
+        self.assertTrue(all('1201' not in sql for sql in sensor_sql))
+        devices = data['data']['devices']
+        self.assertEqual(len(devices), 1201)
+        self.assertEqual([s['sh_id'] for s in devices[-1]['sensors']], [3001])
+        self.assertEqual(len(devices[0]['sensors']), 1000)
+
+
+class HeartbeatTests(TestCase):
+
+    def test_flush_more_devices_than_one_statement(self):
+        tb_device.objects.bulk_create([
+            tb_device(sh_id=device_id, sh_name='', sh_tags='', sh_locate='', sh_user_id=1,
+                      sh_create_time=datetime.date(2017, 1, 1),
+                      sh_last_active=datetime.date(2017, 1, 1))
+            for device_id in range(1, 301)])
+        heartbeat._write({1: 2000.0})
+        # 每个设备占用 7 个参数，SQLite 上每条 UPDATE 最多 142 个设备
+        with CaptureQueriesContext(connection) as queries:
+            heartbeat._write(dict((device_id, 1000.0 + device_id) for device_id in range(1, 301)))
+        updates = [q for q in queries.captured_queries if 'UPDATE' in q['sql']]
+        self.assertEqual(len(updates), 3 if connection.vendor == 'sqlite' else 2)
+        self.assertEqual(tb_device.objects.filter(sh_last_heartbeat__isnull=False).count(), 300)
+        # 更早的心跳不覆盖更新的心跳
+        self.assertEqual(tb_device.objects.get(sh_id=1).sh_last_heartbeat, 2000.0)
+        self.assertEqual(tb_device.objects.get(sh_id=300).sh_last_heartbeat, 1300.0)
+
+
+class RegistryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        registry.sensor_types.invalidate()
+        tb_sensor_type.objects.create(sh_id=1, sh_name='old', sh_description='')
+
+    def test_reload_after_max_age(self):
+        self.assertEqual(registry.sensor_types.get(1)['sh_name'], 'old')
+        # 其他进程的修改（update() 不发信号，版本号也没有变化）
+        tb_sensor_type.objects.filter(sh_id=1).update(sh_name='new')
+        with mock.patch.object(registry.time, 'time', return_value=time.time() + 60):
+            self.assertEqual(registry.sensor_types.get(1)['sh_name'], 'old')
+        with mock.patch.object(registry.time, 'time',
+                               return_value=time.time() + registry.MAX_AGE + 1):
+            self.assertEqual(registry.sensor_types.get(1)['sh_name'], 'new')
+
+
+class LatestTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_sensors([1, 2])
+
+    def test_written_back_in_ingest(self):
+        ingest.ingest(ingest.parse_body('', json_lines([(1, 100, 1), (1, 160, 2.5), (2, 100, 3)])))
+        # 不依赖缓存，数据库中已经是最新数据
+        cache.clear()
+        self.assertEqual(dict(tb_sensor.objects.values_list('sh_id', 'sh_last_data')),
+                         {1: '2.5', 2: '3.0'})
+        self.assertEqual(tb_sensor.objects.get(sh_id=1).sh_last_update, latest.to_date(160))
+        self.assertIsNone(latest.get(1))
+
+    def test_older_readings_do_not_overwrite(self):
+        ingest.ingest(ingest.parse_body('', json_lines([(1, 160, 2)])))
+        self.assertEqual(latest.get(1), (160, 2.0))
+        # 补传的旧数据不覆盖最新数据
+        ingest.ingest(ingest.parse_body('', json_lines([(1, 100, 1), (2, 100, 3)])))
+        self.assertEqual(latest.get_many([1, 2]), {1: (160, 2.0), 2: (100, 3.0)})
+        self.assertEqual(tb_sensor.objects.get(sh_id=1).sh_last_data, '2.0')
+
+    def test_older_readings_after_cache_miss(self):
+        ingest.ingest(ingest.parse_body('', json_lines([(1, 2000000000, 9), (2, 100, 3)])))
+        # 缓存被清空（淘汰、进程重启）后，补传的旧读数仍不覆盖数据库中的最新数据
+        cache.clear()
+        ingest.ingest(ingest.parse_body('', json_lines([(1, 1000000000, 1), (2, 160, 4)])))
+        sensor = tb_sensor.objects.get(sh_id=1)
+        self.assertEqual((sensor.sh_last_data, sensor.sh_last_timestamp), ('9.0', 2000000000))
+        self.assertEqual(sensor.sh_last_update, latest.to_date(2000000000))
+        self.assertEqual(latest.get_many([1, 2]), {2: (160, 4.0)})
+        # 同一天内的旧读数按完整的时间戳比较
+        ingest.ingest(ingest.parse_body('', json_lines([(2, 130, 5)])))
+        self.assertEqual(tb_sensor.objects.get(sh_id=2).sh_last_data, '4.0')
+
+    def test_update_guard(self):
+        tb_sensor.objects.filter(sh_id=2).update(sh_last_timestamp=500, sh_last_data='5')
+        sensor = tb_sensor.objects.get(sh_id=2)
+        # 读取之后被并发请求写入了更新的数据时，UPDATE 中的条件让这一行保持不变
+        newer = latest._newer(400)
+        tb_sensor.objects.bulk_update([tb_sensor(
+            pk=sensor.pk,
+            sh_last_data=latest._guarded('sh_last_data', newer, '4.0'),
+            sh_last_timestamp=latest._guarded('sh_last_timestamp', newer, 400))],
+            ['sh_last_data', 'sh_last_timestamp'])
+        sensor = tb_sensor.objects.get(sh_id=2)
+        self.assertEqual((sensor.sh_last_data, sensor.sh_last_timestamp), ('5', 500))
+        newer = latest._newer(600)
+        tb_sensor.objects.bulk_update([tb_sensor(
+            pk=sensor.pk, sh_last_data=latest._guarded('sh_last_data', newer, '6.0'))],
+            ['sh_last_data'])
+        self.assertEqual(tb_sensor.objects.get(sh_id=2).sh_last_data, '6.0')
+
+
+class CompactionTests(TestCase):
+
+    def setUp(self):
+        create_user(1, 'key-1')
+        create_device(1, 1)
+        create_sensors([1])
+        # 两个完整的窗口（0 和 3600 开始）以及正在写入的窗口中各有数据点
+        self.points = [(t, float(t % 7)) for t in range(0, 7500, 60)]
+        ingest.ingest(ingest.parse_body('', json_lines((1, t, v) for t, v in self.points)))
+
+    def test_encode_decode(self):
+        points = [(10, 1.5), (70, 1.5), (130, -2.25), (131, 1e300), (4000, 0.0)]
+        self.assertEqual(timeseries.decode_block(0, timeseries.encode_block(0, points)), points)
+
+    def test_compact(self):
+        self.assertEqual(timeseries.compact(7500), 2)
+        self.assertEqual(tb_datapoint_block.objects.count(), 2)
+        self.assertEqual(tb_datapoint_list.objects.count(), len(self.points))
+        self.assertEqual(timeseries.read_points(1, 0, 10000), self.points)
+        # 再次打包会合并已有的数据块，不会重复
+        timeseries.compact(7500)
+        self.assertEqual(sum(tb_datapoint_block.objects.values_list('sh_count', flat=True)), 120)
+
+    def test_compact_in_chunks_keeps_null_values(self):
+        create_sensors([2])
+        tb_datapoint_list.objects.create(sh_id=1000, sh_sensor_id=1, sh_timestamp=30, sh_value=None)
+        ingest.ingest(ingest.parse_body('', json_lines((2, t, 1) for t in range(0, 3600, 600))))
+        # 按（传感器，时间戳）分块读取，窗口跨过块的边界也打包在一起
+        with mock.patch.object(timeseries, 'CHUNK_SIZE', 7):
+            self.assertEqual(timeseries.compact(7500, delete=True), 3)
+        self.assertEqual(sorted(tb_datapoint_block.objects.values_list(
+            'sh_sensor_id', 'sh_start', 'sh_count')), [(1, 0, 60), (1, 3600, 60), (2, 0, 6)])
+        # 数据值为空的数据点没有打包进数据块，也不会被删除
+        self.assertEqual(list(tb_datapoint_list.objects.filter(sh_timestamp__lt=7200).values_list(
+            'sh_sensor_id', 'sh_timestamp', 'sh_value')), [(1, 30, None)])
+
+    def test_readers_after_compact_delete(self):
+        self.assertEqual(timeseries.compact(7500, delete=True), 2)
+        self.assertEqual(tb_datapoint_list.objects.count(), 5)
+        self.assertEqual(timeseries.read_points(1, 0, 10000), self.points)
+        self.assertEqual(timeseries.read_points(1, 3000, 3700),
+                         [p for p in self.points if 3000 <= p[0] < 3700])
+
+        # 区间查询跨过数据块与原始数据的边界翻页
+        url = reverse('sh_datapoint_range')
+        pages, cursor = [], ''
+        while cursor is not None:
+            data = json.loads(self.client.get(url, {
+                'sh_sensor_id': 1, 'start': 3000, 'limit': 50, 'cursor': cursor},
+                HTTP_U_APIKEY='key-1').content.decode())
+            pages.append(data['list'])
+            cursor = data['next']
+        self.assertEqual([(row['sh_timestamp'], row['sh_value']) for page in pages for row in page],
+                         [p for p in self.points if p[0] >= 3000])
+        # 数据块中的数据点没有 sh_id
+        self.assertIsNone(pages[0][0]['sh_id'])
+        self.assertIsNotNone(pages[-1][-1]['sh_id'])
+
+        # 导出
+        for stream in (False, True):
+            rows = list(export.iter_rows(1, chunk_size=7, stream=stream))
+            self.assertEqual([(r[2], r[3]) for r in rows], self.points)
+            self.assertIsNone(rows[0][0])
+            self.assertIsNotNone(rows[-1][0])
+        lines = b''.join(export.export(1)).decode().splitlines()
+        self.assertEqual(lines[1], ',1,0,0.0')
+        self.assertEqual(len(lines), len(self.points) + 1)
+
+        # 历史数据的原始数据路径
+        resolution, rows = rollup.history(1, 0, 7500, points=1000)
+        self.assertEqual(resolution, 0)
+        self.assertEqual([(r['t'], r['last']) for r in rows], self.points)
+
+        # 回填汇总
+        tb_datapoint_rollup.objects.all().delete()
+        rollup.backfill()
+        self.assertEqual(tb_datapoint_rollup.objects.get(
+            sh_resolution=86400, sh_bucket=0).sh_count, len(self.points))
+
+
+class RollupTests(TestCase):
+
+    def test_update(self):
+        rollup.update([(1, 0, 1.0), (1, 30, 3.0), (1, 90, 2.0), (2, 0, 5.0)])
+        # 已有的时间桶：每种粒度一条 SELECT、一条 UPDATE，加上新时间桶的一条 INSERT
+        with CaptureQueriesContext(connection) as queries:
+            rollup.update([(1, 10, -1.0), (1, 150, 4.0), (2, 20, 6.0)])
+        statements = [re.search(r'SELECT|UPDATE|INSERT', q['sql']).group()
+                      for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['SELECT', 'UPDATE', 'INSERT', 'SELECT', 'UPDATE', 'SELECT', 'UPDATE'])
+        minute = tb_datapoint_rollup.objects.get(sh_sensor_id=1, sh_resolution=60, sh_bucket=0)
+        self.assertEqual((minute.sh_count, minute.sh_min, minute.sh_max, minute.sh_sum),
+                         (3, -1.0, 3.0, 3.0))
+        self.assertEqual((minute.sh_last, minute.sh_last_timestamp), (3.0, 30))
+        day = tb_datapoint_rollup.objects.get(sh_sensor_id=1, sh_resolution=86400)
+        self.assertEqual((day.sh_count, day.sh_sum, day.sh_last), (5, 9.0, 4.0))
+        self.assertEqual(tb_datapoint_rollup.objects.filter(sh_resolution=60).count(), 4)
+
+    def test_concurrent_new_bucket(self):
+        rollup.update([(1, 0, 1.0)])
+        real_existing = rollup._existing
+        calls = []
+
+        def existing(resolution, keys):
+            # 第一次读取时假装时间桶还不存在，就像并发的请求在读取之后才插入它
+            calls.append(resolution)
+            if len(calls) == 1:
+                return {}
+            return real_existing(resolution, keys)
+
+        with mock.patch.object(rollup, '_existing', side_effect=existing):
+            rollup.update([(1, 10, 2.0)])
+        self.assertEqual(calls[:2], [60, 60])
+        minute = tb_datapoint_rollup.objects.get(sh_sensor_id=1, sh_resolution=60, sh_bucket=0)
+        self.assertEqual((minute.sh_count, minute.sh_sum), (2, 3.0))
+
+    def test_history(self):
+        create_sensors([1])
+        points = [(t, 1.0) for t in range(0, 7200, 60)]
+        ingest.ingest(ingest.parse_body('', json_lines((1, t, v) for t, v in points)))
+        resolution, rows = rollup.history(1, 0, 7200, points=120)
+        self.assertEqual((resolution, len(rows)), (0, 120))
+        # 放不下时只多读一个点就改用汇总数据
+        resolution, rows = rollup.history(1, 0, 7200, points=119)
+        self.assertEqual(resolution, 3600)
+        self.assertEqual([(r['t'], r['count'], r['avg']) for r in rows],
+                         [(0, 60, 1.0), (3600, 60, 1.0)])
+        # 点数超过 MAX_POINTS 时按 MAX_POINTS 处理，原始数据最多读取 MAX_POINTS + 1 个
+        with mock.patch.object(rollup, 'MAX_POINTS', 100):
+            resolution, rows = rollup.history(1, 0, 7200, points=100000000)
+        self.assertEqual(resolution, 3600)
+
+
+class DedupeTests(TestCase):
+
+    def setUp(self):
+        create_sensors([1])
+        # 模拟加上唯一约束之前的表
+        with connection.schema_editor() as editor:
+            editor.alter_unique_together(
+                tb_datapoint_list, [('sh_sensor_id', 'sh_timestamp')], [])
+        self.addCleanup(self.restore_unique)
+        tb_datapoint_list.objects.bulk_create([
+            tb_datapoint_list(sh_id=i, sh_sensor_id=1, sh_timestamp=t, sh_value=v)
+            for i, (t, v) in enumerate([(0, 1), (0, 5), (60, 2), (0, 5)])])
+        rollup.backfill()
+
+    def restore_unique(self):
+        tb_datapoint_list.objects.all().delete()
+        with connection.schema_editor() as editor:
+            editor.alter_unique_together(
+                tb_datapoint_list, [], [('sh_sensor_id', 'sh_timestamp')])
+
+    def test_migration_refuses_duplicates(self):
+        from importlib import import_module
+        from django.apps import apps
+        migration = import_module('home.migrations.0008_datapoint_unique_reading')
+        with self.assertRaisesRegexp(RuntimeError, 'dedupe_datapoints'):
+            migration.check_duplicate_readings(apps, None)
+
+    def test_command(self):
+        out = six.StringIO()
+        call_command('dedupe_datapoints', stdout=out)
+        self.assertIn('--delete', out.getvalue())
+        self.assertEqual(tb_datapoint_list.objects.count(), 4)
+        call_command('dedupe_datapoints', delete=True, stdout=out)
+        self.assertEqual(sorted(tb_datapoint_list.objects.values_list('sh_timestamp', 'sh_value')),
+                         [(0, 1.0), (60, 2.0)])
+        # 汇总数据按清理后的读数重新计算
+        minute = tb_datapoint_rollup.objects.get(sh_sensor_id=1, sh_resolution=60, sh_bucket=0)
+        self.assertEqual((minute.sh_count, minute.sh_sum), (1, 1.0))
+
+
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        create_sensors([1, 2])
+        ingest.ingest(ingest.parse_body('', json_lines(
+            [(1, t, 1) for t in range(0, 600, 60)] + [(2, 0, 1)])))
+
+    def test_delete_in_batches(self):
+        queryset = tb_datapoint_list.objects.filter(sh_sensor_id=1, sh_timestamp__lt=420)
+        # 每批一条 SELECT 取主键、一条 DELETE，不加载模型实例
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(retention.delete_in_batches(queryset, batch_size=3)), [3, 3, 1])
+        statements = [re.search(r'SELECT|DELETE', q['sql']).group()
+                      for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['SELECT', 'DELETE'] * 3 + ['SELECT'])
+        self.assertEqual(sorted(tb_datapoint_list.objects.values_list('sh_sensor_id', 'sh_timestamp')),
+                         [(1, 420), (1, 480), (1, 540), (2, 0)])
+
+    def test_purge_querysets(self):
+        for table, queryset in retention.purge_querysets(1, 300, 3000):
+            list(retention.delete_in_batches(queryset))
+        self.assertEqual(tb_datapoint_list.objects.filter(sh_sensor_id=1).count(), 5)
+        # 汇总数据只删除整个时间桶都已过期的
+        self.assertFalse(tb_datapoint_rollup.objects.filter(sh_sensor_id=1, sh_resolution=60).exists())
+        self.assertTrue(tb_datapoint_rollup.objects.filter(sh_sensor_id=1, sh_resolution=3600).exists())
+        self.assertEqual(tb_datapoint_list.objects.filter(sh_sensor_id=2).count(), 1)
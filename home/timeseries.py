@@ -0,0 +1,252 @@
+#_*_ coding:utf-8 _*_
+
+# 数据点的压缩存储（数据块）。
+# 每个传感器每个时间窗口（默认一小时）的数据点被编码进一行 tb_datapoint_block：
+#   头部：版本号（1 字节）+ 点数（uint32，小端序）
+#   每个点：时间戳的二阶差分（zigzag 变长整数）
+#           + 数据值与上一个数据值按位异或的结果（变长整数）
+# 采样间隔固定时，时间戳的二阶差分为 0，只占 1 个字节；相邻数据值相近时，
+# 异或结果的高位全是 0，也能省下大部分字节。编码是无损的。
+# 打包并删除原始数据后，数据点只存在于数据块中，按传感器读取数据点的地方
+# （区间查询、导出、历史数据、回填汇总）都要通过 iter_points 合并读取。
+# 数据块不保存 sh_id，打包进数据块的数据点只能按（传感器，时间戳）访问。
+
+from __future__ import unicode_literals
+import struct
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import tb_datapoint_list, tb_datapoint_block
+
+# 数据块的时间窗口长度（秒），可在 settings.py 中覆盖。
+BLOCK_SECONDS = getattr(settings, 'SH_DATAPOINT_BLOCK_SECONDS', 3600)
+# 合并读取时每次查询的原始数据行数与数据块个数。
+CHUNK_SIZE = 2000
+BLOCK_CHUNK_SIZE = 24
+
+BLOCK_VERSION = 1
+_HEADER = struct.Struct('<BI')
+_DOUBLE = struct.Struct('<d')
+_UINT64 = struct.Struct('<Q')
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _write_varint(out, n):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _float_bits(value):
+    return _UINT64.unpack(_DOUBLE.pack(value))[0]
+
+
+def _bits_float(bits):
+    return _DOUBLE.unpack(_UINT64.pack(bits))[0]
+
+
+def window_start(timestamp):
+    """返回时间戳所在窗口的起点。"""
+    return timestamp - timestamp % BLOCK_SECONDS
+
+
+def encode_block(start, points):
+    """把按时间排序的 [(时间戳, 数据值), ...] 编码为 bytes。"""
+    out = bytearray(_HEADER.pack(BLOCK_VERSION, len(points)))
+    prev_ts, prev_delta, prev_bits = start, 0, 0
+    for timestamp, value in points:
+        delta = timestamp - prev_ts
+        _write_varint(out, _zigzag(delta - prev_delta))
+        bits = _float_bits(value)
+        _write_varint(out, bits ^ prev_bits)
+        prev_ts, prev_delta, prev_bits = timestamp, delta, bits
+    return bytes(out)
+
+
+def decode_block(start, data):
+    """encode_block 的逆过程，返回 [(时间戳, 数据值), ...]。"""
+    data = bytearray(data)
+    version, count = _HEADER.unpack_from(bytes(data[:_HEADER.size]))
+    if version != BLOCK_VERSION:
+        raise ValueError('不支持的数据块版本：%s' % version)
+    pos = _HEADER.size
+    points = []
+    prev_ts, prev_delta, prev_bits = start, 0, 0
+    for _ in range(count):
+        dod, pos = _read_varint(data, pos)
+        xor, pos = _read_varint(data, pos)
+        delta = prev_delta + _unzigzag(dod)
+        timestamp = prev_ts + delta
+        bits = prev_bits ^ xor
+        points.append((timestamp, _bits_float(bits)))
+        prev_ts, prev_delta, prev_bits = timestamp, delta, bits
+    return points
+
+
+def compact(before, sensor_ids=None, delete=False):
+    """
+    把时间戳早于 before 的原始数据点按（传感器，时间窗口）打包进数据块。
+    已有数据块的窗口会与新数据合并去重；delete 为 True 时删除已打包的原始数据。
+    返回打包的窗口数。
+    """
+    # 只打包完整的窗口，避免把正在写入的窗口截断
+    before = window_start(before)
+    rows = tb_datapoint_list.objects.filter(
+        sh_timestamp__lt=before, sh_value__isnull=False)
+    if sensor_ids is not None:
+        rows = rows.filter(sh_sensor_id__in=sensor_ids)
+    rows = rows.order_by('sh_sensor_id', 'sh_timestamp').values_list(
+        'sh_sensor_id', 'sh_timestamp', 'sh_value')
+
+    windows = 0
+    current, points = None, []
+    for sensor_id, timestamp, value in _keyset_rows(rows):
+        key = (sensor_id, window_start(timestamp))
+        if key != current:
+            if points:
+                _flush_window(current, points, delete)
+                windows += 1
+            current, points = key, []
+        points.append((timestamp, value))
+    if points:
+        _flush_window(current, points, delete)
+        windows += 1
+    return windows
+
+
+def _keyset_rows(rows):
+    """
+    按（传感器，时间戳）分块读取 rows，每块 CHUNK_SIZE 行。
+    SQLite 没有服务器端游标，iterator() 也会把整个结果集读进内存；
+    这里每块一条从上一块最后一行之后开始的短查询，内存中只保留一块。
+    """
+    last = None
+    while True:
+        chunk = rows
+        if last is not None:
+            chunk = rows.filter(Q(sh_sensor_id__gt=last[0]) |
+                                Q(sh_sensor_id=last[0], sh_timestamp__gt=last[1]))
+        chunk = list(chunk[:CHUNK_SIZE])
+        for row in chunk:
+            yield row
+        if len(chunk) < CHUNK_SIZE:
+            return
+        last = chunk[-1]
+
+
+def _flush_window(key, points, delete):
+    sensor_id, start = key
+    with transaction.atomic():
+        try:
+            block = tb_datapoint_block.objects.get(
+                sh_sensor_id=sensor_id, sh_start=start)
+            points = points + decode_block(start, block.sh_data)
+        except tb_datapoint_block.DoesNotExist:
+            block = tb_datapoint_block(sh_sensor_id=sensor_id, sh_start=start)
+        points = sorted(set(points))
+        block.sh_end = points[-1][0]
+        block.sh_count = len(points)
+        block.sh_data = encode_block(start, points)
+        block.save()
+        if delete:
+            # 数据值为空的数据点无法编码进数据块，没有被打包，保留原始数据
+            tb_datapoint_list.objects.filter(
+                sh_sensor_id=sensor_id, sh_timestamp__gte=start,
+                sh_timestamp__lt=start + BLOCK_SECONDS, sh_value__isnull=False).delete()
+
+
+def _raw_points(sensor_id, start, end, chunk_size, stream):
+    rows = tb_datapoint_list.objects.filter(sh_sensor_id=sensor_id)
+    if start is not None:
+        rows = rows.filter(sh_timestamp__gte=start)
+    if end is not None:
+        rows = rows.filter(sh_timestamp__lt=end)
+    rows = rows.order_by('sh_timestamp').values_list('sh_timestamp', 'sh_value', 'sh_id')
+    if stream:
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield row
+        return
+    # 按时间戳分块，每块一条走 (sh_sensor_id, sh_timestamp) 索引的短查询；
+    # 同一传感器的时间戳是唯一的，可以直接作为游标
+    last = None
+    while True:
+        chunk = rows if last is None else rows.filter(sh_timestamp__gt=last)
+        count = 0
+        for row in chunk[:chunk_size].iterator():
+            count += 1
+            last = row[0]
+            yield row
+        if count < chunk_size:
+            return
+
+
+def _block_points(sensor_id, start, end):
+    blocks = tb_datapoint_block.objects.filter(sh_sensor_id=sensor_id)
+    if start is not None:
+        blocks = blocks.filter(sh_end__gte=start)
+    if end is not None:
+        blocks = blocks.filter(sh_start__lt=end)
+    blocks = blocks.order_by('sh_start').values_list('sh_start', 'sh_data')
+    last = None
+    while True:
+        chunk = list((blocks if last is None else blocks.filter(sh_start__gt=last))
+                     [:BLOCK_CHUNK_SIZE])
+        for block_start, data in chunk:
+            last = block_start
+            for timestamp, value in decode_block(block_start, data):
+                if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                    yield timestamp, value, None
+        if len(chunk) < BLOCK_CHUNK_SIZE:
+            return
+
+
+def iter_points(sensor_id, start=None, end=None, chunk_size=CHUNK_SIZE, stream=False):
+    """
+    按时间升序逐个产生传感器在 [start, end) 内的 (时间戳, 数据值, sh_id)，
+    合并原始数据与数据块，只在需要时才读取下一块，内存占用与总点数无关。
+    同一时间戳在两边都有时（打包时没有删除原始数据）只产生原始数据那一条；
+    数据块中的数据点没有 sh_id，为 None。
+    stream 为 True 时原始数据用一条查询的 iterator(chunk_size) 读取，否则按时间戳分块读取。
+    """
+    raw = _raw_points(sensor_id, start, end, chunk_size, stream)
+    blocks = _block_points(sensor_id, start, end)
+    r, b = next(raw, None), next(blocks, None)
+    while r is not None or b is not None:
+        if b is None or (r is not None and r[0] <= b[0]):
+            if b is not None and b[0] == r[0]:
+                b = next(blocks, None)
+            yield r
+            r = next(raw, None)
+        else:
+            yield b
+            b = next(blocks, None)
+
+
+def read_points(sensor_id, start, end):
+    """
+    读取传感器在 [start, end) 内的数据点，合并数据块与原始数据并去重，
+    按时间排序返回 [(时间戳, 数据值), ...]。
+    """
+    return [(timestamp, value) for timestamp, value, _ in iter_points(sensor_id, start, end)
+            if value is not None]
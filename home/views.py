@@ -3,10 +3,20 @@
 # 为保证代码的简洁，添加模版文件。视图只用使用模型对应的模板文件，传入元组自动匹配
 # 模板变量便可。模板文件在 ./templates/home
 
+from itertools import islice
+
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from .models import *
 from django.shortcuts import redirect
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from django.conf import settings
+from . import export, heartbeat, ingest, latest, rollup, timeseries
+from .api import (RESOURCES, MAX_IDS, home_snapshot, json_response,
+                  conditional_json_response, owns_sensor)
+from .auth import api_auth_required
+from .registry import sensor_types
 
 # Create your views here.
 #主目录，本项目不涉及前端，故只保留一个接口而不进行开发。
@@ -41,22 +51,234 @@ def sh_device(request,sh_id):
 def sh_sensor(request,sh_id):
     try:
         column = tb_sensor.objects.get(sh_id = sh_id)
+        # 最新数据以缓存为准，数据库中的值可能还没有写回
+        cached = latest.get(column.sh_id)
+        if cached is not None:
+            column.sh_last_update = latest.to_date(cached[0])
+            column.sh_last_data = '%s' % cached[1]
         return render(request, 'home/sh_sensor.html', {'tb_sensor': column})
     except tb_sensor.DoesNotExist:
         return HttpResponse(u'sh_sensor ID错误，请确认URL中ID号是否存在。。。')
 
 # 定义传感器返回类型的函数。
+# 传感器类型来自进程内缓存，不查询数据库。
 def sh_sensor_type(request,sh_id):
-    try:
-        column = tb_sensor_type.objects.get(sh_id = sh_id)
-        return render(request, 'home/sh_sensor_type.html', {'tb_sensor_type': column})
-    except tb_sensor_type.DoesNotExist:
+    column = sensor_types.get(int(sh_id)) if sh_id.isdigit() else None
+    if column is None:
         return HttpResponse(u'sh_sensor_type ID错误，请确认URL中ID号是否存在。。。')
+    return render(request, 'home/sh_sensor_type.html', {'tb_sensor_type': column})
 
-# 定义数据点的返回函数。
+# 定义数据点的返回函数。按 sh_id 只能查到原始数据点，已打包进数据块的数据点
+# 请使用区间查询接口读取。
 def sh_datapoint_list(request,sh_id):
     try:
         column = tb_datapoint_list.objects.get(sh_id = sh_id)
         return render(request, 'home/sh_datapoint_list.html', {'tb_datapoint_list': column})
     except tb_datapoint_list.DoesNotExist:
         return HttpResponse(u'sh_datapoint_list ID错误，请确认URL中ID号是否存在。。。')
+
+# 数据点批量写入接口，网关一次提交多条读数（JSON Lines 或二进制帧），
+# 返回写入成功、重复（已写入过）与被拒绝的条数。需要令牌或 APIKEY 认证，
+# 只能写入自己名下设备的传感器。
+@csrf_exempt
+@require_POST
+@api_auth_required
+def sh_datapoint_ingest(request):
+    readings = ingest.parse_body(request.META.get('CONTENT_TYPE'), request.body)
+    result = ingest.ingest(readings, request.sh_user_id)
+    # 重发已写入的读数也算成功，网关据此确认这批数据
+    result['state'] = 'SUCCESS' if result['accepted'] or result['duplicates'] else 'ERROR'
+    return json_response(result)
+
+def sensor_not_found():
+    # 不属于当前用户的传感器与不存在的传感器返回同样的结果
+    return json_response({'state': u'sh_sensor ID错误，请确认传感器是否存在。'}, status=404)
+
+# 区间查询每页默认与最多返回的数据点条数。
+RANGE_LIMIT = getattr(settings, 'SH_RANGE_LIMIT', 500)
+RANGE_MAX_LIMIT = getattr(settings, 'SH_RANGE_MAX_LIMIT', 5000)
+
+# 查询某个传感器在一段时间内的数据点，按时间升序返回，包括已打包进数据块的数据点
+# （这些数据点的 sh_id 为 null）。
+# 分页使用游标（上一页最后一条的时间戳，同一传感器的时间戳唯一），而不是 OFFSET，
+# 翻到多深都只走索引。需要令牌或 APIKEY 认证，只能查询自己名下设备的传感器。
+# http://127.0.0.1:8000/sh_datapoint_list/range/?sh_sensor_id=1&start=0&end=1490000000&limit=500&cursor=
+@require_GET
+@api_auth_required
+def sh_datapoint_range(request):
+    try:
+        sensor_id = int(request.GET['sh_sensor_id'])
+        start = int(request.GET.get('start', 0))
+        end = request.GET.get('end')
+        end = int(end) if end else None
+        limit = min(int(request.GET.get('limit', RANGE_LIMIT)), RANGE_MAX_LIMIT)
+        cursor = request.GET.get('cursor')
+        if cursor:
+            # 兼容旧的“时间戳_主键”格式的游标
+            start = max(start, int(cursor.split('_')[0]) + 1)
+    except (KeyError, ValueError):
+        return json_response({'state': u'参数错误，需要 sh_sensor_id，start、end、limit 和 cursor 必须是整数。'},
+                             status=400)
+    if limit < 1:
+        return json_response({'state': u'limit 必须大于 0。'}, status=400)
+    if not owns_sensor(request.sh_user_id, sensor_id):
+        return sensor_not_found()
+
+    # 多取一条用于判断是否还有下一页
+    rows = list(islice(timeseries.iter_points(
+        sensor_id, start, end, chunk_size=limit + 1), limit + 1))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = '%d' % rows[-1][0]
+    return json_response({
+        'state': 'SUCCESS',
+        'sh_sensor_id': sensor_id,
+        'list': [{'sh_id': sh_id, 'sh_timestamp': ts, 'sh_value': value}
+                 for ts, value, sh_id in rows],
+        'next': next_cursor,
+    })
+
+# 导出某个传感器一段时间内的数据点，format 为 csv 或 ndjson，gzip=1 时压缩。
+# 边查询边输出，导出几个月的数据也不会占用大量内存。
+# 需要令牌或 APIKEY 认证，只能导出自己名下设备的传感器。
+# http://127.0.0.1:8000/sh_datapoint_list/export/?sh_sensor_id=1&start=<t1>&end=<t2>&format=csv&gzip=1
+@require_GET
+@api_auth_required
+def sh_datapoint_export(request):
+    try:
+        sensor_id = int(request.GET['sh_sensor_id'])
+        start = request.GET.get('start')
+        start = int(start) if start else None
+        end = request.GET.get('end')
+        end = int(end) if end else None
+    except (KeyError, ValueError):
+        return json_response({'state': u'参数错误，需要 sh_sensor_id，start、end 必须是整数。'},
+                             status=400)
+    format = request.GET.get('format', 'csv')
+    if format not in export.FORMATS:
+        return json_response({'state': u'format 只能是 csv 或 ndjson。'}, status=400)
+    compress = request.GET.get('gzip') in ('1', 'true')
+    if not owns_sensor(request.sh_user_id, sensor_id):
+        return sensor_not_found()
+
+    filename = 'sensor_%d.%s' % (sensor_id, format)
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    else:
+        content_type = '%s; charset=utf-8' % export.CONTENT_TYPES[format]
+    response = StreamingHttpResponse(
+        export.export(sensor_id, start, end, format, compress),
+        content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    return response
+
+# 查询传感器的历史数据，服务器端按 points 指定的点数预算选择汇总粒度，
+# 返回每个时间桶的最小值、最大值、平均值、条数和最后一个值。
+# 需要令牌或 APIKEY 认证，只能查询自己名下设备的传感器。
+# http://127.0.0.1:8000/sh_sensor/<sensor_id>/history/?start=<t1>&end=<t2>&points=1000
+@require_GET
+@api_auth_required
+def sh_sensor_history(request, sh_id):
+    try:
+        sensor_id = int(sh_id)
+        start = int(request.GET['start'])
+        end = int(request.GET['end'])
+        points = int(request.GET.get('points', rollup.DEFAULT_POINTS))
+    except (KeyError, ValueError):
+        return json_response({'state': u'参数错误，start、end 必须是整数，points 可选。'},
+                             status=400)
+    if end <= start or points < 1:
+        return json_response({'state': u'参数错误，需要 start < end 且 points > 0。'},
+                             status=400)
+    if points > rollup.MAX_POINTS:
+        return json_response({'state': u'参数错误，points 不能超过 %s。' % rollup.MAX_POINTS},
+                             status=400)
+    if not owns_sensor(request.sh_user_id, sensor_id):
+        return sensor_not_found()
+    resolution, rows = rollup.history(sensor_id, start, end, points)
+    return json_response({
+        'state': 'SUCCESS',
+        'sh_sensor_id': sensor_id,
+        'resolution': resolution,
+        'list': rows,
+    })
+
+# JSON 接口：返回单个资源，?fields=a,b,c 指定只返回哪些字段，支持 ETag 条件请求。
+# 需要令牌或 APIKEY 认证，只能查到属于自己的资源。
+# http://127.0.0.1:8000/api/<resource>/<sh_id>/?fields=sh_name,sh_status
+@require_GET
+@api_auth_required
+def api_object(request, resource, sh_id):
+    resource = RESOURCES[resource]
+    try:
+        fields = resource.parse_fields(request.GET.get('fields'))
+        sh_id = int(sh_id)
+    except ValueError as e:
+        return json_response({'state': u'参数错误：%s' % e}, status=400)
+    rows = resource.fetch(fields, [sh_id], request.sh_user_id)
+    if sh_id not in rows:
+        return json_response({'state': u'ID错误，请确认URL中ID号是否存在。'}, status=404)
+    return conditional_json_response(request, {'state': 'SUCCESS', 'data': rows[sh_id]})
+
+# JSON 接口：一次请求按多个ID批量返回资源，每 500 个ID一条查询。
+# 需要令牌或 APIKEY 认证，不属于自己的资源列在 missing 中。
+# http://127.0.0.1:8000/api/<resource>/?ids=1,2,3&fields=sh_name
+@require_GET
+@api_auth_required
+def api_objects(request, resource):
+    resource = RESOURCES[resource]
+    try:
+        fields = resource.parse_fields(request.GET.get('fields'))
+        ids = [int(x) for x in request.GET.get('ids', '').split(',') if x.strip()]
+    except ValueError as e:
+        return json_response({'state': u'参数错误：%s' % e}, status=400)
+    if not ids or len(ids) > MAX_IDS:
+        return json_response({'state': u'参数错误，ids 需要 1 到 %d 个ID。' % MAX_IDS},
+                             status=400)
+    rows = resource.fetch(fields, ids, request.sh_user_id)
+    return conditional_json_response(request, {
+        'state': 'SUCCESS',
+        'list': [rows[sh_id] for sh_id in ids if sh_id in rows],
+        'missing': [sh_id for sh_id in ids if sh_id not in rows],
+    })
+
+# 首页快照：返回当前认证用户的设备、传感器、传感器类型和最新数据，
+# 查询次数固定，与设备和传感器的数量无关。需要令牌或 APIKEY 认证。
+# http://127.0.0.1:8000/api/home/
+@require_GET
+@api_auth_required
+def api_home(request):
+    snapshot = home_snapshot(request.sh_user_id)
+    if snapshot is None:
+        return json_response({'state': u'用户不存在。'}, status=404)
+    return conditional_json_response(request, {'state': 'SUCCESS', 'data': snapshot})
+
+# 设备心跳接口（POST），设备定期调用，只能为自己名下的设备发送心跳。需要令牌或 APIKEY 认证。
+# http://127.0.0.1:8000/sh_device/<device_id>/heartbeat/
+@csrf_exempt
+@require_POST
+@api_auth_required
+def sh_device_heartbeat(request, sh_id):
+    try:
+        sh_id = int(sh_id)
+    except ValueError:
+        sh_id = None
+    if sh_id is None or heartbeat.owner(sh_id) != request.sh_user_id:
+        return json_response({'state': u'sh_device ID错误，请确认URL中ID号是否存在。'}, status=404)
+    timestamp = heartbeat.record(sh_id)
+    return json_response({'state': 'SUCCESS', 'sh_id': sh_id, 'timestamp': timestamp})
+
+# 当前用户的在线设备：最近 window 秒内有心跳的设备。需要令牌或 APIKEY 认证。
+# http://127.0.0.1:8000/api/online/?window=90
+@require_GET
+@api_auth_required
+def api_online_devices(request):
+    try:
+        window = int(request.GET['window']) if 'window' in request.GET else None
+    except ValueError:
+        return json_response({'state': u'参数错误，window 需要是整数秒。'}, status=400)
+    devices = heartbeat.online_devices(window).filter(
+        sh_user_id=request.sh_user_id).order_by('sh_id').values('sh_id', 'sh_name', 'sh_last_heartbeat')
+    return json_response({'state': 'SUCCESS', 'list': list(devices)})
@@ -8,7 +8,8 @@ from django.contrib.admin.utils import (
     display_for_field, display_for_value, label_for_field, lookup_field,
 )
 from django.contrib.admin.views.main import (
-    ALL_VAR, EMPTY_CHANGELIST_VALUE, ORDER_VAR, PAGE_VAR, SEARCH_VAR,
+    ALL_VAR, CURSOR_VAR, EMPTY_CHANGELIST_VALUE, ORDER_VAR, PAGE_VAR,
+    SEARCH_VAR,
 )
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import NoReverseMatch
@@ -49,9 +50,11 @@ def pagination(cl):
     Generates the series of links to the pages in a paginated list.
     """
     paginator, page_num = cl.paginator, cl.page_num
+    keyset_page = getattr(cl, 'keyset_page', None)
 
     pagination_required = (not cl.show_all or not cl.can_show_all) and cl.multi_page
-    if not pagination_required:
+    if not pagination_required or keyset_page is not None:
+        # Keyset pages are only linked to the first and neighbouring pages.
         page_range = []
     else:
         ON_EACH_SIDE = 3
@@ -79,12 +82,24 @@ def pagination(cl):
             else:
                 page_range.extend(range(page_num + 1, paginator.num_pages))
 
+    first_url = previous_url = next_url = None
+    if pagination_required and keyset_page is not None:
+        if keyset_page.has_previous():
+            first_url = cl.get_query_string()
+            previous_url = cl.get_query_string({CURSOR_VAR: keyset_page.previous_cursor})
+        if keyset_page.has_next():
+            next_url = cl.get_query_string({CURSOR_VAR: keyset_page.next_cursor})
+
     need_show_all_link = cl.can_show_all and not cl.show_all and cl.multi_page
     return {
         'cl': cl,
         'pagination_required': pagination_required,
         'show_all_url': need_show_all_link and cl.get_query_string({ALL_VAR: ''}),
         'page_range': page_range,
+        'keyset_pagination': keyset_page is not None,
+        'first_url': first_url,
+        'previous_url': previous_url,
+        'next_url': next_url,
         'ALL_VAR': ALL_VAR,
         '1': 1,
     }
@@ -14,7 +14,9 @@ from django.contrib.admin.utils import (
 from django.core.exceptions import (
     FieldDoesNotExist, ImproperlyConfigured, SuspiciousOperation,
 )
-from django.core.paginator import InvalidPage
+from django.core.paginator import (
+    EstimatedCountPaginator, InvalidPage, KeysetPaginator,
+)
 from django.core.urlresolvers import reverse
 from django.db import models
 from django.utils import six
@@ -27,6 +29,7 @@ ALL_VAR = 'all'
 ORDER_VAR = 'o'
 ORDER_TYPE_VAR = 'ot'
 PAGE_VAR = 'p'
+CURSOR_VAR = 'c'
 SEARCH_VAR = 'q'
 ERROR_FLAG = 'e'
 
@@ -61,6 +64,7 @@ class ChangeList(object):
             self.page_num = int(request.GET.get(PAGE_VAR, 0))
         except ValueError:
             self.page_num = 0
+        self.cursor = request.GET.get(CURSOR_VAR)
         self.show_all = ALL_VAR in request.GET
         self.is_popup = IS_POPUP_VAR in request.GET
         to_field = request.GET.get(TO_FIELD_VAR)
@@ -70,6 +74,8 @@ class ChangeList(object):
         self.params = dict(request.GET.items())
         if PAGE_VAR in self.params:
             del self.params[PAGE_VAR]
+        if CURSOR_VAR in self.params:
+            del self.params[CURSOR_VAR]
         if ERROR_FLAG in self.params:
             del self.params[ERROR_FLAG]
 
@@ -173,16 +179,25 @@ class ChangeList(object):
 
     def get_results(self, request):
         paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        estimated = isinstance(paginator, EstimatedCountPaginator)
         # Get the number of objects, with admin filters applied.
         result_count = paginator.count
+        result_count_is_estimate = estimated and paginator.count_is_estimate
 
         # Get the total number of objects, with no admin filters applied.
         # Perform a slight optimization:
         # full_result_count is equal to paginator.count if no filters
         # were applied
+        full_result_count_is_estimate = result_count_is_estimate
         if self.model_admin.show_full_result_count:
             if self.get_filters_params() or self.params.get(SEARCH_VAR):
-                full_result_count = self.root_queryset.count()
+                if estimated:
+                    full_paginator = self.model_admin.get_paginator(
+                        request, self.root_queryset, self.list_per_page)
+                    full_result_count = full_paginator.count
+                    full_result_count_is_estimate = full_paginator.count_is_estimate
+                else:
+                    full_result_count = self.root_queryset.count()
             else:
                 full_result_count = result_count
         else:
@@ -190,8 +205,20 @@ class ChangeList(object):
         can_show_all = result_count <= self.list_max_show_all
         multi_page = result_count > self.list_per_page
 
-        # Get the list of objects to display on this page.
-        if (self.show_all and can_show_all) or not multi_page:
+        # Get the list of objects to display on this page. Keyset paginators
+        # seek from the cursor in the query string instead of using the page
+        # number, unless the chosen ordering doesn't allow it.
+        keyset_page = None
+        if self.show_all and can_show_all:
+            result_list = self.queryset._clone()
+        elif isinstance(paginator, KeysetPaginator) and paginator.can_seek:
+            try:
+                keyset_page = paginator.seek(self.cursor)
+            except InvalidPage:
+                raise IncorrectLookupParameters
+            result_list = keyset_page.object_list
+            multi_page = keyset_page.has_other_pages()
+        elif not multi_page:
             result_list = self.queryset._clone()
         else:
             try:
@@ -200,6 +227,9 @@ class ChangeList(object):
                 raise IncorrectLookupParameters
 
         self.result_count = result_count
+        self.result_count_is_estimate = result_count_is_estimate
+        self.full_result_count_is_estimate = full_result_count_is_estimate
+        self.keyset_page = keyset_page
         self.show_full_result_count = self.model_admin.show_full_result_count
         # Admin actions are shown if there is at least one entry
         # or if entries are not counted because show_full_result_count is disabled
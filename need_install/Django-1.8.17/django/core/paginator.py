@@ -1,7 +1,11 @@
 import collections
+import json
 from math import ceil
 
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.utils import six
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
 
 class InvalidPage(Exception):
@@ -16,6 +20,10 @@ class EmptyPage(InvalidPage):
     pass
 
 
+class InvalidCursor(InvalidPage):
+    pass
+
+
 class Paginator(object):
 
     def __init__(self, object_list, per_page, orphans=0,
@@ -103,6 +111,224 @@ class Paginator(object):
 QuerySetPaginator = Paginator   # For backwards-compatibility.
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    A Paginator that takes the number of objects in a QuerySet from the
+    database's statistics or query planner (QuerySet.estimated_count())
+    instead of counting them, once there are at least exact_count_threshold of
+    them. The page count, and which pages exist, follow from the estimate.
+    """
+    exact_count_threshold = 10000
+
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True, exact_count_threshold=None):
+        super(EstimatedCountPaginator, self).__init__(
+            object_list, per_page, orphans, allow_empty_first_page)
+        if exact_count_threshold is not None:
+            self.exact_count_threshold = exact_count_threshold
+        self._count_is_estimate = False
+
+    def page(self, number):
+        if not self.count_is_estimate:
+            return super(EstimatedCountPaginator, self).page(number)
+        # The estimate may be short of the real count, so the last page isn't
+        # cut off at it.
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def _get_count(self):
+        """
+        Returns the total number of objects, across all pages, estimated if
+        there are many of them.
+        """
+        if self._count is None:
+            try:
+                estimate = self.object_list.estimated_count()
+            except (AttributeError, TypeError):
+                estimate = None
+            if estimate is not None and estimate >= self.exact_count_threshold:
+                self._count = estimate
+                self._count_is_estimate = True
+        return super(EstimatedCountPaginator, self)._get_count()
+    count = property(_get_count)
+
+    def _get_count_is_estimate(self):
+        """
+        Returns True if count is an estimate.
+        """
+        self._get_count()
+        return self._count_is_estimate
+    count_is_estimate = property(_get_count_is_estimate)
+
+
+class KeysetPaginator(EstimatedCountPaginator):
+    """
+    A Paginator that fetches each page of a QuerySet by seeking past the
+    ordering key of the last row of the previous page, rather than with an
+    OFFSET, so that a page deep into a large table costs as much as the first.
+
+    The QuerySet's ordering must consist of non-null, non-relation fields of
+    the model and must identify each row uniquely, for instance by ending with
+    the primary key. Pages are fetched with seek() and the opaque cursors of
+    neighbouring pages; page() still returns numbered pages using OFFSET.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(KeysetPaginator, self).__init__(*args, **kwargs)
+        self._keys = None
+
+    def _get_keys(self):
+        """
+        Returns the [(field, descending)] that the object list is ordered by,
+        or None if the ordering can't be used to seek.
+        """
+        if self._keys is None:
+            self._keys = self._find_keys() or ()
+        return list(self._keys) or None
+    keys = property(_get_keys)
+
+    def _get_can_seek(self):
+        return self.keys is not None
+    can_seek = property(_get_can_seek)
+
+    def _find_keys(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.extra_order_by:
+            return None
+        opts = query.get_meta()
+        ordering = query.order_by or (opts.ordering if query.default_ordering else ())
+        keys, names = [], set()
+        for name in ordering:
+            if not isinstance(name, six.string_types) or name == '?':
+                return None
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if field.primary_key:
+                keys.append((field, descending != (not query.standard_ordering)))
+                return keys
+            if not field.concrete or field.null or field.is_relation:
+                return None
+            keys.append((field, descending != (not query.standard_ordering)))
+            names.add(field.name)
+            if field.unique or any(set(fields) <= names for fields in opts.unique_together):
+                return keys
+        return None
+
+    def get_cursor(self, obj, backwards=False):
+        """
+        Returns the cursor of the page after obj, or before it if backwards.
+        """
+        values = [field.value_to_string(obj) for field, descending in self.keys]
+        return force_text(urlsafe_base64_encode(force_bytes(json.dumps([int(backwards), values]))))
+
+    def decode_cursor(self, cursor):
+        """
+        Returns the (backwards, key values) encoded in the given cursor.
+        """
+        keys = self.keys
+        try:
+            backwards, values = json.loads(force_text(urlsafe_base64_decode(cursor)))
+            if len(values) != len(keys):
+                raise ValueError
+            values = [field.to_python(value) for (field, descending), value in zip(keys, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise InvalidCursor('That cursor is not valid')
+        return bool(backwards), values
+
+    def _seek_filter(self, values, backwards):
+        # (a, b) > (x, y) is written as a > x OR (a = x AND b > y), which
+        # allows each key to be ordered in either direction.
+        from django.db.models import Q
+        condition, equal = None, {}
+        for (field, descending), value in zip(self.keys, values):
+            name = 'pk' if field.primary_key else field.name
+            lookup = 'lt' if descending != backwards else 'gt'
+            clause = Q(**dict(equal, **{'%s__%s' % (name, lookup): value}))
+            condition = clause if condition is None else condition | clause
+            equal[name] = value
+        return condition
+
+    def seek(self, cursor=None):
+        """
+        Returns the page following the given cursor (preceding it, for the
+        previous_cursor of a page), or the first page if there is no cursor.
+        """
+        if not self.can_seek:
+            raise ValueError(
+                "KeysetPaginator can only seek on a QuerySet ordered by "
+                "non-null fields that identify each row uniquely.")
+        backwards, values = False, None
+        if cursor:
+            backwards, values = self.decode_cursor(cursor)
+        object_list = self.object_list
+        if values is not None:
+            object_list = object_list.filter(self._seek_filter(values, backwards))
+        if backwards:
+            object_list = object_list.reverse()
+        rows = list(object_list[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            if not has_more:
+                # Back at the start, where the first page may hold more rows
+                # than there are before the cursor.
+                return self.seek()
+            rows.reverse()
+            has_previous, has_next = True, True
+        else:
+            has_previous, has_next = values is not None, has_more
+        if not rows and (values is not None or not self.allow_empty_first_page):
+            raise EmptyPage('That page contains no results')
+        return KeysetPage(
+            self._get_page_queryset(rows), self,
+            next_cursor=self.get_cursor(rows[-1]) if has_next else None,
+            previous_cursor=self.get_cursor(rows[0], backwards=True) if has_previous else None)
+
+    def _get_page_queryset(self, rows):
+        # Return the page as an already evaluated QuerySet of the same rows,
+        # for callers that need a QuerySet (such as model formsets).
+        object_list = self.object_list.filter(pk__in=[row.pk for row in rows])
+        object_list._result_cache = rows
+        object_list._prefetch_done = True
+        return object_list
+
+
+class KeysetPage(collections.Sequence):
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<KeysetPage of %s objects>' % len(self)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        if not isinstance(index, (slice,) + six.integer_types):
+            raise TypeError
+        if not isinstance(self.object_list, list):
+            self.object_list = list(self.object_list)
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+
 class Page(collections.Sequence):
 
     def __init__(self, object_list, number, paginator):
@@ -6,6 +6,7 @@ from contextlib import contextmanager
 from django.conf import settings
 from django.db import DEFAULT_DB_ALIAS
 from django.db.backends import utils
+from django.db.backends.base.pool import get_pool
 from django.db.backends.signals import connection_created
 from django.db.transaction import TransactionManagementError
 from django.db.utils import DatabaseError, DatabaseErrorWrapper
@@ -66,11 +67,23 @@ class BaseDatabaseWrapper(object):
         self.close_at = None
         self.closed_in_transaction = False
         self.errors_occurred = False
+        # The pool the current connection was checked out from, if any.
+        self._pool = None
 
         # Thread-safety related attributes.
         self.allow_thread_sharing = allow_thread_sharing
         self._thread_ident = thread.get_ident()
 
+    @property
+    def pool(self):
+        """
+        The connection pool of this database if the POOL setting enables one,
+        otherwise None.
+        """
+        if not self.settings_dict['POOL']:
+            return None
+        return get_pool(self.alias, self.settings_dict)
+
     @property
     def queries_logged(self):
         return self.force_debug_cursor or settings.DEBUG
@@ -114,7 +127,20 @@ class BaseDatabaseWrapper(object):
         self.close_at = None if max_age is None else time.time() + max_age
         self.closed_in_transaction = False
         self.errors_occurred = False
-        # Establish the connection
+        pool = self.pool
+        if pool is None:
+            self.establish_connection()
+        else:
+            # Connections are only returned to the pool in their initial
+            # autocommit state, see close().
+            pool.checkout(self)
+            self._pool = pool
+            self.autocommit = self.settings_dict['AUTOCOMMIT']
+
+    def establish_connection(self):
+        """
+        Opens and initializes a new connection to the database.
+        """
         conn_params = self.get_connection_params()
         self.connection = self.get_new_connection(conn_params)
         self.set_autocommit(self.settings_dict['AUTOCOMMIT'])
@@ -158,11 +184,23 @@ class BaseDatabaseWrapper(object):
         Creates a cursor, opening a connection if necessary.
         """
         self.validate_thread_sharing()
+        return self._prepare_cursor(self._cursor())
+
+    def chunked_cursor(self):
+        """
+        Returns a cursor that reads the results of a query from the database
+        as they are fetched (a server-side cursor) if the database supports
+        that, otherwise a regular cursor. See QuerySet.iterator(chunk_size).
+        """
+        return self.cursor()
+
+    def _prepare_cursor(self, cursor):
+        """
+        Wraps a cursor in a logging or a regular CursorWrapper.
+        """
         if self.queries_logged:
-            cursor = self.make_debug_cursor(self._cursor())
-        else:
-            cursor = self.make_cursor(self._cursor())
-        return cursor
+            return self.make_debug_cursor(cursor)
+        return self.make_cursor(cursor)
 
     def commit(self):
         """
@@ -195,7 +233,10 @@ class BaseDatabaseWrapper(object):
         if self.closed_in_transaction or self.connection is None:
             return
         try:
-            self._close()
+            if self._pool is None:
+                self._close()
+            else:
+                self._release()
         finally:
             if self.in_atomic_block:
                 self.closed_in_transaction = True
@@ -203,6 +244,24 @@ class BaseDatabaseWrapper(object):
             else:
                 self.connection = None
 
+    def _release(self):
+        """
+        Returns the connection to the pool it was checked out from. It's
+        closed instead if it's in a transaction or in an unknown state.
+        """
+        pool, self._pool = self._pool, None
+        reusable = (
+            not self.in_atomic_block and
+            self.autocommit == self.settings_dict['AUTOCOMMIT'] and
+            not (self.errors_occurred and not self.is_usable())
+        )
+        if reusable and not self.autocommit:
+            try:
+                self._rollback()
+            except DatabaseError:
+                reusable = False
+        pool.release(self.connection, reusable)
+
     # ##### Backend-specific savepoint management methods #####
 
     def _savepoint(self, sid):
@@ -30,6 +30,23 @@ class BaseDatabaseFeatures(object):
     uses_savepoints = False
     can_release_savepoints = False
     can_combine_inserts_with_and_without_auto_increment_pk = False
+    # Can a multi-row INSERT return the primary keys of all the new rows
+    # (INSERT ... RETURNING)?
+    can_return_ids_from_bulk_insert = False
+    # Do the rows of a multi-row INSERT get consecutive primary keys, the last
+    # one being reported by last_insert_id()?
+    has_consecutive_bulk_insert_ids = False
+    # Can INSERT skip rows that violate a unique constraint
+    # (bulk_create(ignore_conflicts=True))?
+    supports_ignore_conflicts = False
+    # Can INSERT update the existing row on a unique constraint violation
+    # (bulk_create(update_conflicts=True))? And does that need the fields of
+    # the constraint to be named?
+    supports_update_conflicts = False
+    supports_update_conflicts_with_target = False
+    # Does the backend need the CASE expressions of bulk_update() cast to the
+    # column type, because it can't infer the type of the parameters?
+    requires_casted_case_in_updates = False
 
     # If True, don't use integer foreign keys referring to, e.g., positive
     # integer primary keys.
@@ -146,6 +146,21 @@ class BaseDatabaseOperations(object):
         """
         return None
 
+    def estimate_row_count(self, cursor, table_name):
+        """
+        Returns the number of rows in the given table according to the
+        database's statistics, without scanning it, or None if no estimate is
+        available.
+        """
+        return None
+
+    def estimate_query_row_count(self, cursor, sql, params):
+        """
+        Returns the query planner's estimate of the number of rows returned by
+        the given query, or None if the backend can't provide one.
+        """
+        return None
+
     def fetch_returned_insert_id(self, cursor):
         """
         Given a cursor object that has just performed an INSERT...RETURNING
@@ -154,6 +169,22 @@ class BaseDatabaseOperations(object):
         """
         return cursor.fetchone()[0]
 
+    def fetch_returned_insert_ids(self, cursor):
+        """
+        Given a cursor object that has just performed a bulk INSERT...RETURNING
+        statement into a table that has an auto-incrementing ID, returns the
+        list of newly created IDs.
+        """
+        return [row[0] for row in cursor.fetchall()]
+
+    def fetch_returned_insert_rows(self, cursor):
+        """
+        Given a cursor object that has just performed an INSERT...RETURNING
+        statement with several returned columns, returns a list of tuples of
+        the returned values, one per inserted row.
+        """
+        return [tuple(row) for row in cursor.fetchall()]
+
     def field_cast_sql(self, db_type, internal_type):
         """
         Given a column type (e.g. 'BLOB', 'VARCHAR'), and an internal type
@@ -209,6 +240,14 @@ class BaseDatabaseOperations(object):
 
         return six.text_type("QUERY = %r - PARAMS = %r") % (sql, u_params)
 
+    def insert_statement(self, on_conflict=None):
+        """
+        Returns the statement that starts an INSERT, e.g. 'INSERT INTO'.
+        on_conflict is one of the django.db.models.constants.OnConflict
+        values, or None.
+        """
+        return 'INSERT INTO'
+
     def last_insert_id(self, cursor, table_name, pk_name):
         """
         Given a cursor object that has just performed an INSERT statement into
@@ -248,6 +287,15 @@ class BaseDatabaseOperations(object):
         """
         raise NotImplementedError('subclasses of BaseDatabaseOperations may require a no_limit_value() method')
 
+    def on_conflict_suffix_sql(self, on_conflict, update_fields, unique_fields):
+        """
+        Returns the SQL that follows the VALUES of an INSERT to handle rows
+        that violate a unique constraint, or '' if none is needed.
+        update_fields are the fields to overwrite with the new values and
+        unique_fields the ones identifying the conflicting row.
+        """
+        return ''
+
     def pk_default_value(self):
         """
         Returns the value to use during an INSERT statement to specify that
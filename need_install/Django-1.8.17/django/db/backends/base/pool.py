@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+# Defaults for the keys of the POOL setting of a database.
+POOL_DEFAULTS = {
+    # Maximum number of open connections, idle or in use, per process.
+    'MAX_SIZE': 10,
+    # Seconds to wait for a connection when all of them are in use; None
+    # waits forever.
+    'TIMEOUT': 30,
+    # Seconds after which a connection is closed instead of being reused.
+    'MAX_LIFETIME': None,
+    # Seconds after which an idle connection is closed.
+    'MAX_IDLE': 600,
+    # Connections that have been idle for this many seconds are checked with
+    # is_usable() before being handed out; None disables the check.
+    'HEALTH_CHECK_INTERVAL': 30,
+}
+
+
+class PooledConnection(object):
+    def __init__(self, connection, created_at):
+        self.connection = connection
+        self.created_at = created_at
+        self.released_at = created_at
+
+
+class ConnectionPool(object):
+    """
+    A pool of open connections to one database, shared by the per-thread
+    DatabaseWrapper objects of its alias. A wrapper checks a connection out
+    when it connects and returns it when it's closed, so that connections are
+    opened and initialized once and then reused.
+    """
+
+    def __init__(self, alias, options=None):
+        self.alias = alias
+        options = dict(POOL_DEFAULTS, **(options or {}))
+        self.max_size = options['MAX_SIZE']
+        self.timeout = options['TIMEOUT']
+        self.max_lifetime = options['MAX_LIFETIME']
+        self.max_idle = options['MAX_IDLE']
+        self.health_check_interval = options['HEALTH_CHECK_INTERVAL']
+        if self.max_size < 1:
+            raise ValueError("The pool of database '%s' needs a MAX_SIZE of at least 1." % alias)
+        self.closed = False
+        # Open connections, idle or in use, including those being opened.
+        self._size = 0
+        self._idle = deque()
+        self._in_use = {}
+        self._condition = threading.Condition(threading.Lock())
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'failed_health_checks': 0,
+            'timeouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+        }
+
+    def _expired(self, entry, now):
+        return ((self.max_lifetime is not None and now - entry.created_at >= self.max_lifetime) or
+                (self.max_idle is not None and now - entry.released_at >= self.max_idle))
+
+    def _acquire(self):
+        """
+        Returns an idle connection, or None if the caller may open a new one,
+        and the connections that expired while idle, which the caller must
+        close.
+        """
+        started = time.time()
+        deadline = None if self.timeout is None else started + self.timeout
+        expired = []
+        waited = False
+        with self._condition:
+            while True:
+                if self.closed:
+                    raise OperationalError("The pool of database '%s' is closed." % self.alias)
+                now = time.time()
+                # The least recently used connections are at the left.
+                while self._idle and self._expired(self._idle[0], now):
+                    expired.append(self._idle.popleft())
+                    self._size -= 1
+                entry = self._idle.pop() if self._idle else None
+                if entry is not None or self._size < self.max_size:
+                    break
+                if deadline is not None and now >= deadline:
+                    self._stats['timeouts'] += 1
+                    raise OperationalError(
+                        "Timed out after %s seconds waiting for a connection to "
+                        "database '%s'; all %d are in use." % (self.timeout, self.alias, self.max_size))
+                waited = True
+                self._condition.wait(None if deadline is None else deadline - now)
+            if entry is None:
+                self._size += 1
+            self._stats['discarded'] += len(expired)
+            self._stats['checkouts'] += 1
+            if waited:
+                wait_time = time.time() - started
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += wait_time
+                self._stats['max_wait_time'] = max(self._stats['max_wait_time'], wait_time)
+        return entry, expired
+
+    def checkout(self, wrapper):
+        """
+        Sets wrapper.connection to an idle connection or, if there is none and
+        the pool isn't full, to a new one opened by
+        wrapper.establish_connection(). Otherwise, waits until a connection is
+        released, for up to timeout seconds.
+        """
+        while True:
+            entry, expired = self._acquire()
+            for stale in expired:
+                self._close(stale.connection)
+            if entry is None:
+                try:
+                    wrapper.establish_connection()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                entry = PooledConnection(wrapper.connection, time.time())
+                with self._condition:
+                    self._stats['created'] += 1
+                break
+            wrapper.connection = entry.connection
+            if (self.health_check_interval is None or
+                    time.time() - entry.released_at < self.health_check_interval or
+                    wrapper.is_usable()):
+                break
+            wrapper.connection = None
+            with self._condition:
+                self._size -= 1
+                self._stats['discarded'] += 1
+                self._stats['failed_health_checks'] += 1
+                self._condition.notify()
+            self._close(entry.connection)
+        with self._condition:
+            self._in_use[id(entry.connection)] = entry
+
+    def release(self, connection, reusable=True):
+        """
+        Returns a connection to the pool, or closes it if it can't be reused.
+        """
+        now = time.time()
+        with self._condition:
+            entry = self._in_use.pop(id(connection), None)
+            if entry is not None:
+                if (reusable and not self.closed and
+                        (self.max_lifetime is None or now - entry.created_at < self.max_lifetime)):
+                    entry.released_at = now
+                    self._idle.append(entry)
+                    self._condition.notify()
+                    return
+                self._size -= 1
+                self._stats['discarded'] += 1
+                self._condition.notify()
+        self._close(connection)
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            # The connection is being thrown away; it may well be broken.
+            pass
+
+    def close(self):
+        """
+        Closes the idle connections and those in use once they're released.
+        """
+        with self._condition:
+            self.closed = True
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for entry in idle:
+            self._close(entry.connection)
+
+    def stats(self):
+        """
+        Returns a dict of the pool's size and counters; wait_time is the total
+        number of seconds checkouts had to wait for a connection.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update(
+                max_size=self.max_size,
+                size=self._size,
+                idle=len(self._idle),
+                in_use=len(self._in_use),
+            )
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """
+    Returns the connection pool of the given database alias. The pool is
+    replaced if the connection settings changed, as they do when the test
+    database is set up, and isn't shared with forked processes.
+    """
+    key = (os.getpid(), repr([settings_dict.get(setting) for setting in (
+        'ENGINE', 'NAME', 'USER', 'PASSWORD', 'HOST', 'PORT', 'OPTIONS', 'POOL')]))
+    options = settings_dict['POOL']
+    with _pools_lock:
+        current = _pools.get(alias)
+        if current is not None and current[0] == key:
+            return current[1]
+        pool = ConnectionPool(alias, options if isinstance(options, dict) else None)
+        _pools[alias] = (key, pool)
+    if current is not None and current[0][0] == key[0]:
+        current[1].close()
+    return pool
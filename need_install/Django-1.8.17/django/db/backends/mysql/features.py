@@ -16,6 +16,8 @@ class DatabaseFeatures(BaseDatabaseFeatures):
     related_fields_match_type = True
     allow_sliced_subqueries = False
     has_bulk_insert = True
+    supports_ignore_conflicts = True
+    supports_update_conflicts = True
     has_select_for_update = True
     has_select_for_update_nowait = False
     supports_forward_references = False
@@ -4,6 +4,7 @@ import uuid
 
 from django.conf import settings
 from django.db.backends.base.operations import BaseDatabaseOperations
+from django.db.models.constants import OnConflict
 from django.utils import six, timezone
 from django.utils.encoding import force_text
 
@@ -85,6 +86,17 @@ class DatabaseOperations(BaseDatabaseOperations):
     def drop_foreignkey_sql(self):
         return "DROP FOREIGN KEY"
 
+    def estimate_row_count(self, cursor, table_name):
+        # TABLE_ROWS is exact for MyISAM and a statistics-based estimate for
+        # InnoDB.
+        cursor.execute(
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s", [table_name])
+        row = cursor.fetchone()
+        if row is None or row[0] is None:
+            return None
+        return int(row[0])
+
     def force_no_ordering(self):
         """
         "ORDER BY NULL" prevents MySQL from implicitly ordering by grouped
@@ -171,6 +183,20 @@ class DatabaseOperations(BaseDatabaseOperations):
         items_sql = "(%s)" % ", ".join(["%s"] * len(fields))
         return "VALUES " + ", ".join([items_sql] * num_values)
 
+    def insert_statement(self, on_conflict=None):
+        if on_conflict == OnConflict.IGNORE:
+            return 'INSERT IGNORE INTO'
+        return super(DatabaseOperations, self).insert_statement(on_conflict)
+
+    def on_conflict_suffix_sql(self, on_conflict, update_fields, unique_fields):
+        if on_conflict == OnConflict.UPDATE:
+            # MySQL matches on any unique key, it can't be given a target.
+            return 'ON DUPLICATE KEY UPDATE %s' % ', '.join(
+                '%s = VALUES(%s)' % (self.quote_name(f.column), self.quote_name(f.column))
+                for f in update_fields)
+        return super(DatabaseOperations, self).on_conflict_suffix_sql(
+            on_conflict, update_fields, unique_fields)
+
     def combine_expression(self, connector, sub_expressions):
         """
         MySQL requires special cases for ^ operators in query expressions
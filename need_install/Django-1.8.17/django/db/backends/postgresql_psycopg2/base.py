@@ -4,6 +4,7 @@ PostgreSQL database backend for Django.
 Requires psycopg 2: http://initd.org/projects/psycopg2
 """
 
+import threading
 import warnings
 
 from django.conf import settings
@@ -148,6 +149,7 @@ class DatabaseWrapper(BaseDatabaseWrapper):
         self.creation = DatabaseCreation(self)
         self.introspection = DatabaseIntrospection(self)
         self.validation = BaseDatabaseValidation(self)
+        self._named_cursor_idx = 0
 
     def get_connection_params(self):
         settings_dict = self.settings_dict
@@ -208,11 +210,29 @@ class DatabaseWrapper(BaseDatabaseWrapper):
             if not self.get_autocommit():
                 self.connection.commit()
 
-    def create_cursor(self):
-        cursor = self.connection.cursor()
+    def create_cursor(self, name=None):
+        if name:
+            # A named cursor is a server-side cursor: rows are sent as they are
+            # fetched. In autocommit mode it's used outside of a transaction,
+            # so it must be a holdable cursor.
+            cursor = self.connection.cursor(name, withhold=self.connection.autocommit)
+        else:
+            cursor = self.connection.cursor()
         cursor.tzinfo_factory = utc_tzinfo_factory if settings.USE_TZ else None
         return cursor
 
+    def chunked_cursor(self):
+        self.validate_thread_sharing()
+        self._named_cursor_idx += 1
+        self.ensure_connection()
+        with self.wrap_database_errors:
+            cursor = self.create_cursor(name='_django_curs_%d_%d' % (
+                # Avoid reusing a name in other threads.
+                threading.current_thread().ident,
+                self._named_cursor_idx,
+            ))
+        return self._prepare_cursor(cursor)
+
     def _set_autocommit(self, autocommit):
         with self.wrap_database_errors:
             self.connection.autocommit = autocommit
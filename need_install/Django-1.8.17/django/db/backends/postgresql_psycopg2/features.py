@@ -1,10 +1,12 @@
 from django.db.backends.base.features import BaseDatabaseFeatures
 from django.db.utils import InterfaceError
+from django.utils.functional import cached_property
 
 
 class DatabaseFeatures(BaseDatabaseFeatures):
     needs_datetime_string_cast = False
     can_return_id_from_insert = True
+    can_return_ids_from_bulk_insert = True
     has_real_datatype = True
     has_native_uuid_field = True
     has_native_duration_field = True
@@ -27,3 +29,21 @@ class DatabaseFeatures(BaseDatabaseFeatures):
     closed_cursor_error_class = InterfaceError
     has_case_insensitive_like = False
     requires_sqlparse_for_splitting = False
+    requires_casted_case_in_updates = True
+
+    @cached_property
+    def is_postgresql_9_5(self):
+        return self.connection.pg_version >= 90500
+
+    @cached_property
+    def supports_ignore_conflicts(self):
+        # INSERT ... ON CONFLICT was added in PostgreSQL 9.5.
+        return self.is_postgresql_9_5
+
+    @cached_property
+    def supports_update_conflicts(self):
+        return self.is_postgresql_9_5
+
+    @cached_property
+    def supports_update_conflicts_with_target(self):
+        return self.is_postgresql_9_5
@@ -1,9 +1,12 @@
 from __future__ import unicode_literals
 
+import json
+
 from psycopg2.extras import Inet
 
 from django.conf import settings
 from django.db.backends.base.operations import BaseDatabaseOperations
+from django.db.models.constants import OnConflict
 
 
 class DatabaseOperations(BaseDatabaseOperations):
@@ -76,6 +79,23 @@ class DatabaseOperations(BaseDatabaseOperations):
 
         return lookup
 
+    def estimate_row_count(self, cursor, table_name):
+        # reltuples is maintained by VACUUM, ANALYZE and CREATE INDEX; it's -1
+        # (0 before PostgreSQL 14) for tables that have never been analyzed.
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                       [self.quote_name(table_name)])
+        row = cursor.fetchone()
+        if row is None or row[0] <= 0:
+            return None
+        return int(row[0])
+
+    def estimate_query_row_count(self, cursor, sql, params):
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+        if not isinstance(plan, list):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
     def last_insert_id(self, cursor, table_name, pk_name):
         # Use pg_get_serial_sequence to get the underlying sequence name
         # from the table name and column name (available since PostgreSQL 8)
@@ -225,6 +245,19 @@ class DatabaseOperations(BaseDatabaseOperations):
         items_sql = "(%s)" % ", ".join(["%s"] * len(fields))
         return "VALUES " + ", ".join([items_sql] * num_values)
 
+    def on_conflict_suffix_sql(self, on_conflict, update_fields, unique_fields):
+        if on_conflict == OnConflict.IGNORE:
+            return 'ON CONFLICT DO NOTHING'
+        if on_conflict == OnConflict.UPDATE:
+            return 'ON CONFLICT(%s) DO UPDATE SET %s' % (
+                ', '.join(self.quote_name(f.column) for f in unique_fields),
+                ', '.join('%s = EXCLUDED.%s' % (
+                    self.quote_name(f.column), self.quote_name(f.column))
+                    for f in update_fields),
+            )
+        return super(DatabaseOperations, self).on_conflict_suffix_sql(
+            on_conflict, update_fields, unique_fields)
+
     def value_to_db_date(self, value):
         return value
 
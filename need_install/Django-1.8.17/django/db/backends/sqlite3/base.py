@@ -217,6 +217,13 @@ class DatabaseWrapper(BaseDatabaseWrapper):
     def create_cursor(self):
         return self.connection.cursor(factory=SQLiteCursorWrapper)
 
+    @property
+    def pool(self):
+        # In-memory databases are never closed, see close().
+        if self.is_in_memory_db(self.settings_dict['NAME']):
+            return None
+        return super(DatabaseWrapper, self).pool
+
     def close(self):
         self.validate_thread_sharing()
         # If database is in memory, closing the connection destroys the
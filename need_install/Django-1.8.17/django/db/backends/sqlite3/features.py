@@ -18,7 +18,8 @@ class DatabaseFeatures(BaseDatabaseFeatures):
     # SQLite cannot handle us only partially reading from a cursor's result set
     # and then writing the same rows to the database in another cursor. This
     # setting ensures we always read result sets fully into memory all in one
-    # go.
+    # go, unless QuerySet.iterator(chunk_size) explicitly asks for the rows to
+    # be streamed from the cursor.
     can_use_chunked_reads = False
     test_db_allows_multiple_connections = False
     supports_unspecified_pk = True
@@ -27,6 +28,10 @@ class DatabaseFeatures(BaseDatabaseFeatures):
     supports_mixed_date_datetime_comparisons = False
     has_bulk_insert = True
     can_combine_inserts_with_and_without_auto_increment_pk = False
+    # SQLite writes are serialized, so the rows of one INSERT get consecutive
+    # rowids ending at last_insert_rowid().
+    has_consecutive_bulk_insert_ids = True
+    supports_ignore_conflicts = True
     supports_foreign_keys = False
     supports_column_check_constraints = False
     autocommits_when_autocommit_is_off = True
@@ -47,6 +52,18 @@ class DatabaseFeatures(BaseDatabaseFeatures):
     def can_release_savepoints(self):
         return self.uses_savepoints
 
+    @cached_property
+    def can_return_ids_from_bulk_insert(self):
+        return Database.sqlite_version_info >= (3, 35, 0)
+
+    @cached_property
+    def supports_update_conflicts(self):
+        return Database.sqlite_version_info >= (3, 24, 0)
+
+    @cached_property
+    def supports_update_conflicts_with_target(self):
+        return self.supports_update_conflicts
+
     @cached_property
     def can_share_in_memory_db(self):
         return (
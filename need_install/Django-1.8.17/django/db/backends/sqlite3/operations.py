@@ -9,10 +9,12 @@ from django.db import utils
 from django.db.backends import utils as backend_utils
 from django.db.backends.base.operations import BaseDatabaseOperations
 from django.db.models import aggregates, fields
+from django.db.models.constants import OnConflict
 from django.utils import six, timezone
 from django.utils.dateparse import parse_date, parse_time
 from django.utils.duration import duration_string
 
+from .base import Database
 from .utils import parse_datetime_with_timezone_support
 
 try:
@@ -91,6 +93,18 @@ class DatabaseOperations(BaseDatabaseOperations):
     def drop_foreignkey_sql(self):
         return ""
 
+    def estimate_row_count(self, cursor, table_name):
+        # sqlite_stat1 is created and filled by ANALYZE. The first number of
+        # each row's stat column is the number of rows in the table (or in
+        # the index, which is smaller for partial indexes).
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if cursor.fetchone() is None:
+            return None
+        cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table_name])
+        counts = [int(row[0].split()[0]) for row in cursor.fetchall() if row[0]]
+        return max(counts) if counts else None
+
     def pk_default_value(self):
         return "NULL"
 
@@ -177,6 +191,11 @@ class DatabaseOperations(BaseDatabaseOperations):
         return value
 
     def bulk_insert_sql(self, fields, num_values):
+        if Database.sqlite_version_info >= (3, 7, 11):
+            # Multi-row VALUES; unlike INSERT ... SELECT it can be followed by
+            # an ON CONFLICT clause.
+            items_sql = "(%s)" % ", ".join(["%s"] * len(fields))
+            return "VALUES " + ", ".join([items_sql] * num_values)
         res = []
         res.append("SELECT %s" % ", ".join(
             "%%s AS %s" % self.quote_name(f.column) for f in fields
@@ -184,6 +203,27 @@ class DatabaseOperations(BaseDatabaseOperations):
         res.extend(["UNION ALL SELECT %s" % ", ".join(["%s"] * len(fields))] * (num_values - 1))
         return " ".join(res)
 
+    def return_insert_id(self):
+        # Only used for bulk inserts (can_return_ids_from_bulk_insert); a
+        # single INSERT reads last_insert_rowid() instead.
+        return "RETURNING %s", ()
+
+    def insert_statement(self, on_conflict=None):
+        if on_conflict == OnConflict.IGNORE:
+            return 'INSERT OR IGNORE INTO'
+        return super(DatabaseOperations, self).insert_statement(on_conflict)
+
+    def on_conflict_suffix_sql(self, on_conflict, update_fields, unique_fields):
+        if on_conflict == OnConflict.UPDATE:
+            return 'ON CONFLICT(%s) DO UPDATE SET %s' % (
+                ', '.join(self.quote_name(f.column) for f in unique_fields),
+                ', '.join('%s = EXCLUDED.%s' % (
+                    self.quote_name(f.column), self.quote_name(f.column))
+                    for f in update_fields),
+            )
+        return super(DatabaseOperations, self).on_conflict_suffix_sql(
+            on_conflict, update_fields, unique_fields)
+
     def combine_expression(self, connector, sub_expressions):
         # SQLite doesn't have a power function, so we fake it with a
         # user-defined function django_power that's registered in connect().
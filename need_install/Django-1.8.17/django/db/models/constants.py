@@ -4,3 +4,12 @@ Constants used across the ORM in general.
 
 # Separator used to split filter strings apart.
 LOOKUP_SEP = '__'
+
+
+class OnConflict(object):
+    """
+    What an INSERT does when a row would violate a unique constraint
+    (see QuerySet.bulk_create()).
+    """
+    IGNORE = 'ignore'
+    UPDATE = 'update'
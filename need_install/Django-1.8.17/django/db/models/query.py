@@ -10,18 +10,20 @@ from collections import OrderedDict, deque
 from django.conf import settings
 from django.core import exceptions
 from django.db import (
-    DJANGO_VERSION_PICKLE_KEY, IntegrityError, connections, router,
-    transaction,
+    DJANGO_VERSION_PICKLE_KEY, IntegrityError, NotSupportedError, connections,
+    router, transaction,
 )
 from django.db.models import sql
-from django.db.models.constants import LOOKUP_SEP
+from django.db.models.constants import LOOKUP_SEP, OnConflict
 from django.db.models.deletion import Collector
-from django.db.models.expressions import Date, DateTime, F
+from django.db.models.expressions import Case, Date, DateTime, F, Func, Value, When
 from django.db.models.fields import AutoField, Empty
 from django.db.models.query_utils import (
     InvalidQuery, Q, deferred_class_factory,
 )
-from django.db.models.sql.constants import CURSOR
+from django.db.models.sql.constants import (
+    CURSOR, GET_ITERATOR_CHUNK_SIZE, MULTI,
+)
 from django.utils import six, timezone
 from django.utils.functional import partition
 from django.utils.version import get_version
@@ -226,16 +228,33 @@ class QuerySet(object):
     # METHODS THAT DO DATABASE QUERIES #
     ####################################
 
-    def iterator(self):
+    def _chunked_fetch_options(self, chunk_size):
+        """
+        Returns the (chunked_fetch, chunk_size) arguments for results_iter()
+        for iterator(chunk_size).
+        """
+        if chunk_size is None:
+            return False, GET_ITERATOR_CHUNK_SIZE
+        if chunk_size <= 0:
+            raise ValueError('Chunk size must be strictly positive.')
+        chunked_fetch = not connections[self.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS')
+        return chunked_fetch, chunk_size
+
+    def iterator(self, chunk_size=None):
         """
         An iterator over the results from applying this QuerySet to the
         database.
+
+        With chunk_size, rows are fetched from the database chunk_size at a
+        time, using a server-side cursor where the database supports one, so
+        that the results are never held in memory as a whole.
         """
+        chunked_fetch, chunk_size = self._chunked_fetch_options(chunk_size)
         db = self.db
         compiler = self.query.get_compiler(using=db)
         # Execute the query. This will also fill compiler.select, klass_info,
         # and annotations.
-        results = compiler.execute_sql()
+        results = compiler.execute_sql(MULTI, chunked_fetch, chunk_size)
         select, klass_info, annotation_col_map = (compiler.select, compiler.klass_info,
                                                   compiler.annotation_col_map)
         if klass_info is None:
@@ -317,6 +336,17 @@ class QuerySet(object):
 
         return self.query.get_count(using=self.db)
 
+    def estimated_count(self):
+        """
+        Returns the database's estimate of the number of records, taken from
+        its statistics or query planner instead of a SELECT COUNT(), or None
+        if the database can't provide one.
+        """
+        if self._result_cache is not None:
+            return len(self._result_cache)
+
+        return self.query.get_estimated_count(using=self.db)
+
     def get(self, *args, **kwargs):
         """
         Performs the query and returns a single object matching the given
@@ -353,46 +383,174 @@ class QuerySet(object):
             if obj.pk is None:
                 obj.pk = obj._meta.pk.get_pk_value_on_save(obj)
 
-    def bulk_create(self, objs, batch_size=None):
+    def _check_bulk_create_options(self, ignore_conflicts, update_conflicts,
+                                   update_fields, unique_fields):
+        """
+        Validates the conflict handling options of bulk_create() and returns
+        the matching OnConflict value (None for a plain INSERT) along with the
+        update and unique fields resolved to model fields.
+        """
+        if ignore_conflicts and update_conflicts:
+            raise ValueError(
+                "ignore_conflicts and update_conflicts are mutually exclusive.")
+        features = connections[self.db].features
+        if ignore_conflicts:
+            if not features.supports_ignore_conflicts:
+                raise NotSupportedError(
+                    "This database backend does not support ignoring conflicts.")
+            return OnConflict.IGNORE, [], []
+        if not update_conflicts:
+            return None, [], []
+        if not features.supports_update_conflicts:
+            raise NotSupportedError(
+                "This database backend does not support updating conflicts.")
+        if not update_fields:
+            raise ValueError(
+                "Fields that will be updated when a row insertion fails on "
+                "conflicts must be provided.")
+        if unique_fields and not features.supports_update_conflicts_with_target:
+            raise NotSupportedError(
+                "This database backend does not support updating conflicts "
+                "with specifying unique fields that can trigger the upsert.")
+        if not unique_fields and features.supports_update_conflicts_with_target:
+            raise ValueError(
+                "Unique fields that can trigger the upsert must be provided.")
+        opts = self.model._meta
+        update_fields = [opts.get_field(name) for name in update_fields]
+        if any(not f.concrete or f.many_to_many for f in update_fields):
+            raise ValueError(
+                "bulk_create() can only be used with concrete fields in "
+                "update_fields.")
+        if any(f.primary_key for f in update_fields):
+            raise ValueError(
+                "bulk_create() cannot be used with primary keys in "
+                "update_fields.")
+        unique_fields = [opts.pk if name == 'pk' else opts.get_field(name)
+                         for name in unique_fields or ()]
+        if any(not f.concrete or f.many_to_many for f in unique_fields):
+            raise ValueError(
+                "bulk_create() can only be used with concrete fields in "
+                "unique_fields.")
+        return OnConflict.UPDATE, update_fields, unique_fields
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False,
+                    update_conflicts=False, update_fields=None, unique_fields=None):
         """
         Inserts each of the instances into the database. This does *not* call
-        save() on each of the instances, does not send any pre/post save
-        signals, and does not set the primary key attribute if it is an
-        autoincrement field.
-        """
-        # So this case is fun. When you bulk insert you don't get the primary
-        # keys back (if it's an autoincrement), so you can't insert into the
-        # child tables which references this. There are two workarounds, 1)
-        # this could be implemented if you didn't have an autoincrement pk,
-        # and 2) you could do it by doing O(n) normal inserts into the parent
-        # tables to get the primary keys back, and then doing a single bulk
-        # insert into the childmost table. Some databases might allow doing
-        # this by using RETURNING clause for the insert query. We're punting
-        # on these for now because they are relatively rare cases.
+        save() on each of the instances and does not send any pre/post save
+        signals. When the database can report them, the primary keys of new
+        rows are set on the instances, as save() does.
+
+        With ignore_conflicts, rows that would violate a unique constraint are
+        skipped. With update_conflicts, the update_fields of the existing row
+        are overwritten instead ("upsert"); unique_fields name the constraint
+        to match on.
+        """
+        # Inserting into the parent tables of a multi-table inheritance child
+        # would need the parents' primary keys back before the child rows can
+        # be inserted, one batch per table. We're punting on this for now
+        # because it's a relatively rare case.
         assert batch_size is None or batch_size > 0
         if self.model._meta.parents:
             raise ValueError("Can't bulk create an inherited model")
         if not objs:
             return objs
         self._for_write = True
+        on_conflict, update_fields, unique_fields = self._check_bulk_create_options(
+            ignore_conflicts, update_conflicts, update_fields, unique_fields)
         connection = connections[self.db]
         fields = self.model._meta.local_concrete_fields
         objs = list(objs)
         self._populate_pk_values(objs)
+        options = dict(on_conflict=on_conflict, update_fields=update_fields,
+                       unique_fields=unique_fields)
         with transaction.atomic(using=self.db, savepoint=False):
             if (connection.features.can_combine_inserts_with_and_without_auto_increment_pk
                     and self.model._meta.has_auto_field):
-                self._batched_insert(objs, fields, batch_size)
+                self._batched_insert(objs, fields, batch_size, **options)
             else:
                 objs_with_pk, objs_without_pk = partition(lambda o: o.pk is None, objs)
                 if objs_with_pk:
-                    self._batched_insert(objs_with_pk, fields, batch_size)
+                    ids = self._batched_insert(
+                        objs_with_pk, fields, batch_size,
+                        return_ids=on_conflict == OnConflict.IGNORE, **options)
+                    if on_conflict != OnConflict.IGNORE:
+                        self._set_saved(objs_with_pk)
+                    elif ids:
+                        # Only the objects whose rows were inserted are saved.
+                        self._set_saved([obj for obj, pk in zip(objs_with_pk, ids)
+                                         if pk is not None])
                 if objs_without_pk:
                     fields = [f for f in fields if not isinstance(f, AutoField)]
-                    self._batched_insert(objs_without_pk, fields, batch_size)
+                    ids = self._batched_insert(objs_without_pk, fields, batch_size,
+                                               return_ids=True, **options)
+                    if ids:
+                        inserted = [(obj, pk) for obj, pk in zip(objs_without_pk, ids)
+                                    if pk is not None]
+                        for obj, pk in inserted:
+                            obj.pk = pk
+                        self._set_saved([obj for obj, pk in inserted])
 
         return objs
 
+    def _set_saved(self, objs):
+        for obj in objs:
+            obj._state.adding = False
+            obj._state.db = self.db
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        """
+        Updates the given fields of each of the given instances in the
+        database, with one UPDATE per batch of objects:
+
+            UPDATE ... SET f = CASE WHEN pk = 1 THEN ... WHEN pk = 2 THEN ... END
+            WHERE pk IN (1, 2)
+
+        Like update(), this doesn't call save() or send any signals. Returns
+        the number of rows matched.
+        """
+        assert batch_size is None or batch_size > 0
+        if not fields:
+            raise ValueError("Field names must be given to bulk_update().")
+        objs = tuple(objs)
+        if any(obj.pk is None for obj in objs):
+            raise ValueError("All bulk_update() objects must have a primary key set.")
+        opts = self.model._meta
+        fields = [opts.get_field(name) for name in fields]
+        if any(not f.concrete or f.many_to_many for f in fields):
+            raise ValueError("bulk_update() can only be used with concrete fields.")
+        if any(f.primary_key for f in fields):
+            raise ValueError("bulk_update() cannot be used with primary key fields.")
+        if not objs:
+            return 0
+        self._for_write = True
+        connection = connections[self.db]
+        # Every object adds its pk to the WHERE clause and a
+        # "WHEN pk = %s THEN %s" pair to the CASE of each field.
+        batch_fields = [opts.pk] + [f for field in fields for f in (opts.pk, field)]
+        max_batch_size = max(connection.ops.bulk_batch_size(batch_fields, objs), 1)
+        batch_size = min(batch_size, max_batch_size) if batch_size else max_batch_size
+        rows = 0
+        with transaction.atomic(using=self.db, savepoint=False):
+            for i in range(0, len(objs), batch_size):
+                batch = objs[i:i + batch_size]
+                update_kwargs = {}
+                for field in fields:
+                    cases = []
+                    for obj in batch:
+                        value = getattr(obj, field.attname)
+                        if not hasattr(value, 'resolve_expression'):
+                            value = Value(value, output_field=field)
+                        cases.append(When(pk=obj.pk, then=value))
+                    case = Case(*cases, output_field=field)
+                    if connection.features.requires_casted_case_in_updates:
+                        case = Func(case, template='CAST(%(expressions)s AS %(db_type)s)',
+                                    db_type=field.db_type(connection), output_field=field)
+                    update_kwargs[field.attname] = case
+                rows += self.filter(pk__in=[obj.pk for obj in batch]).update(**update_kwargs)
+        return rows
+    bulk_update.alters_data = True
+
     def get_or_create(self, defaults=None, **kwargs):
         """
         Looks up an object with the given kwargs, creating one if necessary.
@@ -907,7 +1065,9 @@ class QuerySet(object):
     # PRIVATE METHODS #
     ###################
 
-    def _insert(self, objs, fields, return_id=False, raw=False, using=None):
+    def _insert(self, objs, fields, return_id=False, raw=False, using=None,
+                return_ids=False, on_conflict=None, update_fields=None,
+                unique_fields=None, returning_fields=None):
         """
         Inserts a new record for the given model. This provides an interface to
         the InsertQuery class and is how Model.save() is implemented.
@@ -915,26 +1075,91 @@ class QuerySet(object):
         self._for_write = True
         if using is None:
             using = self.db
-        query = sql.InsertQuery(self.model)
+        query = sql.InsertQuery(self.model, on_conflict=on_conflict,
+                                update_fields=update_fields,
+                                unique_fields=unique_fields,
+                                returning_fields=returning_fields)
         query.insert_values(fields, objs, raw=raw)
-        return query.get_compiler(using=using).execute_sql(return_id)
+        return query.get_compiler(using=using).execute_sql(return_id, return_ids)
     _insert.alters_data = True
     _insert.queryset_only = False
 
-    def _batched_insert(self, objs, fields, batch_size):
+    def _batched_insert(self, objs, fields, batch_size, return_ids=False,
+                        on_conflict=None, update_fields=None, unique_fields=None):
         """
         A little helper method for bulk_insert to insert the bulk one batch
         at a time. Inserts recursively a batch from the front of the bulk and
         then _batched_insert() the remaining objects again.
+
+        With return_ids, returns the primary keys of the inserted rows in the
+        order of objs, or None when the database can't report them. With
+        ignore_conflicts, the objects whose rows were skipped get None.
         """
         if not objs:
             return
-        ops = connections[self.db].ops
+        connection = connections[self.db]
+        ops, features = connection.ops, connection.features
         batch_size = (batch_size or max(ops.bulk_batch_size(fields, objs), 1))
+        key_fields = None
+        if on_conflict == OnConflict.IGNORE:
+            # Skipped rows have no id, so the inserted rows are matched back
+            # to the objects by a unique key returned alongside the id.
+            if return_ids and features.can_return_ids_from_bulk_insert:
+                key_fields = self._insert_key_fields(fields)
+            return_ids = key_fields is not None
+        else:
+            return_ids = return_ids and (
+                features.can_return_ids_from_bulk_insert or
+                (features.has_consecutive_bulk_insert_ids and on_conflict is None))
+        pk = self.model._meta.pk
+        returning_fields = key_fields and [pk] + [f for f in key_fields if f is not pk]
+        inserted_ids = []
         for batch in [objs[i:i + batch_size]
                       for i in range(0, len(objs), batch_size)]:
-            self.model._base_manager._insert(batch, fields=fields,
-                                             using=self.db)
+            ids = self.model._base_manager._insert(
+                batch, fields=fields, using=self.db, return_ids=return_ids,
+                on_conflict=on_conflict, update_fields=update_fields,
+                unique_fields=unique_fields, returning_fields=returning_fields)
+            if key_fields:
+                ids = self._match_inserted_rows(batch, key_fields, returning_fields, ids)
+            if return_ids:
+                inserted_ids.extend(ids)
+        return inserted_ids if return_ids else None
+
+    def _insert_key_fields(self, fields):
+        """
+        Returns the fields of all the unique keys of the model that are
+        entirely among the inserted fields and can't be NULL, or None if there
+        are none. A row can be skipped because of any of them, so an inserted
+        row is only identified by all of them together.
+        """
+        opts = self.model._meta
+        keys = [[f] for f in fields if f.unique and not f.null]
+        keys.extend([opts.get_field(name) for name in names]
+                    for names in opts.unique_together)
+        key_fields = []
+        for key in keys:
+            if all(f in fields and not f.null for f in key):
+                key_fields.extend(f for f in key if f not in key_fields)
+        return key_fields or None
+
+    def _match_inserted_rows(self, objs, key_fields, returning_fields, rows):
+        """
+        Lines up the rows returned by an INSERT ... RETURNING that skipped
+        conflicting rows with objs: returns the primary key of each object
+        whose row was inserted, None for the others. Of several objects with
+        the same key values, only the first one can have been inserted.
+        """
+        positions = [returning_fields.index(f) for f in key_fields]
+        pending = {}
+        for index, obj in enumerate(objs):
+            key = tuple(f.to_python(getattr(obj, f.attname)) for f in key_fields)
+            pending.setdefault(key, []).append(index)
+        ids = [None] * len(objs)
+        for row in rows:
+            key = tuple(f.to_python(row[i]) for f, i in zip(key_fields, positions))
+            ids[pending[key].pop(0)] = row[0]
+        return ids
 
     def _clone(self, klass=None, setup=False, **kwargs):
         base_queryset_class = getattr(self, '_base_queryset_class', self.__class__)
@@ -1074,7 +1299,8 @@ class ValuesQuerySet(QuerySet):
     def defer(self, *fields):
         raise NotImplementedError("ValuesQuerySet does not implement defer()")
 
-    def iterator(self):
+    def iterator(self, chunk_size=None):
+        chunked_fetch, chunk_size = self._chunked_fetch_options(chunk_size)
         # Purge any extra columns that haven't been explicitly asked for
         extra_names = list(self.query.extra_select)
         field_names = self.field_names
@@ -1082,7 +1308,8 @@ class ValuesQuerySet(QuerySet):
 
         names = extra_names + field_names + annotation_names
 
-        for row in self.query.get_compiler(self.db).results_iter():
+        for row in self.query.get_compiler(self.db).results_iter(
+                chunked_fetch=chunked_fetch, chunk_size=chunk_size):
             yield dict(zip(names, row))
 
     def delete(self):
@@ -1211,13 +1438,15 @@ class ValuesQuerySet(QuerySet):
 
 
 class ValuesListQuerySet(ValuesQuerySet):
-    def iterator(self):
+    def iterator(self, chunk_size=None):
+        chunked_fetch, chunk_size = self._chunked_fetch_options(chunk_size)
         compiler = self.query.get_compiler(self.db)
+        rows = compiler.results_iter(chunked_fetch=chunked_fetch, chunk_size=chunk_size)
         if self.flat and len(self._fields) == 1:
-            for row in compiler.results_iter():
+            for row in rows:
                 yield row[0]
         elif not self.query.extra_select and not self.query.annotation_select:
-            for row in compiler.results_iter():
+            for row in rows:
                 yield tuple(row)
         else:
             # When extra(select=...) or an annotation is involved, the extra
@@ -1236,7 +1465,7 @@ class ValuesListQuerySet(ValuesQuerySet):
             else:
                 fields = names
 
-            for row in compiler.results_iter():
+            for row in rows:
                 data = dict(zip(names, row))
                 yield tuple(data[f] for f in fields)
 
@@ -785,13 +785,14 @@ class SQLCompiler(object):
             row[pos] = value
         return tuple(row)
 
-    def results_iter(self, results=None):
+    def results_iter(self, results=None, chunked_fetch=False,
+                     chunk_size=GET_ITERATOR_CHUNK_SIZE):
         """
         Returns an iterator over the results from executing this query.
         """
         converters = None
         if results is None:
-            results = self.execute_sql(MULTI)
+            results = self.execute_sql(MULTI, chunked_fetch, chunk_size)
         fields = [s[0] for s in self.select[0:self.col_count]]
         converters = self.get_converters(fields)
         for rows in results:
@@ -810,7 +811,8 @@ class SQLCompiler(object):
         self.query.set_extra_mask(['a'])
         return bool(self.execute_sql(SINGLE))
 
-    def execute_sql(self, result_type=MULTI):
+    def execute_sql(self, result_type=MULTI, chunked_fetch=False,
+                    chunk_size=GET_ITERATOR_CHUNK_SIZE):
         """
         Run the query against the database and returns the result(s). The
         return value is a single data item if result_type is SINGLE, or an
@@ -822,6 +824,10 @@ class SQLCompiler(object):
         subclasses such as InsertQuery). It's possible, however, that no query
         is needed, as the filters describe an empty set. In that case, None is
         returned, to avoid any unnecessary database interaction.
+
+        With chunked_fetch, a MULTI result is read chunk_size rows at a time
+        from the connection's chunked_cursor() (a server-side cursor where the
+        database has one) and is never read into memory as a whole.
         """
         if not result_type:
             result_type = NO_RESULTS
@@ -835,7 +841,10 @@ class SQLCompiler(object):
             else:
                 return
 
-        cursor = self.connection.cursor()
+        if chunked_fetch:
+            cursor = self.connection.chunked_cursor()
+        else:
+            cursor = self.connection.cursor()
         try:
             cursor.execute(sql, params)
         except Exception:
@@ -861,9 +870,11 @@ class SQLCompiler(object):
 
         result = cursor_iter(
             cursor, self.connection.features.empty_fetchmany_value,
-            self.col_count
+            self.col_count, chunk_size
         )
-        if not self.connection.features.can_use_chunked_reads:
+        # A chunked fetch was asked for explicitly (QuerySet.iterator()), so
+        # it's up to the caller not to write to the rows being read.
+        if not chunked_fetch and not self.connection.features.can_use_chunked_reads:
             try:
                 # If we are using non-chunked reads, we return the same data
                 # structure as normally, but ensure it is all read into memory
@@ -895,6 +906,7 @@ class SQLInsertCompiler(SQLCompiler):
 
     def __init__(self, *args, **kwargs):
         self.return_id = False
+        self.return_ids = False
         super(SQLInsertCompiler, self).__init__(*args, **kwargs)
 
     def placeholder(self, field, val):
@@ -914,7 +926,9 @@ class SQLInsertCompiler(SQLCompiler):
         # going to be column names (so we can avoid the extra overhead).
         qn = self.connection.ops.quote_name
         opts = self.query.get_meta()
-        result = ['INSERT INTO %s' % qn(opts.db_table)]
+        insert_statement = self.connection.ops.insert_statement(
+            on_conflict=self.query.on_conflict)
+        result = ['%s %s' % (insert_statement, qn(opts.db_table))]
 
         has_fields = bool(self.query.fields)
         fields = self.query.fields if has_fields else [opts.pk]
@@ -946,30 +960,61 @@ class SQLInsertCompiler(SQLCompiler):
             ]
             # Oracle Spatial needs to remove some values due to #10888
             params = self.connection.ops.modify_insert_params(placeholders, params)
-        if self.return_id and self.connection.features.can_return_id_from_insert:
-            params = params[0]
-            col = "%s.%s" % (qn(opts.db_table), qn(opts.pk.column))
-            result.append("VALUES (%s)" % ", ".join(placeholders[0]))
+        on_conflict_suffix_sql = self.connection.ops.on_conflict_suffix_sql(
+            self.query.on_conflict, self.query.update_fields, self.query.unique_fields)
+        # The RETURNING clause, when the ids are read back from the INSERT
+        # itself rather than from the cursor afterwards.
+        r_sql, r_params = '', ()
+        if ((self.return_id and self.connection.features.can_return_id_from_insert) or
+                (self.return_ids and self.connection.features.can_return_ids_from_bulk_insert)):
+            col = ", ".join(
+                "%s.%s" % (qn(opts.db_table), qn(f.column))
+                for f in (self.return_ids and self.query.returning_fields or [opts.pk]))
             r_fmt, r_params = self.connection.ops.return_insert_id()
             # Skip empty r_fmt to allow subclasses to customize behavior for
             # 3rd party backends. Refs #19096.
             if r_fmt:
-                result.append(r_fmt % col)
+                r_sql = r_fmt % col
+            else:
+                r_params = ()
+        if self.return_id and self.connection.features.can_return_id_from_insert:
+            params = params[0]
+            result.append("VALUES (%s)" % ", ".join(placeholders[0]))
+            if on_conflict_suffix_sql:
+                result.append(on_conflict_suffix_sql)
+            if r_sql:
+                result.append(r_sql)
                 params += r_params
             return [(" ".join(result), tuple(params))]
         if can_bulk:
             result.append(self.connection.ops.bulk_insert_sql(fields, len(values)))
-            return [(" ".join(result), tuple(v for val in values for v in val))]
+            if on_conflict_suffix_sql:
+                result.append(on_conflict_suffix_sql)
+            if r_sql:
+                result.append(r_sql)
+            return [(" ".join(result), tuple(v for val in values for v in val) + tuple(r_params))]
         else:
+            suffix = [s for s in (on_conflict_suffix_sql, r_sql) if s]
             return [
-                (" ".join(result + ["VALUES (%s)" % ", ".join(p)]), vals)
+                (" ".join(result + ["VALUES (%s)" % ", ".join(p)] + suffix),
+                 tuple(vals) + tuple(r_params))
                 for p, vals in zip(placeholders, params)
             ]
 
-    def execute_sql(self, return_id=False):
+    def execute_sql(self, return_id=False, return_ids=False):
+        """
+        Run the INSERT. With return_id (a single object) the new primary key
+        is returned; with return_ids the primary keys of all the objects are
+        returned as a list, in the order of self.query.objs. If the query has
+        returning_fields, return_ids returns a tuple of their values for each
+        row actually inserted instead, in no particular order.
+        """
         assert not (return_id and len(self.query.objs) != 1)
         self.return_id = return_id
+        self.return_ids = return_ids
         with self.connection.cursor() as cursor:
+            if return_ids:
+                return self._execute_returning_ids(cursor)
             for sql, params in self.as_sql():
                 cursor.execute(sql, params)
             if not (return_id and cursor):
@@ -979,6 +1024,34 @@ class SQLInsertCompiler(SQLCompiler):
             return self.connection.ops.last_insert_id(cursor,
                     self.query.get_meta().db_table, self.query.get_meta().pk.column)
 
+    def _execute_returning_ids(self, cursor):
+        features = self.connection.features
+        if not (features.can_return_ids_from_bulk_insert or
+                (features.has_consecutive_bulk_insert_ids and
+                 self.query.on_conflict is None and
+                 not self.query.returning_fields)):
+            raise ValueError(
+                "This database backend can't return the primary keys of a "
+                "bulk insert.")
+        statements = self.as_sql()
+        # Either one statement for the whole batch or one per object.
+        rows = len(self.query.objs) if len(statements) == 1 else 1
+        ids = []
+        for sql, params in statements:
+            cursor.execute(sql, params)
+            if self.query.returning_fields:
+                ids.extend(self.connection.ops.fetch_returned_insert_rows(cursor))
+            elif features.can_return_ids_from_bulk_insert:
+                ids.extend(self.connection.ops.fetch_returned_insert_ids(cursor))
+            else:
+                # The rows of a single INSERT get consecutive ids, the last
+                # of which is reported by the cursor.
+                last_id = self.connection.ops.last_insert_id(
+                    cursor, self.query.get_meta().db_table,
+                    self.query.get_meta().pk.column)
+                ids.extend(range(last_id - rows + 1, last_id + 1))
+        return ids
+
 
 class SQLDeleteCompiler(SQLCompiler):
     def as_sql(self):
@@ -1142,13 +1215,13 @@ class SQLAggregateCompiler(SQLCompiler):
         return sql, params
 
 
-def cursor_iter(cursor, sentinel, col_count):
+def cursor_iter(cursor, sentinel, col_count, itersize=GET_ITERATOR_CHUNK_SIZE):
     """
     Yields blocks of rows from a cursor and ensures the cursor is closed when
     done.
     """
     try:
-        for rows in iter((lambda: cursor.fetchmany(GET_ITERATOR_CHUNK_SIZE)),
+        for rows in iter((lambda: cursor.fetchmany(itersize)),
                          sentinel):
             yield [r[0:col_count] for r in rows]
     finally:
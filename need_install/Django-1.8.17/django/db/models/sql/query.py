@@ -468,6 +468,28 @@ class Query(object):
             number = 0
         return number
 
+    def get_estimated_count(self, using):
+        """
+        Returns the database's estimate of the number of rows matched by the
+        query, without counting them, or None if no estimate is available.
+        Unfiltered queries use the table statistics, others the query planner.
+        """
+        obj = self.clone()
+        obj.clear_ordering(True)
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            if (not obj.has_filters() and not obj.distinct and obj.group_by is None and
+                    not obj.low_mark and obj.high_mark is None):
+                estimate = connection.ops.estimate_row_count(
+                    cursor, obj.get_meta().db_table)
+                if estimate is not None:
+                    return estimate
+            try:
+                sql, params = obj.get_compiler(using).as_sql()
+            except EmptyResultSet:
+                return 0
+            return connection.ops.estimate_query_row_count(cursor, sql, params)
+
     def has_filters(self):
         return self.where or self.having
 
@@ -171,6 +171,12 @@ class InsertQuery(Query):
     compiler = 'SQLInsertCompiler'
 
     def __init__(self, *args, **kwargs):
+        self.on_conflict = kwargs.pop('on_conflict', None)
+        self.update_fields = kwargs.pop('update_fields', None) or []
+        self.unique_fields = kwargs.pop('unique_fields', None) or []
+        # The columns to return for each inserted row instead of just its
+        # primary key (needs can_return_ids_from_bulk_insert).
+        self.returning_fields = kwargs.pop('returning_fields', None) or []
         super(InsertQuery, self).__init__(*args, **kwargs)
         self.fields = []
         self.objs = []
@@ -180,6 +186,10 @@ class InsertQuery(Query):
             'fields': self.fields[:],
             'objs': self.objs[:],
             'raw': self.raw,
+            'on_conflict': self.on_conflict,
+            'update_fields': self.update_fields[:],
+            'unique_fields': self.unique_fields[:],
+            'returning_fields': self.returning_fields[:],
         }
         extras.update(kwargs)
         return super(InsertQuery, self).clone(klass, **extras)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator
+from django.core.paginator import KeysetPaginator, Paginator
 
 from .models import Child, Event, Parent, Swallow
 
@@ -43,6 +43,10 @@ class CustomPaginationAdmin(ChildAdmin):
     paginator = CustomPaginator
 
 
+class KeysetPaginationChildAdmin(ChildAdmin):
+    paginator = KeysetPaginator
+
+
 class FilteredChildAdmin(admin.ModelAdmin):
     list_display = ['name', 'parent']
     list_per_page = 10
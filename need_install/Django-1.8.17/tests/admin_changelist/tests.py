@@ -6,11 +6,14 @@ from django.contrib import admin
 from django.contrib.admin.options import IncorrectLookupParameters
 from django.contrib.admin.templatetags.admin_list import pagination
 from django.contrib.admin.tests import AdminSeleniumWebDriverTestCase
-from django.contrib.admin.views.main import ALL_VAR, SEARCH_VAR, ChangeList
+from django.contrib.admin.views.main import (
+    ALL_VAR, CURSOR_VAR, SEARCH_VAR, ChangeList,
+)
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.template import Context, Template
-from django.test import TestCase, override_settings
+from django.test import TestCase, mock, override_settings
 from django.test.client import RequestFactory
 from django.utils import formats, six
 
@@ -19,8 +22,8 @@ from .admin import (
     CustomPaginator, DynamicListDisplayChildAdmin,
     DynamicListDisplayLinksChildAdmin, DynamicListFilterChildAdmin,
     DynamicSearchFieldsChildAdmin, FilteredChildAdmin, GroupAdmin,
-    InvitationAdmin, NoListDisplayLinksParentAdmin, ParentAdmin, QuartetAdmin,
-    SwallowAdmin, site as custom_site,
+    InvitationAdmin, KeysetPaginationChildAdmin, NoListDisplayLinksParentAdmin,
+    ParentAdmin, QuartetAdmin, SwallowAdmin, site as custom_site,
 )
 from .models import (
     Band, Child, ChordsBand, ChordsMusician, CustomIdUser, Event, Genre, Group,
@@ -651,6 +654,80 @@ class ChangeListTests(TestCase):
                 list(real_page_range),
             )
 
+    def get_keyset_changelist(self, data=None):
+        m = KeysetPaginationChildAdmin(Child, admin.site)
+        request = self.factory.get('/child/', data=data or {})
+        return ChangeList(request, Child, m.list_display, m.list_display_links,
+                m.list_filter, m.date_hierarchy, m.search_fields,
+                m.list_select_related, m.list_per_page, m.list_max_show_all,
+                m.list_editable, m)
+
+    def test_keyset_pagination(self):
+        parent = Parent.objects.create(name='parent')
+        children = [Child.objects.create(name='name %s' % i, parent=parent) for i in range(25)]
+        children.reverse()
+
+        cl = self.get_keyset_changelist()
+        self.assertEqual(list(cl.result_list), children[:10])
+        context = pagination(cl)
+        self.assertTrue(context['keyset_pagination'])
+        self.assertEqual(context['page_range'], [])
+        self.assertIsNone(context['previous_url'])
+        self.assertIn(CURSOR_VAR + '=', context['next_url'])
+
+        cl = self.get_keyset_changelist({CURSOR_VAR: cl.keyset_page.next_cursor})
+        self.assertEqual(list(cl.result_list), children[10:20])
+        cl = self.get_keyset_changelist({CURSOR_VAR: cl.keyset_page.next_cursor})
+        self.assertEqual(list(cl.result_list), children[20:])
+        context = pagination(cl)
+        self.assertIsNone(context['next_url'])
+        self.assertEqual(context['first_url'], '?')
+
+        cl = self.get_keyset_changelist({CURSOR_VAR: cl.keyset_page.previous_cursor})
+        self.assertEqual(list(cl.result_list), children[10:20])
+
+        # Ordering by a non-null column seeks on it and the primary key.
+        cl = self.get_keyset_changelist({'o': '0'})
+        self.assertIsNotNone(cl.keyset_page)
+        self.assertEqual([c.name for c in cl.result_list],
+                         sorted(c.name for c in children)[:10])
+
+    def test_keyset_pagination_fallback(self):
+        """
+        Orderings that can't be seeked on fall back to numbered pages.
+        """
+        parent = Parent.objects.create(name='parent')
+        for i in range(25):
+            Child.objects.create(name='name %s' % i, parent=parent)
+        cl = self.get_keyset_changelist({'o': '1', 'p': '2'})
+        self.assertIsNone(cl.keyset_page)
+        self.assertEqual(len(cl.result_list), 5)
+        self.assertEqual(list(pagination(cl)['page_range']), [0, 1, 2])
+
+    def test_keyset_pagination_invalid_cursor(self):
+        Child.objects.create(name='name')
+        self.assertRaises(IncorrectLookupParameters, self.get_keyset_changelist, {CURSOR_VAR: 'x'})
+
+    def test_estimated_result_count(self):
+        parent = Parent.objects.create(name='parent')
+        for i in range(15):
+            Child.objects.create(name='name %s' % i, parent=parent, age=i % 2)
+        with mock.patch.object(connection.ops, 'estimate_row_count', return_value=20000):
+            cl = self.get_keyset_changelist()
+            self.assertEqual(cl.result_count, 20000)
+            self.assertTrue(cl.result_count_is_estimate)
+            template = Template('{% load admin_list %}{% pagination cl %}')
+            self.assertIn('about 20000 childs', template.render(Context({'cl': cl})))
+
+            # Filtered querysets aren't estimated on every backend, but the
+            # unfiltered total is.
+            with mock.patch.object(connection.ops, 'estimate_query_row_count', return_value=None):
+                cl = self.get_keyset_changelist({'age': '1'})
+            self.assertEqual(cl.result_count, 7)
+            self.assertFalse(cl.result_count_is_estimate)
+            self.assertEqual(cl.full_result_count, 20000)
+            self.assertTrue(cl.full_result_count_is_estimate)
+
 
 class AdminLogNodeTestCase(TestCase):
 
@@ -4,8 +4,11 @@ from __future__ import unicode_literals
 
 import copy
 import datetime
+import os
 import re
+import tempfile
 import threading
+import time
 import unittest
 import warnings
 from decimal import Decimal, Rounded
@@ -23,7 +26,7 @@ from django.db.backends.signals import connection_created
 from django.db.backends.utils import CursorWrapper, format_number
 from django.db.models import Avg, StdDev, Sum, Variance
 from django.db.models.sql.constants import CURSOR
-from django.db.utils import ConnectionHandler
+from django.db.utils import ConnectionHandler, OperationalError
 from django.test import (
     TestCase, TransactionTestCase, mock, override_settings, skipIfDBFeature,
     skipUnlessDBFeature,
@@ -1311,3 +1314,162 @@ class TestSqliteThreadSharing(TransactionTestCase):
         thread.join()
 
         self.assertEqual(models.Object.objects.count(), 2)
+
+
+class ConnectionPoolTests(TransactionTestCase):
+    available_apps = []
+
+    def setUp(self):
+        self.wrapper_class = connections[DEFAULT_DB_ALIAS].__class__
+        self.settings_dict = connection.settings_dict.copy()
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db(self.settings_dict['NAME']):
+            tmp = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+            tmp.close()
+            self.addCleanup(os.remove, tmp.name)
+            self.settings_dict['NAME'] = tmp.name
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.close()
+
+    def get_connection(self, alias='pool', **options):
+        settings_dict = dict(self.settings_dict, POOL=options or True)
+        conn = self.wrapper_class(settings_dict, alias=alias)
+        if conn.pool not in self.pools:
+            self.pools.append(conn.pool)
+        return conn
+
+    def test_pool_disabled(self):
+        self.assertIsNone(self.wrapper_class(self.settings_dict).pool)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite specific test.')
+    def test_sqlite_in_memory_db_isnt_pooled(self):
+        settings_dict = dict(self.settings_dict, NAME=':memory:', POOL=True)
+        self.assertIsNone(self.wrapper_class(settings_dict).pool)
+
+    def test_connection_reused(self):
+        created = []
+
+        def receiver(sender, connection, **kwargs):
+            created.append(connection)
+
+        conn = self.get_connection()
+        connection_created.connect(receiver)
+        try:
+            conn.ensure_connection()
+            raw = conn.connection
+            conn.close()
+            self.assertIsNone(conn.connection)
+            other = self.get_connection()
+            other.ensure_connection()
+            self.assertIs(other.connection, raw)
+            other.cursor().execute('SELECT 1')
+            other.close()
+        finally:
+            connection_created.disconnect(receiver)
+        self.assertEqual(created, [conn])
+        stats = conn.pool.stats()
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_pool_replaced_when_settings_change(self):
+        pool = self.get_connection().pool
+        self.assertIs(self.get_connection().pool, pool)
+        other = self.get_connection(MAX_SIZE=2).pool
+        self.assertIsNot(other, pool)
+        self.assertTrue(pool.closed)
+        self.assertEqual(other.max_size, 2)
+
+    def test_wait_for_connection(self):
+        conn = self.get_connection(MAX_SIZE=1)
+        conn.ensure_connection()
+        raw = conn.connection
+        checked_out = threading.Event()
+        results = []
+
+        def runner():
+            other = self.get_connection(MAX_SIZE=1)
+            checked_out.set()
+            other.ensure_connection()
+            results.append(other.connection)
+            other.close()
+
+        thread = threading.Thread(target=runner)
+        thread.start()
+        checked_out.wait()
+        time.sleep(0.05)
+        self.assertEqual(results, [])
+        conn.close()
+        thread.join()
+        self.assertEqual(results, [raw])
+        stats = conn.pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_time'], 0)
+
+    def test_timeout(self):
+        conn = self.get_connection(MAX_SIZE=1, TIMEOUT=0.01)
+        conn.ensure_connection()
+        other = self.get_connection(MAX_SIZE=1, TIMEOUT=0.01)
+        with self.assertRaises(OperationalError):
+            other.ensure_connection()
+        self.assertIsNone(other.connection)
+        self.assertEqual(conn.pool.stats()['timeouts'], 1)
+        conn.close()
+        # The pool wasn't left in a broken state.
+        other.ensure_connection()
+        other.close()
+
+    def test_failed_health_check(self):
+        conn = self.get_connection(HEALTH_CHECK_INTERVAL=0)
+        conn.ensure_connection()
+        raw = conn.connection
+        conn.close()
+        with mock.patch.object(self.wrapper_class, 'is_usable', return_value=False):
+            conn.ensure_connection()
+        self.assertIsNot(conn.connection, raw)
+        conn.close()
+        stats = conn.pool.stats()
+        self.assertEqual(stats['failed_health_checks'], 1)
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['size'], 1)
+
+    def test_autocommit_changed(self):
+        conn = self.get_connection()
+        conn.set_autocommit(False)
+        raw = conn.connection
+        conn.close()
+        conn.ensure_connection()
+        self.assertIsNot(conn.connection, raw)
+        self.assertTrue(conn.get_autocommit())
+        conn.close()
+        self.assertEqual(conn.pool.stats()['discarded'], 1)
+
+    def test_closed_in_atomic_block(self):
+        conn = self.get_connection()
+        connections['pool'] = conn
+        self.addCleanup(delattr, connections._connections, 'pool')
+        with transaction.atomic(using='pool'):
+            conn.ensure_connection()
+            conn.close()
+            self.assertTrue(conn.closed_in_transaction)
+        self.assertIsNone(conn.connection)
+        stats = conn.pool.stats()
+        self.assertEqual(stats['discarded'], 1)
+        self.assertEqual(stats['size'], 0)
+
+    def test_max_lifetime(self):
+        conn = self.get_connection(MAX_LIFETIME=0)
+        conn.ensure_connection()
+        raw = conn.connection
+        conn.close()
+        conn.ensure_connection()
+        self.assertIsNot(conn.connection, raw)
+        conn.close()
+        stats = conn.pool.stats()
+        self.assertEqual(stats['discarded'], 2)
+        self.assertEqual(stats['size'], 0)
@@ -599,6 +599,7 @@ class ManagerTest(TestCase):
     QUERYSET_PROXY_METHODS = [
         'none',
         'count',
+        'estimated_count',
         'dates',
         'datetimes',
         'distinct',
@@ -608,6 +609,7 @@ class ManagerTest(TestCase):
         'update_or_create',
         'create',
         'bulk_create',
+        'bulk_update',
         'filter',
         'aggregate',
         'annotate',
@@ -2,12 +2,14 @@ from __future__ import unicode_literals
 
 from operator import attrgetter
 
-from django.db import connection
+from django.db import IntegrityError, NotSupportedError, connection
 from django.test import (
     TestCase, override_settings, skipIfDBFeature, skipUnlessDBFeature,
 )
 
-from .models import Country, Pizzeria, Restaurant, State, TwoFields
+from .models import (
+    Country, Pizzeria, Restaurant, State, TwoFields, UpsertConflict,
+)
 
 
 class BulkCreateTests(TestCase):
@@ -165,3 +167,160 @@ class BulkCreateTests(TestCase):
         TwoFields.objects.all().delete()
         with self.assertNumQueries(1):
             TwoFields.objects.bulk_create(objs, len(objs))
+
+    def _ids_feature(self):
+        return (connection.features.can_return_ids_from_bulk_insert or
+                connection.features.has_consecutive_bulk_insert_ids)
+
+    def test_set_pk_and_state(self):
+        if not self._ids_feature():
+            self.skipTest("Database can't return bulk insert ids.")
+        countries = Country.objects.bulk_create(self.data)
+        for country in countries:
+            self.assertIsNotNone(country.pk)
+            self.assertFalse(country._state.adding)
+            self.assertEqual(country._state.db, 'default')
+        self.assertEqual(
+            [c.pk for c in countries],
+            list(Country.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(
+            Country.objects.get(pk=countries[2].pk).name, "Germany")
+
+    def test_set_pk_large_batch(self):
+        if not self._ids_feature():
+            self.skipTest("Database can't return bulk insert ids.")
+        objs = TwoFields.objects.bulk_create([
+            TwoFields(f1=i, f2=i + 1) for i in range(0, 1001)
+        ])
+        self.assertEqual(
+            dict((o.pk, o.f1) for o in objs),
+            dict(TwoFields.objects.values_list('pk', 'f1')))
+
+    def test_set_pk_mixed(self):
+        if not self._ids_feature():
+            self.skipTest("Database can't return bulk insert ids.")
+        objs = TwoFields.objects.bulk_create([
+            TwoFields(id=i if i % 2 == 0 else None, f1=i, f2=i + 1)
+            for i in range(100000, 100010)])
+        self.assertEqual(
+            dict((o.pk, o.f1) for o in objs),
+            dict(TwoFields.objects.values_list('pk', 'f1')))
+
+    def test_set_pk_efficiency(self):
+        if not self._ids_feature():
+            self.skipTest("Database can't return bulk insert ids.")
+        with self.assertNumQueries(1):
+            Country.objects.bulk_create(self.data)
+
+    def test_conflict_options_mutually_exclusive(self):
+        with self.assertRaises(ValueError):
+            UpsertConflict.objects.bulk_create(
+                [UpsertConflict(number=1, rank=1, name='a')],
+                ignore_conflicts=True, update_conflicts=True,
+                update_fields=['name'], unique_fields=['number'])
+
+    @skipIfDBFeature('supports_ignore_conflicts')
+    def test_ignore_conflicts_not_supported(self):
+        with self.assertRaises(NotSupportedError):
+            TwoFields.objects.bulk_create([TwoFields(f1=1, f2=1)], ignore_conflicts=True)
+
+    @skipUnlessDBFeature('supports_ignore_conflicts')
+    def test_ignore_conflicts(self):
+        TwoFields.objects.bulk_create([TwoFields(f1=1, f2=1), TwoFields(f1=2, f2=2)])
+        objs = [TwoFields(f1=2, f2=2), TwoFields(f1=3, f2=3), TwoFields(f1=3, f2=4)]
+        with self.assertNumQueries(1):
+            TwoFields.objects.bulk_create(objs, ignore_conflicts=True)
+        self.assertEqual(
+            sorted(TwoFields.objects.values_list('f1', 'f2')),
+            [(1, 1), (2, 2), (3, 3)])
+        if connection.features.can_return_ids_from_bulk_insert:
+            # Only the object whose row was inserted gets its pk.
+            self.assertEqual([obj.pk for obj in objs],
+                             [None, TwoFields.objects.get(f1=3).pk, None])
+            self.assertEqual([obj._state.adding for obj in objs], [True, False, True])
+        else:
+            # Whether a row was inserted isn't known, so the pks aren't set.
+            for obj in objs:
+                self.assertIsNone(obj.pk)
+                self.assertTrue(obj._state.adding)
+        # Without ignore_conflicts the duplicates still fail.
+        with self.assertRaises(IntegrityError):
+            TwoFields.objects.bulk_create([TwoFields(f1=1, f2=1)])
+
+    @skipUnlessDBFeature('supports_ignore_conflicts', 'can_return_ids_from_bulk_insert')
+    def test_ignore_conflicts_matches_all_unique_keys(self):
+        TwoFields.objects.create(f1=1, f2=1)
+        # The first object conflicts on f2 only; the second one, with the
+        # same f1, is inserted and must not be mistaken for the first.
+        objs = [TwoFields(f1=5, f2=1), TwoFields(f1=5, f2=9)]
+        TwoFields.objects.bulk_create(objs, ignore_conflicts=True)
+        self.assertIsNone(objs[0].pk)
+        self.assertEqual(objs[1].pk, TwoFields.objects.get(f1=5).pk)
+
+    @skipUnlessDBFeature('supports_ignore_conflicts', 'can_return_ids_from_bulk_insert')
+    def test_ignore_conflicts_with_pk(self):
+        State.objects.create(two_letter_code='CA')
+        objs = [State(two_letter_code='CA'), State(two_letter_code='NY')]
+        State.objects.bulk_create(objs, ignore_conflicts=True)
+        self.assertEqual([obj._state.adding for obj in objs], [True, False])
+
+    @skipUnlessDBFeature('supports_update_conflicts')
+    def test_update_conflicts_requires_update_fields(self):
+        with self.assertRaises(ValueError):
+            UpsertConflict.objects.bulk_create(
+                [UpsertConflict(number=1, rank=1, name='a')],
+                update_conflicts=True, unique_fields=['number'])
+
+    @skipUnlessDBFeature('supports_update_conflicts')
+    def test_update_conflicts_invalid_update_fields(self):
+        with self.assertRaises(ValueError):
+            UpsertConflict.objects.bulk_create(
+                [UpsertConflict(number=1, rank=1, name='a')],
+                update_conflicts=True, update_fields=['id'],
+                unique_fields=['number'])
+
+    @skipUnlessDBFeature('supports_update_conflicts_with_target')
+    def test_update_conflicts_requires_unique_fields(self):
+        with self.assertRaises(ValueError):
+            UpsertConflict.objects.bulk_create(
+                [UpsertConflict(number=1, rank=1, name='a')],
+                update_conflicts=True, update_fields=['name'])
+
+    @skipIfDBFeature('supports_update_conflicts')
+    def test_update_conflicts_not_supported(self):
+        with self.assertRaises(NotSupportedError):
+            UpsertConflict.objects.bulk_create(
+                [UpsertConflict(number=1, rank=1, name='a')],
+                update_conflicts=True, update_fields=['name'],
+                unique_fields=['number'])
+
+    @skipUnlessDBFeature('supports_update_conflicts', 'supports_update_conflicts_with_target')
+    def test_update_conflicts(self):
+        UpsertConflict.objects.bulk_create([
+            UpsertConflict(number=1, rank=1, name='John'),
+            UpsertConflict(number=2, rank=2, name='Mary'),
+        ])
+        with self.assertNumQueries(1):
+            UpsertConflict.objects.bulk_create([
+                UpsertConflict(number=1, rank=4, name='Steve'),
+                UpsertConflict(number=2, rank=2, name='Olivia'),
+                UpsertConflict(number=3, rank=1, name='Hannah'),
+            ], update_conflicts=True, update_fields=['name', 'rank'],
+                unique_fields=['number'])
+        self.assertEqual(
+            list(UpsertConflict.objects.order_by('number').values_list(
+                'number', 'rank', 'name')),
+            [(1, 4, 'Steve'), (2, 2, 'Olivia'), (3, 1, 'Hannah')])
+
+    @skipUnlessDBFeature('supports_update_conflicts', 'supports_update_conflicts_with_target',
+                         'can_return_ids_from_bulk_insert')
+    def test_update_conflicts_set_pk(self):
+        existing = UpsertConflict.objects.create(number=1, rank=1, name='John')
+        objs = UpsertConflict.objects.bulk_create([
+            UpsertConflict(number=2, rank=2, name='Mary'),
+            UpsertConflict(number=1, rank=3, name='Steve'),
+        ], update_conflicts=True, update_fields=['name', 'rank'],
+            unique_fields=['number'])
+        self.assertEqual(objs[1].pk, existing.pk)
+        self.assertEqual(UpsertConflict.objects.get(pk=objs[0].pk).name, 'Mary')
+
@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class Note(models.Model):
+    note = models.CharField(max_length=100)
+    misc = models.CharField(max_length=10)
+    tag = models.ForeignKey('Tag', on_delete=models.SET_NULL, null=True)
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=10)
+
+
+class CustomPk(models.Model):
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.IntegerField(null=True)
+
+
+class Reading(models.Model):
+    value = models.FloatField(null=True)
+    day = models.DateField(null=True)
+    count = models.IntegerField(default=0)
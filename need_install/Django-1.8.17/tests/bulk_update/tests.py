@@ -0,0 +1,121 @@
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase
+
+from .models import CustomPk, Note, Reading, Tag
+
+
+class BulkUpdateTests(TestCase):
+    def setUp(self):
+        self.notes = [Note.objects.create(note=str(i), misc=str(i)) for i in range(10)]
+
+    def test_simple(self):
+        for note in self.notes:
+            note.note = 'test-%s' % note.id
+        with self.assertNumQueries(1):
+            Note.objects.bulk_update(self.notes, ['note'])
+        self.assertEqual(
+            sorted(Note.objects.values_list('note', flat=True)),
+            sorted('test-%s' % note.id for note in self.notes))
+
+    def test_multiple_fields(self):
+        for note in self.notes:
+            note.note = 'test-%s' % note.id
+            note.misc = 'misc-%s' % note.id
+        with self.assertNumQueries(1):
+            Note.objects.bulk_update(self.notes, ['note', 'misc'])
+        self.assertEqual(
+            sorted(Note.objects.values_list('note', 'misc')),
+            sorted(('test-%s' % n.id, 'misc-%s' % n.id) for n in self.notes))
+
+    def test_only_given_fields(self):
+        for note in self.notes:
+            note.note = 'changed'
+            note.misc = 'changed'
+        Note.objects.bulk_update(self.notes, ['note'])
+        self.assertFalse(Note.objects.filter(misc='changed').exists())
+
+    def test_batch_size(self):
+        with self.assertNumQueries(len(self.notes)):
+            Note.objects.bulk_update(self.notes, ['note'], batch_size=1)
+
+    def test_batch_size_capped_by_backend(self):
+        readings = Reading.objects.bulk_create([Reading(count=i) for i in range(1200)])
+        readings = list(Reading.objects.order_by('pk'))
+        for reading in readings:
+            reading.count += 1
+            reading.value = reading.count / 2.0
+        fields = [Reading._meta.pk] + [Reading._meta.pk, Reading._meta.get_field('count'),
+                                        Reading._meta.pk, Reading._meta.get_field('value')]
+        max_batch_size = connection.ops.bulk_batch_size(fields, readings)
+        batches = -(-len(readings) // max_batch_size)
+        with self.assertNumQueries(batches):
+            rows = Reading.objects.bulk_update(readings, ['count', 'value'], batch_size=10000)
+        self.assertEqual(rows, 1200)
+        self.assertEqual(
+            list(Reading.objects.order_by('pk').values_list('count', flat=True)),
+            list(range(1, 1201)))
+
+    def test_returns_rows_matched(self):
+        self.assertEqual(Note.objects.bulk_update(self.notes, ['note']), 10)
+        self.assertEqual(Note.objects.filter(pk__lte=self.notes[4].pk).bulk_update(
+            self.notes, ['note']), 5)
+
+    def test_empty_objects(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(Note.objects.bulk_update([], ['note']), 0)
+
+    def test_no_fields(self):
+        with self.assertRaises(ValueError):
+            Note.objects.bulk_update(self.notes, [])
+
+    def test_unsaved_objects(self):
+        with self.assertRaises(ValueError):
+            Note.objects.bulk_update(self.notes + [Note(note='x')], ['note'])
+
+    def test_primary_key_field(self):
+        with self.assertRaises(ValueError):
+            Note.objects.bulk_update(self.notes, ['id'])
+
+    def test_custom_pk(self):
+        objs = [CustomPk.objects.create(name='pk-%s' % i) for i in range(5)]
+        for i, obj in enumerate(objs):
+            obj.value = i * 10
+        CustomPk.objects.bulk_update(objs, ['value'])
+        self.assertEqual(
+            sorted(CustomPk.objects.values_list('name', 'value')),
+            [('pk-%s' % i, i * 10) for i in range(5)])
+
+    def test_foreign_key(self):
+        tags = [Tag.objects.create(name=str(i)) for i in range(len(self.notes))]
+        for note, tag in zip(self.notes, tags):
+            note.tag = tag
+        Note.objects.bulk_update(self.notes, ['tag'])
+        self.assertEqual(
+            sorted(Note.objects.values_list('pk', 'tag')),
+            sorted((note.pk, tag.pk) for note, tag in zip(self.notes, tags)))
+
+    def test_nulls_and_dates(self):
+        readings = [Reading.objects.create(value=1.5, day=datetime.date(2017, 1, 1))
+                    for i in range(3)]
+        readings[0].value = None
+        readings[1].day = datetime.date(2017, 3, 2)
+        readings[2].day = None
+        Reading.objects.bulk_update(readings, ['value', 'day'])
+        self.assertEqual(
+            list(Reading.objects.order_by('pk').values_list('value', 'day')),
+            [(None, datetime.date(2017, 1, 1)), (1.5, datetime.date(2017, 3, 2)),
+             (1.5, None)])
+
+    def test_expressions(self):
+        readings = [Reading.objects.create(count=i) for i in range(3)]
+        for reading in readings:
+            reading.count = F('count') + 10
+        Reading.objects.bulk_update(readings, ['count'])
+        self.assertEqual(
+            list(Reading.objects.order_by('pk').values_list('count', flat=True)),
+            [10, 11, 12])
@@ -0,0 +1,137 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from django.db import connection
+from django.db.models.sql.compiler import cursor_iter
+from django.db.models.sql.constants import GET_ITERATOR_CHUNK_SIZE
+from django.test import TestCase, mock
+
+from .models import Article
+
+
+class QuerySetIteratorTests(TestCase):
+    itersize_index_in_mock_args = 3
+
+    def setUp(self):
+        Article.objects.bulk_create([
+            Article(name='Article %s' % i, position=i) for i in range(7)
+        ])
+
+    def spy_fetchmany(self):
+        """
+        Patches connection.chunked_cursor() to record the sizes passed to
+        fetchmany() on the cursors it returns.
+        """
+        calls = []
+        chunked_cursor = connection.chunked_cursor
+
+        def spy():
+            cursor = chunked_cursor()
+            fetchmany = cursor.fetchmany
+
+            def spy_fetchmany(size):
+                calls.append(size)
+                return fetchmany(size)
+            cursor.fetchmany = spy_fetchmany
+            return cursor
+        return calls, mock.patch.object(connection, 'chunked_cursor', spy)
+
+    def test_iterator_invalid_chunk_size(self):
+        for size in (0, -1):
+            with self.assertRaisesMessage(ValueError, 'Chunk size must be strictly positive.'):
+                next(Article.objects.iterator(chunk_size=size))
+
+    def test_default_iterator_chunk_size(self):
+        qs = Article.objects.iterator()
+        with mock.patch('django.db.models.sql.compiler.cursor_iter',
+                        side_effect=cursor_iter) as cursor_iter_mock, \
+                mock.patch.object(connection, 'chunked_cursor') as chunked_cursor_mock:
+            next(qs)
+        self.assertEqual(cursor_iter_mock.call_count, 1)
+        mock_args, _mock_kwargs = cursor_iter_mock.call_args
+        self.assertEqual(mock_args[self.itersize_index_in_mock_args], GET_ITERATOR_CHUNK_SIZE)
+        self.assertFalse(chunked_cursor_mock.called)
+
+    def test_iterator_chunk_size(self):
+        qs = Article.objects.iterator(chunk_size=3)
+        with mock.patch('django.db.models.sql.compiler.cursor_iter',
+                        side_effect=cursor_iter) as cursor_iter_mock:
+            next(qs)
+        self.assertEqual(cursor_iter_mock.call_count, 1)
+        mock_args, _mock_kwargs = cursor_iter_mock.call_args
+        self.assertEqual(mock_args[self.itersize_index_in_mock_args], 3)
+
+    def test_chunked_fetch_is_lazy(self):
+        calls, patch = self.spy_fetchmany()
+        with patch:
+            articles = Article.objects.order_by('position').iterator(chunk_size=2)
+            self.assertEqual(next(articles).position, 0)
+            # Only the first chunk has been read, even on databases that
+            # can't use chunked reads by default.
+            self.assertEqual(calls, [2])
+            self.assertEqual([a.position for a in articles], list(range(1, 7)))
+        # 2 + 2 + 2 + 1 rows, then the empty result that ends the iteration.
+        self.assertEqual(calls, [2, 2, 2, 2, 2])
+
+    def test_values_chunk_size(self):
+        calls, patch = self.spy_fetchmany()
+        with patch:
+            values = list(Article.objects.order_by('position').values(
+                'name', 'position').iterator(chunk_size=4))
+        self.assertEqual(values[6], {'name': 'Article 6', 'position': 6})
+        self.assertEqual(calls, [4, 4, 4])
+
+    def test_values_list_chunk_size(self):
+        calls, patch = self.spy_fetchmany()
+        with patch:
+            positions = list(Article.objects.order_by('position').values_list(
+                'position', flat=True).iterator(chunk_size=5))
+            pairs = list(Article.objects.order_by('position').values_list(
+                'position', 'name').iterator(chunk_size=5))
+        self.assertEqual(positions, list(range(7)))
+        self.assertEqual(pairs[1], (1, 'Article 1'))
+        self.assertEqual(calls, [5, 5, 5, 5, 5, 5])
+
+    def test_disable_server_side_cursors(self):
+        with mock.patch.dict(connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}), \
+                mock.patch.object(connection, 'chunked_cursor') as chunked_cursor_mock:
+            articles = list(Article.objects.iterator(chunk_size=2))
+        self.assertEqual(len(articles), 7)
+        self.assertFalse(chunked_cursor_mock.called)
+
+    def test_evaluation_does_not_use_chunked_cursor(self):
+        with mock.patch.object(connection, 'chunked_cursor') as chunked_cursor_mock:
+            self.assertEqual(len(list(Article.objects.all())), 7)
+        self.assertFalse(chunked_cursor_mock.called)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'PostgreSQL specific tests')
+class ServerSideCursorsPostgresTests(TestCase):
+
+    def setUp(self):
+        Article.objects.bulk_create([
+            Article(name='Article %s' % i, position=i) for i in range(3)
+        ])
+
+    def inspect_cursors(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM pg_cursors WHERE name LIKE '_django_curs_%%'")
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_server_side_cursor(self):
+        articles = Article.objects.iterator(chunk_size=1)
+        next(articles)
+        self.assertEqual(len(self.inspect_cursors()), 1)
+        list(articles)
+        self.assertEqual(self.inspect_cursors(), [])
+
+    def test_values_server_side_cursor(self):
+        positions = Article.objects.values_list('position', flat=True).iterator(chunk_size=1)
+        next(positions)
+        self.assertEqual(len(self.inspect_cursors()), 1)
+
+    def test_no_server_side_cursor_by_default(self):
+        articles = Article.objects.iterator()
+        next(articles)
+        self.assertEqual(self.inspect_cursors(), [])
@@ -1,12 +1,14 @@
 from __future__ import unicode_literals
 
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from django.core.paginator import (
-    EmptyPage, InvalidPage, PageNotAnInteger, Paginator,
+    EmptyPage, EstimatedCountPaginator, InvalidCursor, InvalidPage,
+    KeysetPaginator, PageNotAnInteger, Paginator,
 )
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, mock
 from django.utils import six
 
 from .custom import ValidAdjacentNumsPaginator
@@ -309,3 +311,163 @@ class ModelPaginationTests(TestCase):
         )
         # After __getitem__ is called, object_list is a list
         self.assertIsInstance(p.object_list, list)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """
+    Test pagination with estimated object counts.
+    """
+    def setUp(self):
+        for x in range(1, 10):
+            Article.objects.create(headline='Article %s' % x, pub_date=datetime(2005, 7, 29))
+
+    def test_exact_count_below_threshold(self):
+        paginator = EstimatedCountPaginator(Article.objects.all(), 5)
+        self.assertEqual(paginator.count, 9)
+        self.assertFalse(paginator.count_is_estimate)
+        self.assertEqual(paginator.num_pages, 2)
+
+    def test_estimated_count(self):
+        paginator = EstimatedCountPaginator(Article.objects.all(), 5, exact_count_threshold=100)
+        with mock.patch.object(connection.ops, 'estimate_row_count', return_value=1000):
+            self.assertEqual(paginator.count, 1000)
+        self.assertTrue(paginator.count_is_estimate)
+        self.assertEqual(paginator.num_pages, 200)
+        # Pages beyond the real objects are empty rather than invalid.
+        self.assertEqual(len(paginator.page(2)), 4)
+        self.assertEqual(len(paginator.page(200)), 0)
+        self.assertRaises(EmptyPage, paginator.page, 201)
+
+    def test_estimate_is_not_truncated_at_last_page(self):
+        paginator = EstimatedCountPaginator(Article.objects.all(), 4, exact_count_threshold=1)
+        with mock.patch.object(connection.ops, 'estimate_row_count', return_value=6):
+            self.assertEqual(len(paginator.page(2)), 4)
+
+    def test_no_estimate_available(self):
+        paginator = EstimatedCountPaginator(
+            Article.objects.filter(headline__startswith='Article'), 5, exact_count_threshold=1)
+        with mock.patch.object(connection.ops, 'estimate_query_row_count', return_value=None):
+            self.assertEqual(paginator.count, 9)
+        self.assertFalse(paginator.count_is_estimate)
+
+    def test_list(self):
+        paginator = EstimatedCountPaginator(list(range(11)), 5, exact_count_threshold=1)
+        self.assertEqual(paginator.count, 11)
+        self.assertFalse(paginator.count_is_estimate)
+
+    def test_estimated_count_of_empty_queryset(self):
+        self.assertEqual(Article.objects.none().estimated_count(), 0)
+        self.assertEqual(Article.objects.filter(pk__in=[]).estimated_count(), 0)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'sqlite_stat1 is specific to SQLite')
+    def test_sqlite_statistics(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with self.assertNumQueries(2):
+            self.assertEqual(Article.objects.estimated_count(), 9)
+        # Filtered querysets aren't estimated on SQLite.
+        self.assertIsNone(Article.objects.filter(pk__gt=3).estimated_count())
+
+
+class KeysetPaginatorTests(TestCase):
+    """
+    Test seeking through a QuerySet with KeysetPaginator.
+    """
+    def setUp(self):
+        # Pairs of articles share a publication date.
+        for x in range(1, 10):
+            Article.objects.create(headline='Article %s' % x,
+                                   pub_date=datetime(2005, 7, 29) + timedelta(days=x // 2))
+
+    def seek_all(self, paginator):
+        pages, cursor = [], None
+        while True:
+            page = paginator.seek(cursor)
+            pages.append([a.headline for a in page])
+            if not page.has_next():
+                return pages, page
+            cursor = page.next_cursor
+
+    def test_keys(self):
+        paginator = KeysetPaginator(Article.objects.order_by('-pub_date', 'pk'), 4)
+        self.assertTrue(paginator.can_seek)
+        self.assertEqual([(f.name, descending) for f, descending in paginator.keys],
+                         [('pub_date', True), ('id', False)])
+        reverse = KeysetPaginator(Article.objects.order_by('-pub_date', 'pk').reverse(), 4)
+        self.assertEqual([(f.name, descending) for f, descending in reverse.keys],
+                         [('pub_date', False), ('id', True)])
+
+    def test_cannot_seek(self):
+        querysets = [
+            Article.objects.all(),
+            Article.objects.order_by('pub_date'),
+            Article.objects.order_by('?'),
+            Article.objects.extra(order_by=['id']),
+        ]
+        for queryset in querysets:
+            paginator = KeysetPaginator(queryset, 4)
+            self.assertFalse(paginator.can_seek)
+            self.assertRaises(ValueError, paginator.seek)
+        self.assertFalse(KeysetPaginator(list(range(10)), 4).can_seek)
+
+    def test_seek_forward(self):
+        queryset = Article.objects.order_by('-pub_date', 'pk')
+        paginator = KeysetPaginator(queryset, 4)
+        pages, last = self.seek_all(paginator)
+        self.assertEqual(pages, [
+            ['Article 8', 'Article 9', 'Article 6', 'Article 7'],
+            ['Article 4', 'Article 5', 'Article 2', 'Article 3'],
+            ['Article 1'],
+        ])
+        self.assertTrue(last.has_previous())
+        self.assertIsNone(last.next_cursor)
+
+    def test_seek_backward(self):
+        paginator = KeysetPaginator(Article.objects.order_by('-pub_date', 'pk'), 4)
+        pages, page = self.seek_all(paginator)
+        previous = []
+        while page.has_previous():
+            page = paginator.seek(page.previous_cursor)
+            previous.insert(0, [a.headline for a in page])
+        self.assertEqual(previous, pages[:-1])
+        self.assertFalse(page.has_previous())
+
+    def test_seek_back_to_start(self):
+        # The page before the second page is the whole first page, even if
+        # rows were added at the start in the meantime.
+        paginator = KeysetPaginator(Article.objects.order_by('pk'), 4)
+        second = paginator.seek(paginator.seek().next_cursor)
+        self.assertEqual([a.headline for a in second], ['Article 5', 'Article 6', 'Article 7', 'Article 8'])
+        Article.objects.filter(headline='Article 2').delete()
+        first = paginator.seek(second.previous_cursor)
+        self.assertEqual([a.headline for a in first], ['Article 1', 'Article 3', 'Article 4', 'Article 5'])
+        self.assertFalse(first.has_previous())
+
+    def test_seek_queries(self):
+        paginator = KeysetPaginator(Article.objects.order_by('-pub_date', 'pk'), 4)
+        with self.assertNumQueries(1):
+            page = paginator.seek()
+        with self.assertNumQueries(1):
+            page = paginator.seek(page.next_cursor)
+        # The page's object_list is an already evaluated QuerySet.
+        with self.assertNumQueries(0):
+            self.assertEqual(len(page.object_list), 4)
+            self.assertTrue(page.object_list.ordered)
+        self.assertEqual(list(page.object_list._clone()), list(page.object_list))
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(Article.objects.order_by('pub_date', 'pk'), 4)
+        cursor = paginator.seek().next_cursor
+        for invalid in ('x', cursor[:-2], cursor + 'a'):
+            self.assertRaises(InvalidCursor, paginator.seek, invalid)
+        self.assertRaises(InvalidCursor, KeysetPaginator(Article.objects.order_by('pk'), 4).seek, cursor)
+        self.assertTrue(issubclass(InvalidCursor, InvalidPage))
+
+    def test_empty(self):
+        paginator = KeysetPaginator(Article.objects.none().order_by('pk'), 4)
+        page = paginator.seek()
+        self.assertEqual(len(page), 0)
+        self.assertFalse(page.has_other_pages())
+        paginator = KeysetPaginator(Article.objects.none().order_by('pk'), 4,
+                                    allow_empty_first_page=False)
+        self.assertRaises(EmptyPage, paginator.seek)